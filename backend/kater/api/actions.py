@@ -0,0 +1,79 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from api.models import Player
+from api.rules import rules
+from api.state_cache import player_states
+
+
+def apply_actions(player_id, actions, now):
+    """
+    Applies a batch of finished actions to the player in one transaction and
+    returns what changed. A batch with any action the rules do not allow is
+    rejected as a whole, with the index of that action.
+
+    Actions of one skill, or of exploring, run one after another, so their
+    durations must fit into the time since the previous batch. The next batch
+    starts where the longest of them ended, so actions still running now are
+    not cut short.
+
+    The player's progress and the gathered items are written behind by the
+    player state cache, in one transaction.
+    """
+
+    with transaction.atomic():
+        player = player_states.current(Player.objects.select_for_update().get(pk=player_id))
+        elapsed = (now - player.actions_synced_at).total_seconds() * 1000
+
+        # The stacks written and the ones gathered since, which are written
+        # behind with the progress.
+        stacks = {*player.items.values_list("name", flat=True), *player_states.items(player_id)}
+
+        player.refill_energy(now)
+        energy = player.energy
+        experience = 0
+        gathered = Counter()
+        busy = Counter()  # ms each skill spent on the actions so far
+        for i, action in enumerate(actions):
+            skill, count = action["skill"], action["count"]
+            record = rules.items[skill][action["item"]]
+
+            if record.energy * count > energy:
+                _reject(i, "Not enough energy.")
+            busy[skill] += record.duration * count
+            if busy[skill] > elapsed:
+                _reject(i, "Finished faster than its duration allows.")
+
+            energy -= record.energy * count
+            experience += record.experience * count
+            if skill != "explore":
+                if record.name not in stacks:
+                    if len(stacks) >= rules.inventory.size:
+                        _reject(i, "Inventory is full.")
+                    stacks.add(record.name)
+                gathered[record.name] += count
+
+        delta = {
+            "energy": energy - player.energy,  # spent, the refill until now is in the state
+            "experience": experience,
+            "items": dict(gathered),
+        }
+
+        # Last, so the row lock is held until the cache has the update.
+        player_states.update(
+            player,
+            items=gathered,
+            energy=energy,
+            experience=player.experience + experience,
+            actions_synced_at=player.actions_synced_at
+            + timedelta(milliseconds=max(busy.values(), default=0)),
+        )
+
+    return player, delta
+
+
+def _reject(index, message):
+    raise ValidationError({"actions": {index: [message]}})
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+import jwt
+
+
+class ClaimsCache:
+    """
+    Bounded LRU of verified token claims, each kept until the token expires.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._claims = OrderedDict()  # token -> claims, least recently used first
+        self._lock = Lock()
+
+    def get(self, token):
+        with self._lock:
+            claims = self._claims.get(token)
+            if claims is None:
+                return None
+
+            if claims["exp"] <= time():
+                del self._claims[token]
+                return None
+
+            self._claims.move_to_end(token)
+            return claims
+
+    def put(self, token, claims):
+        with self._lock:
+            self._claims[token] = claims
+            self._claims.move_to_end(token)
+            if len(self._claims) > self._size:
+                self._claims.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._claims.clear()
+
+    def __len__(self):
+        return len(self._claims)
+
+
+claims_cache = ClaimsCache(settings.JWT_CLAIMS_CACHE_SIZE)
+
+
+def encode_token(user):
+    now = int(time())
+    payload = {
+        "id": user.id,
+        "exp": now + settings.JWT_LIFETIME,
+        "iat": now,
+    }
+    return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+
+
+def decode_token(token):
+    """
+    Returns the claims of a token, verifying its signature only the first
+    time it is seen.
+    """
+
+    claims = claims_cache.get(token)
+    if claims is not None:
+        return claims
+
+    try:
+        claims = jwt.decode(
+            token,
+            settings.JWT_SECRET,
+            algorithms=[settings.JWT_ALGORITHM],
+            options={"require": ["exp", "id"]},
+        )
+    except jwt.InvalidTokenError:
+        raise AuthenticationFailed("Unauthenticated!")
+
+    claims_cache.put(token, claims)
+    return claims
+
+
+class JWTCookieAuthentication(BaseAuthentication):
+    """
+    Authenticates by the JWT in the `jwt` cookie, loading the user together
+    with the player, so views read `request.user.player` without another query.
+    """
+
+    def authenticate(self, request):
+        token = request.COOKIES.get("jwt")
+        if not token:
+            return None
+
+        claims = decode_token(token)
+        try:
+            user = User.objects.select_related("player").get(pk=claims["id"], is_active=True)
+        except User.DoesNotExist:
+            raise AuthenticationFailed("Unauthenticated!")
+
+        return user, claims
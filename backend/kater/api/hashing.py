@@ -0,0 +1,46 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+
+from django.conf import settings
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class HashingPool:
+    """
+    Runs password hashing off the event loop on a bounded number of threads.
+
+    PBKDF2 releases the GIL while hashing, so the threads use every core. At
+    most `queue_size` hashes wait or run at once, further ones are refused
+    with PoolSaturated instead of queueing without limit.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="hashing")
+        self._slots = BoundedSemaphore(queue_size)
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturated()
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # Released when the hash is done, not when a cancelled request stops
+        # waiting for it while it keeps running on the pool.
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+
+hashing_pool = HashingPool(
+    settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE_SIZE
+)
@@ -0,0 +1,201 @@
+"""
+Leaderboards of players by level, balance and experience.
+
+Players are ranked by the value, then by id, both descending, which the
+composite indexes of Player serve directly. Pages are keyset paginated from
+the last entry of the previous page. The top of every board is kept in
+memory and updated on every Player save, and it is reloaded after
+LEADERBOARD_REFRESH seconds to pick up saves made by other processes or by
+bulk updates, which send no signals.
+
+Pages within the top, the first one and the ones after it, are served from
+memory, so a walk through the top sees one state of it. Deeper pages and
+ranks come from the index: a rank counts the players above on one range of
+it.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.models import Player
+from api.state_cache import player_states, players_flushed
+
+BOARDS = ("level", "balance", "experience")
+
+
+class TopN:
+    """
+    The best `size` players of a board, as sorted keys (-value, -id).
+    """
+
+    def __init__(self, field, size, refresh):
+        self.field = field
+        self._size = size
+        self._refresh = refresh
+        self._keys = []
+        self._members = {}  # player id -> key
+        self._loaded_at = None  # monotonic time, None when the keys may miss players
+        self._lock = Lock()
+
+    def update(self, player_id, value):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+
+            complete = len(self._keys) < self._size  # every player is in the keys
+            was_member = self._remove(player_id)
+            key = (-value, -player_id)
+            if complete or (self._keys and key < self._keys[-1]):
+                insort(self._keys, key)
+                self._members[player_id] = key
+                if len(self._keys) > self._size:
+                    del self._members[-self._keys.pop()[1]]
+            elif was_member:
+                # It fell out of the top and the player taking its place is not known.
+                self._loaded_at = None
+
+    def remove(self, player_id):
+        with self._lock:
+            complete = len(self._keys) < self._size
+            if self._remove(player_id) and not complete:
+                self._loaded_at = None
+
+    def invalidate(self):
+        """
+        Reloads the top on the next read.
+        """
+
+        with self._lock:
+            self._loaded_at = None
+
+    def entries(self):
+        """
+        Returns (player id, value) of the top players, best first.
+        """
+
+        with self._lock:
+            self._load()
+            return [(-player_id, -value) for value, player_id in self._keys]
+
+    def page(self, limit, after=None):
+        """
+        Returns up to `limit` (player id, value) entries after the key `after`,
+        or from the top, None when the page reaches below the top.
+        """
+
+        with self._lock:
+            self._load()
+            start = 0 if after is None else bisect_right(self._keys, after)
+            complete = len(self._keys) < self._size
+            if not complete and start + limit > len(self._keys):
+                return None
+            return [(-player_id, -value) for value, player_id in self._keys[start : start + limit]]
+
+    def rank(self, player_id):
+        """
+        Returns the 1-based rank of a top player, None for the others.
+        """
+
+        with self._lock:
+            self._load()
+            key = self._members.get(player_id)
+            return None if key is None else bisect_left(self._keys, key) + 1
+
+    def _remove(self, player_id):
+        key = self._members.pop(player_id, None)
+        if key is None:
+            return False
+
+        del self._keys[bisect_left(self._keys, key)]
+        return True
+
+    def _load(self):
+        if self._loaded_at is not None and monotonic() - self._loaded_at < self._refresh:
+            return
+
+        rows = Player.objects.order_by(f"-{self.field}", "-id").values_list("id", self.field)
+        self._keys = [(-value, -player_id) for player_id, value in rows[: self._size]]
+        self._members = {-key[1]: key for key in self._keys}
+        self._loaded_at = monotonic()
+
+
+top = {
+    board: TopN(board, settings.LEADERBOARD_TOP_SIZE, settings.LEADERBOARD_REFRESH)
+    for board in BOARDS
+}
+
+
+@receiver(post_save, sender=Player)
+def update_top(sender, instance, **kwargs):
+    player = player_states.current(instance)
+    values = {board: getattr(player, board) for board in BOARDS}
+
+    def update():
+        for board, value in values.items():
+            top[board].update(instance.pk, value)
+
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Player)
+def remove_from_top(sender, instance, **kwargs):
+    def remove():
+        for board in BOARDS:
+            top[board].remove(instance.pk)
+
+    transaction.on_commit(remove)
+
+
+@receiver(players_flushed)
+def update_top_flushed(sender, states, **kwargs):
+    for player_id, state in states.items():
+        for board in BOARDS:
+            top[board].update(player_id, state[board])
+
+
+def _compared(board, operator, value, player_id):
+    # A row value comparison is one range of the (board, id) index, which
+    # the equivalent OR of two conditions is not for every database.
+    return RawSQL(
+        f'("{board}", "id") {operator} (%s, %s)', (value, player_id), output_field=BooleanField()
+    )
+
+
+def page(board, limit, after=None):
+    """
+    Returns up to `limit` (player id, value) entries after the entry `after`,
+    given as (value, player id), or from the top.
+    """
+
+    entries = top[board].page(limit, None if after is None else (-after[0], -after[1]))
+    if entries is not None:
+        return entries
+
+    players = Player.objects.order_by(f"-{board}", "-id")
+    if after is not None:
+        value, player_id = after
+        players = players.filter(_compared(board, "<", value, player_id))
+
+    return list(players.values_list("id", board)[:limit])
+
+
+def rank(board, player):
+    """
+    Returns the 1-based rank of a player, counting the players above it on
+    the index of the board when it is not in the top.
+    """
+
+    top_rank = top[board].rank(player.pk)
+    if top_rank is not None:
+        return top_rank
+
+    above = Player.objects.filter(_compared(board, ">", getattr(player, board), player.pk))
+    return above.count() + 1
@@ -0,0 +1,90 @@
+import random
+from time import perf_counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import leaderboards
+from api.models import Player
+
+USERNAME_PREFIX = "benchmark-leaderboards-"
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Times leaderboard pages and rank lookups on generated players. The "
+        "players are inserted in a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--players", type=int, default=1000000)
+        parser.add_argument("--repeat", type=int, default=20, help="runs of every timed query")
+        parser.add_argument("--seed", type=int, default=38)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options["players"], options["repeat"], random.Random(options["seed"]))
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, count, repeat, rng):
+        start = perf_counter()
+        for offset in range(0, count, 10000):
+            users = User.objects.bulk_create(
+                User(username=f"{USERNAME_PREFIX}{i}", password="!")
+                for i in range(offset, min(offset + 10000, count))
+            )
+            Player.objects.bulk_create(
+                Player(
+                    user=user,
+                    level=rng.randint(1, 100),
+                    balance=rng.randint(0, 10**6),
+                    experience=rng.randint(0, 10**7),
+                )
+                for user in users
+            )
+        self.stdout.write(f"Inserted {count} players in {perf_counter() - start:.1f} s")
+
+        def timed(name, fn):
+            fn()  # warms the caches of the database
+            start = perf_counter()
+            for _ in range(repeat):
+                result = fn()
+            self.stdout.write(f"  {name:<45} {(perf_counter() - start) / repeat * 1000:>9.3f} ms")
+            return result
+
+        total = Player.objects.count()
+        for board in leaderboards.BOARDS:
+            self.stdout.write(f"{board} ({total} players)")
+            top = leaderboards.top[board]
+            timed("top load from the index", lambda: (top.invalidate(), top.entries()))
+            timed("first page, in memory", lambda: leaderboards.page(board, 50))
+
+            middle = total // 2
+            value, player_id = Player.objects.order_by(f"-{board}", "-id").values_list(
+                board, "id"
+            )[middle]
+            timed(
+                f"page at rank {middle}, keyset",
+                lambda: leaderboards.page(board, 50, (value, player_id)),
+            )
+            timed(
+                f"page at rank {middle}, OFFSET for comparison",
+                lambda: list(
+                    Player.objects.order_by(f"-{board}", "-id").values_list("id", board)[
+                        middle : middle + 50
+                    ]
+                ),
+            )
+
+            for name, position in (("top", 0), ("median", middle), ("last", total - 1)):
+                player = Player.objects.order_by(f"-{board}", "-id")[position]
+                rank = timed(f"rank of the {name} player", lambda: leaderboards.rank(board, player))
+                assert rank == position + 1, (rank, position)
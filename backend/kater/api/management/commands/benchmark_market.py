@@ -0,0 +1,74 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from api.market import ITEMS
+from api.matching import BUY, SELL, BookOrder, MatchingEngine
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the matching engine of the marketplace on generated orders, "
+        "in memory and on one core, without touching the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=1000000)
+        parser.add_argument("--items", type=int, default=len(ITEMS), help="order books")
+        parser.add_argument("--players", type=int, default=10000)
+        parser.add_argument(
+            "--cancel", type=float, default=0.2, help="share of orders cancelled after placing one"
+        )
+        parser.add_argument("--spread", type=int, default=20, help="prices around the middle one")
+        parser.add_argument("--seed", type=int, default=38)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        items = (ITEMS * (options["items"] // len(ITEMS) + 1))[: options["items"]]
+        items = [f"{item} {i}" for i, item in enumerate(items)]
+        spread = options["spread"]
+
+        # Generated up front, so only the engine is timed.
+        orders = [
+            BookOrder(
+                i,
+                rng.randrange(options["players"]),
+                rng.choice(items),
+                rng.choice((BUY, SELL)),
+                1000 + rng.randint(-spread, spread),
+                rng.randint(1, 20),
+            )
+            for i in range(options["orders"])
+        ]
+        cancels = [
+            rng.randrange(i + 1) if rng.random() < options["cancel"] else None
+            for i in range(options["orders"])
+        ]
+
+        engine = MatchingEngine()
+        matches = cancelled = quantity = 0
+        start = perf_counter()
+        for order, cancel in zip(orders, cancels):
+            for match in engine.place(order):
+                matches += 1
+                quantity += match.quantity
+            if cancel is not None and engine.cancel(cancel)[0] is not None:
+                cancelled += 1
+        elapsed = perf_counter() - start
+
+        self.stdout.write(
+            f"{len(orders)} orders on {len(items)} books in {elapsed:.2f} s: "
+            f"{len(orders) / elapsed:,.0f} orders/s, {matches / elapsed:,.0f} matches/s"
+        )
+        self.stdout.write(
+            f"{matches} matches of {quantity} items, {cancelled} cancelled, "
+            f"{len(engine.orders)} orders resting"
+        )
+
+        levels = 10
+        start = perf_counter()
+        for item in items:
+            engine.depth(item, levels)
+        elapsed = perf_counter() - start
+        self.stdout.write(f"Depth of {levels} levels in {elapsed / len(items) * 1e6:.1f} us per book")
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import os
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient
+from django.test.utils import override_settings
+
+from api import views
+from api.hashing import HashingPool
+
+USERNAME_PREFIX = "loadtest-auth-"
+
+
+class Command(BaseCommand):
+    help = (
+        "Logs in test users concurrently through the async login view with "
+        "hashing pools of increasing size and reports the throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--requests", type=int, default=1000, help="logins per pool size")
+        parser.add_argument("--concurrency", type=int, default=64, help="logins in flight")
+        parser.add_argument(
+            "--workers",
+            default=None,
+            help="comma separated pool sizes, by default powers of two up to the cores",
+        )
+        parser.add_argument(
+            "--queue-size",
+            type=int,
+            default=None,
+            help="hashing queue size, the concurrency by default so that no login is refused",
+        )
+
+    def handle(self, *args, **options):
+        cores = os.cpu_count() or 1
+        if options["workers"]:
+            pool_sizes = [int(workers) for workers in options["workers"].split(",")]
+        else:
+            pool_sizes = [2**i for i in range(cores.bit_length()) if 2**i <= cores]
+            if pool_sizes[-1] != cores:
+                pool_sizes.append(cores)
+
+        password = "loadtest-password"
+        users = [f"{USERNAME_PREFIX}{i}" for i in range(options["users"])]
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        hashed_password = make_password(password)
+        User.objects.bulk_create(
+            User(username=username, password=hashed_password) for username in users
+        )
+
+        # Refused logins are counted, not logged one by one.
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+        queue_size = options["queue_size"] or options["concurrency"]
+        original_pool = views.hashing_pool
+        self.stdout.write(f"{cores} cores, {options['requests']} logins per pool size")
+        self.stdout.write(
+            f"{'workers':>8} {'logins/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'503':>6} {'failed':>7}"
+        )
+        # The async test client always sends the host the test runner allows.
+        allowed_hosts = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"])
+        failed = 0
+        try:
+            for workers in pool_sizes:
+                views.hashing_pool = HashingPool(workers, queue_size)
+                with allowed_hosts:
+                    result = asyncio.run(
+                        self.run(users, password, options["requests"], options["concurrency"])
+                    )
+                views.hashing_pool.shutdown()
+                failed += result["failed"]
+                self.stdout.write(
+                    f"{workers:>8} {result['throughput']:>10.1f} {result['p50']:>8.1f}"
+                    f" {result['p99']:>8.1f} {result['saturated']:>6} {result['failed']:>7}"
+                )
+        finally:
+            views.hashing_pool = original_pool
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        if failed:
+            raise CommandError(f"{failed} logins failed, the throughput is not a result.")
+
+    async def run(self, users, password, requests, concurrency):
+        client = AsyncClient()
+        latencies = []
+        statuses = []
+        next_request = iter(range(requests))
+
+        async def worker():
+            for i in next_request:
+                start = perf_counter()
+                response = await client.post(
+                    "/login/",
+                    {"username": users[i % len(users)], "password": password},
+                    content_type="application/json",
+                )
+                latencies.append((perf_counter() - start) * 1000)
+                statuses.append(response.status_code)
+
+        start = perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = perf_counter() - start
+
+        latencies.sort()
+        return {
+            "throughput": statuses.count(200) / elapsed,
+            "p50": latencies[len(latencies) // 2],
+            "p99": latencies[int(len(latencies) * 0.99)],
+            "saturated": statuses.count(503),
+            "failed": len(statuses) - statuses.count(200) - statuses.count(503),
+        }
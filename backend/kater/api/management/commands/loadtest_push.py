@@ -0,0 +1,187 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import json
+from pathlib import Path
+import resource
+from time import perf_counter
+from urllib.parse import urljoin
+from urllib.request import Request, urlopen
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from websockets.asyncio.client import connect
+
+from api.authentication import encode_token
+from api.models import Player
+from api.provisioning import generated_accounts, provision_players
+
+USERNAME_PREFIX = "loadtest-push-"
+
+
+class Client:
+    """
+    One player state WebSocket connection to the server, over a real socket.
+    """
+
+    def __init__(self, url, token):
+        self.url = url
+        self.token = token
+        self.opened = asyncio.Event()
+        self.received = asyncio.Event()
+        self.deltas = 0
+        self.error = None
+
+    async def run(self, handshakes, done):
+        try:
+            async with handshakes:
+                socket = await connect(
+                    self.url,
+                    additional_headers={"Cookie": f"jwt={self.token}"},
+                    open_timeout=60,
+                    ping_interval=None,  # idle like a browser tab in the background
+                )
+            async with socket:
+                if "state" not in json.loads(await socket.recv()):
+                    raise RuntimeError("The first message is not the state.")
+                self.opened.set()
+
+                receiver = asyncio.ensure_future(self._receive(socket))
+                await done.wait()
+                receiver.cancel()
+        except Exception as e:
+            self.error = e
+            self.opened.set()
+
+    async def _receive(self, socket):
+        async for message in socket:
+            if "delta" in json.loads(message):
+                self.deltas += 1
+                self.received.set()
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens idle player state WebSocket connections to a running server, "
+        "e.g. one uvicorn worker of kater.asgi, then applies actions of the "
+        "players through its API in bursts and measures how fast the "
+        "coalesced deltas reach every connection. The server must use the "
+        "same database as this command."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000/", help="of the server")
+        parser.add_argument("--connections", type=int, default=10000)
+        parser.add_argument(
+            "--players", type=int, default=1000, help="connections are spread over them"
+        )
+        parser.add_argument(
+            "--burst", type=int, default=5, help="action batches of each player per burst"
+        )
+        parser.add_argument("--handshakes", type=int, default=200, help="opened at a time")
+        parser.add_argument("--server-pid", type=int, help="reports the memory of the server")
+
+    def handle(self, *args, **options):
+        # Every connection is a file descriptor of this process too.
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        needed = options["connections"] + 1000
+        if soft < needed:
+            if hard != resource.RLIM_INFINITY and hard < needed:
+                raise CommandError(
+                    f"{options['connections']} connections need about {needed} open files,"
+                    f" the limit is {hard}. Raise it with ulimit -n, for the server as well."
+                )
+            resource.setrlimit(resource.RLIMIT_NOFILE, (needed, hard))
+
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        provision_players(generated_accounts(USERNAME_PREFIX, options["players"]))
+        try:
+            # Room for the actions of the bursts.
+            Player.objects.filter(user__username__startswith=USERNAME_PREFIX).update(
+                actions_synced_at=timezone.now() - timedelta(hours=1)
+            )
+            users = list(User.objects.filter(username__startswith=USERNAME_PREFIX))
+            tokens = [encode_token(user) for user in users]
+            asyncio.run(self.run(tokens, options))
+        finally:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    async def run(self, tokens, options):
+        connections = options["connections"]
+        base = options["url"]
+        url = urljoin(base.replace("http", "ws", 1), "/ws/player/")
+
+        server_memory = self.server_rss(options["server_pid"])
+        start = perf_counter()
+
+        handshakes = asyncio.Semaphore(options["handshakes"])
+        done = asyncio.Event()
+        clients = [Client(url, tokens[i % len(tokens)]) for i in range(connections)]
+        tasks = [asyncio.ensure_future(client.run(handshakes, done)) for client in clients]
+        await asyncio.gather(*(client.opened.wait() for client in clients))
+
+        failed = [client.error for client in clients if client.error is not None]
+        if failed:
+            done.set()
+            await asyncio.gather(*tasks)
+            raise CommandError(f"{len(failed)} connections failed, the first with: {failed[0]!r}")
+
+        opened = f"{connections} connections open after {perf_counter() - start:.1f} s"
+        if server_memory is not None:
+            held = self.server_rss(options["server_pid"]) - server_memory
+            opened += f", the server holds {held / connections:.1f} KiB more RSS for each"
+        self.stdout.write(opened)
+
+        # Every player applies `burst` action batches in a row, each
+        # connection should get its deltas once the server writes them behind.
+        start = perf_counter()
+        with ThreadPoolExecutor(64) as pool:
+            posts = [
+                asyncio.get_running_loop().run_in_executor(pool, self.post_action, base, token)
+                for token in tokens
+                for _ in range(options["burst"])
+            ]
+            rejected = sum(status != 200 for status in await asyncio.gather(*posts))
+        applied = perf_counter() - start
+        await asyncio.gather(*(client.received.wait() for client in clients))
+        delivered = perf_counter() - start
+
+        deltas = sum(client.deltas for client in clients)
+        self.stdout.write(
+            f"{len(posts)} action batches in {applied:.1f} s ({rejected} rejected),"
+            f" every connection got its delta after {delivered:.1f} s, {deltas} deltas"
+            f" sent ({deltas / connections:.2f} per connection)"
+        )
+
+        done.set()
+        await asyncio.gather(*tasks)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f"Closed, peak RSS of this client {peak:.0f} MiB")
+
+    @staticmethod
+    def post_action(base, token):
+        request = Request(
+            urljoin(base, "/actions/"),
+            data=json.dumps({"actions": [{"skill": "mining", "item": 0}]}).encode(),
+            headers={"Content-Type": "application/json", "Cookie": f"jwt={token}"},
+        )
+        try:
+            with urlopen(request, timeout=60) as response:
+                return response.status
+        except OSError as e:
+            return getattr(e, "code", None)
+
+    @staticmethod
+    def server_rss(pid):
+        """
+        Returns the resident memory of the server process in KiB, on Linux.
+        """
+
+        if pid is None:
+            return None
+
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+        raise CommandError(f"No memory found for the process {pid}.")
@@ -0,0 +1,55 @@
+import csv
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.provisioning import generated_accounts, provision_players
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates accounts with their players in bulk, either generated as "
+        "<prefix><number> or read from a CSV file with username, email and "
+        "password columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--csv", help="file with username,email,password rows")
+        parser.add_argument("--count", type=int, help="number of generated accounts")
+        parser.add_argument(
+            "--prefix", default="player-", help="username prefix of generated accounts"
+        )
+        parser.add_argument(
+            "--start", type=int, default=0, help="number of the first generated account"
+        )
+        parser.add_argument(
+            "--password",
+            default=None,
+            help="password of generated accounts, without it they cannot log in",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if (options["csv"] is None) == (options["count"] is None):
+            raise CommandError("Pass either --csv or --count.")
+
+        start = perf_counter()
+        if options["csv"] is not None:
+            with open(options["csv"], newline="") as f:
+                accounts = (
+                    (row["username"], row.get("email", ""), row.get("password") or None)
+                    for row in csv.DictReader(f)
+                )
+                created, skipped = provision_players(accounts, options["batch_size"])
+        else:
+            accounts = generated_accounts(
+                options["prefix"], options["count"], options["password"], options["start"]
+            )
+            created, skipped = provision_players(accounts, options["batch_size"])
+        elapsed = perf_counter() - start
+
+        self.stdout.write(
+            f"Created {created} accounts in {elapsed:.1f} s ({created / max(elapsed, 1e-9):.0f}/s)"
+        )
+        if skipped:
+            self.stdout.write(f"Skipped {len(skipped)} existing usernames, e.g. {skipped[:5]}")
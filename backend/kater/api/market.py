@@ -0,0 +1,337 @@
+"""
+Marketplace of gathered items between players.
+
+Orders are matched in memory by the engine of api.matching, so like the push
+broker the market runs in one process. Placing an order takes the items of
+a sell order, or the most balance a buy order can spend, from the player and
+inserts the order in one transaction before it is matched, so a placed order
+is never lost. The trades, the remaining quantities of the orders and what
+the players receive are written behind in batches, every
+MARKET_FLUSH_INTERVAL seconds or as soon as MARKET_FLUSH_SIZE trades are
+pending. Cancelling an order flushes right away, also when the engine
+cancels an order that met one of its own player.
+
+Matches not written when the process ends are matched again when the open
+orders are loaded, as those orders still hold what they took.
+"""
+
+import atexit
+from collections import Counter
+import logging
+from threading import Event, Lock, Thread
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from api.matching import BookOrder, MatchingEngine
+from api.models import InventoryItem, Order, Player, Trade
+from api.rules import rules
+from api.state_cache import player_states, players_flushed
+
+# Gathered items, the items of exploring are not kept.
+ITEMS = [
+    record.name
+    for skill, records in rules.items.items()
+    if skill != "explore"
+    for record in records
+]
+
+logger = logging.getLogger(__name__)
+
+
+def order_status(order):
+    if order.cancelled:
+        return Order.CANCELLED
+    return Order.OPEN if order.remaining else Order.FILLED
+
+
+class Market:
+    def __init__(self, flush_interval, flush_size):
+        self._flush_interval = flush_interval
+        self._flush_size = flush_size
+        self._engine = None  # loaded from the open orders on first use
+        self._lock = Lock()
+        self._flushing = Lock()  # one batch at a time, in order
+        self._wake = Event()
+        self._thread = None
+        self._closed = False
+        self._reset()
+
+    def place(self, player_id, item, side, price, quantity):
+        """
+        Takes what the order needs from the player, inserts it and matches it.
+        Returns the order as it rests on the book, or cancelled if it met an
+        order of the player, and its matches.
+        """
+
+        with self._lock:
+            self._loaded()  # before the order exists, or it would be loaded too
+
+        # The items the player gathered are written first, so they can be
+        # sold. Not in the transaction, the flush locks the player itself.
+        player_states.flush([player_id])
+
+        with transaction.atomic():
+            player = Player.objects.select_for_update().get(pk=player_id)
+            if side == Order.BUY:
+                _take_balance(player, item, price * quantity)
+            else:
+                _take_items(player, item, quantity)
+            order = Order.objects.create(
+                player=player,
+                item=item,
+                side=side,
+                price=price,
+                quantity=quantity,
+                remaining=quantity,
+            )
+
+        book_order = BookOrder(order.pk, player_id, item, side, price, quantity)
+        with self._lock:
+            matches = self._place(self._engine, book_order, timezone.now())
+
+        if book_order.cancelled:
+            self.flush()
+        return book_order, matches
+
+    def cancel(self, player_id, order_id):
+        """
+        Takes an open order of the player off its book and gives back what it
+        has remaining. Returns the order, None if the player has no such order.
+        """
+
+        with self._lock:
+            order = self._loaded().orders.get(order_id)
+            if order is None or order.player_id != player_id:
+                return None
+
+            _, remaining = self._engine.cancel(order_id)
+            self._refund(order, remaining)
+
+        self.flush()
+        return order
+
+    def depth(self, item, levels):
+        """
+        Returns up to `levels` (price, quantity) of the buy and of the sell orders.
+        """
+
+        with self._lock:
+            return self._loaded().depth(item, levels)
+
+    def flush(self):
+        """
+        Writes the pending trades, and puts them back if the write fails.
+        """
+
+        with self._flushing:
+            with self._lock:
+                trades, orders, balances, items = (
+                    self._trades, self._orders, self._balances, self._items
+                )
+                self._reset()
+                states = {
+                    order.id: (order.remaining, order_status(order)) for order in orders.values()
+                }
+            if not states:
+                return
+
+            try:
+                _write(trades, states, balances, items)
+            except Exception:
+                with self._lock:
+                    self._trades[:0] = trades
+                    self._orders = {**orders, **self._orders}
+                    self._balances.update(balances)
+                    self._items.update(items)
+                raise
+
+        # Updates send no post_save, the players are pushed and ranked like
+        # the ones of the player state cache.
+        paid = [player_id for player_id, delta in balances.items() if delta]
+        if paid:
+            players_flushed.send(sender=type(self), states=player_states.states(paid))
+
+    def clear(self):
+        """
+        Forgets the books and the writes not done yet, the books are loaded
+        from the open orders again on next use.
+        """
+
+        with self._lock:
+            self._engine = None
+            self._reset()
+
+    def close(self):
+        """
+        Stops the flusher and writes what is still pending.
+        """
+
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _reset(self):
+        self._trades = []  # (item, price, quantity, buy order id, sell order id, time)
+        self._orders = {}  # order id -> changed order
+        self._balances = Counter()  # player id -> balance received
+        self._items = Counter()  # (player id, item) -> quantity received
+
+    def _loaded(self):
+        if self._engine is None:
+            engine = MatchingEngine()
+            now = timezone.now()
+            for order in Order.objects.filter(status=Order.OPEN).order_by("id"):
+                book_order = BookOrder(
+                    order.pk, order.player_id, order.item, order.side, order.price, order.remaining
+                )
+                self._place(engine, book_order, now)
+            self._engine = engine
+            self._start()
+        return self._engine
+
+    def _place(self, engine, order, now):
+        matches = engine.place(order)
+        self._record(matches, now)
+        if order.cancelled:  # it met an order of its player
+            self._refund(order, order.remaining)
+            order.remaining = 0
+        return matches
+
+    def _refund(self, order, remaining):
+        if order.side == Order.BUY:
+            self._balances[order.player_id] += remaining * order.price
+        else:
+            self._items[order.player_id, order.item] += remaining
+        self._orders[order.id] = order
+
+    def _record(self, matches, now):
+        for match in matches:
+            buy, sell = match.buy, match.sell
+            self._trades.append(
+                (buy.item, match.price, match.quantity, buy.id, sell.id, now)
+            )
+            self._orders[buy.id] = buy
+            self._orders[sell.id] = sell
+            self._balances[sell.player_id] += match.price * match.quantity
+            # A buy order took its own price, it pays the resting one.
+            self._balances[buy.player_id] += (buy.price - match.price) * match.quantity
+            self._items[buy.player_id, buy.item] += match.quantity
+
+        if len(self._trades) >= self._flush_size:
+            self._wake.set()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name="market-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing the market failed, retrying with the next batch.")
+
+
+def _take_balance(player, item, cost):
+    if player.balance < cost:
+        raise ValidationError({"price": ["Not enough balance."]})
+
+    # The stack the items are delivered to is reserved now, so delivering
+    # them never takes a slot the inventory has filled since.
+    names = {*player.items.values_list("name", flat=True), *player_states.items(player.pk)}
+    if not player.items.filter(name=item).exists():
+        if len(names - {item}) >= rules.inventory.size:
+            raise ValidationError({"item": ["Inventory is full."]})
+        InventoryItem.objects.create(player=player, name=item)
+
+    player.balance -= cost
+    player.save(update_fields=["balance"])
+
+
+def _take_items(player, item, quantity):
+    stock = player.items.select_for_update().filter(name=item).first()
+    if stock is None or stock.quantity < quantity:
+        raise ValidationError({"quantity": ["Not enough items."]})
+
+    stock.quantity -= quantity
+    stock.save(update_fields=["quantity"])
+
+
+def _write(trades, states, balances, items):
+    now = timezone.now()
+    balances = {player_id: delta for player_id, delta in balances.items() if delta}
+    items = {key: quantity for key, quantity in items.items() if quantity}
+
+    with transaction.atomic():
+        # Locked in id order, the players whose inventory or balance change,
+        # like placing an order and applying actions lock them.
+        players = sorted({*balances, *(player_id for player_id, _ in items)})
+        list(Player.objects.select_for_update().filter(id__in=players).order_by("id").values("id"))
+
+        if balances:
+            received = Case(
+                *(When(id=player_id, then=Value(delta)) for player_id, delta in balances.items()),
+                output_field=IntegerField(),
+            )
+            Player.objects.filter(id__in=balances).update(
+                balance=F("balance") + received, version=F("version") + 1, updated_at=now
+            )
+
+        stock = {
+            (item.player_id, item.name): item
+            for item in InventoryItem.objects.filter(
+                player_id__in={player_id for player_id, _ in items},
+                name__in={name for _, name in items},
+            )
+        }
+        changed = []
+        for key, quantity in items.items():
+            if key in stock:
+                stock[key].quantity += quantity
+                changed.append(stock[key])
+        InventoryItem.objects.bulk_update(changed, ["quantity"], batch_size=1000)
+        InventoryItem.objects.bulk_create(
+            (
+                InventoryItem(player_id=player_id, name=name, quantity=quantity)
+                for (player_id, name), quantity in items.items()
+                if (player_id, name) not in stock
+            ),
+            batch_size=1000,
+        )
+
+        Order.objects.bulk_update(
+            [
+                Order(id=order_id, remaining=remaining, status=status)
+                for order_id, (remaining, status) in states.items()
+            ],
+            ["remaining", "status"],
+            batch_size=1000,
+        )
+        Trade.objects.bulk_create(
+            (
+                Trade(
+                    item=item,
+                    price=price,
+                    quantity=quantity,
+                    buy_order_id=buy_order_id,
+                    sell_order_id=sell_order_id,
+                    created_at=created_at,
+                )
+                for item, price, quantity, buy_order_id, sell_order_id, created_at in trades
+            ),
+            batch_size=1000,
+        )
+
+
+market = Market(settings.MARKET_FLUSH_INTERVAL, settings.MARKET_FLUSH_SIZE)
+atexit.register(market.close)
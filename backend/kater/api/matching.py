@@ -0,0 +1,206 @@
+"""
+In-memory order matching with price-time priority.
+
+Every book keeps its resting buy and sell orders in two heaps, best price
+first and the oldest order first among equal prices. An incoming order
+matches the best resting orders of the other side while their prices cross,
+at the price of the resting order, and the rest of it rests on its own side.
+An order that would match an order of the same player is cancelled with
+what it has remaining instead, so players never trade with themselves.
+Cancelled orders are only marked and skipped when they reach the top of a
+heap, which is rebuilt once they make up most of it.
+"""
+
+from collections import namedtuple
+from heapq import heapify, heappop, heappush, nlargest, nsmallest
+from itertools import count
+
+BUY = "buy"
+SELL = "sell"
+
+# Orders are the resting BookOrder objects, price is that of the sell or buy
+# order that was resting.
+Match = namedtuple("Match", ["buy", "sell", "price", "quantity"])
+
+
+class BookOrder:
+    __slots__ = ("id", "player_id", "item", "side", "price", "remaining", "cancelled", "seq")
+
+    def __init__(self, id, player_id, item, side, price, quantity):
+        self.id = id
+        self.player_id = player_id
+        self.item = item
+        self.side = side
+        self.price = price
+        self.remaining = quantity
+        self.cancelled = False
+        self.seq = None  # arrival at the engine, the time priority
+
+    def __repr__(self):
+        return f"<BookOrder {self.id} {self.side} {self.remaining} {self.item} at {self.price}>"
+
+
+class Side:
+    """
+    Resting orders of one side of a book, as heap entries (key, seq, order),
+    and the total remaining quantity at every price.
+    """
+
+    def __init__(self, side):
+        self.side = side
+        self._sign = -1 if side == BUY else 1  # the smallest key is the best price
+        self._heap = []
+        self._dead = 0  # cancelled entries still in the heap
+        self.levels = {}  # price -> remaining quantity
+
+    def push(self, order):
+        heappush(self._heap, (self._sign * order.price, order.seq, order))
+        self.levels[order.price] = self.levels.get(order.price, 0) + order.remaining
+
+    def best(self):
+        """
+        Returns the resting order with the best price, None if there is none.
+        """
+
+        heap = self._heap
+        while heap:
+            order = heap[0][2]
+            if order.remaining:
+                return order
+            heappop(heap)
+            if order.cancelled:
+                self._dead -= 1
+        return None
+
+    def filled(self, order, quantity):
+        order.remaining -= quantity
+        self._reduce(order.price, quantity)
+        if not order.remaining:
+            heappop(self._heap)  # filled orders are always the best one
+
+    def cancel(self, order):
+        self._reduce(order.price, order.remaining)
+        order.remaining = 0
+        order.cancelled = True
+        self._dead += 1
+        if self._dead > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if entry[2].remaining]
+            heapify(self._heap)
+            self._dead = 0
+
+    def depth(self, levels):
+        """
+        Returns up to `levels` (price, quantity) with the best prices first.
+        """
+
+        best = nlargest if self.side == BUY else nsmallest
+        return [(price, self.levels[price]) for price in best(levels, self.levels)]
+
+    def __len__(self):
+        return len(self._heap) - self._dead
+
+    def _reduce(self, price, quantity):
+        remaining = self.levels[price] - quantity
+        if remaining:
+            self.levels[price] = remaining
+        else:
+            del self.levels[price]
+
+
+class OrderBook:
+    def __init__(self, item):
+        self.item = item
+        self.sides = {BUY: Side(BUY), SELL: Side(SELL)}
+
+    def match(self, order):
+        """
+        Matches an incoming order and rests what is left of it, unless it met
+        an order of its player and is cancelled. Returns the matches, best
+        price first.
+        """
+
+        if order.side == BUY:
+            opposite = self.sides[SELL]
+            crosses = order.price.__ge__
+        else:
+            opposite = self.sides[BUY]
+            crosses = order.price.__le__
+
+        matches = []
+        while order.remaining:
+            resting = opposite.best()
+            if resting is None or not crosses(resting.price):
+                break
+            if resting.player_id == order.player_id:
+                order.cancelled = True
+                break
+
+            quantity = min(order.remaining, resting.remaining)
+            order.remaining -= quantity
+            opposite.filled(resting, quantity)
+            if order.side == BUY:
+                matches.append(Match(order, resting, resting.price, quantity))
+            else:
+                matches.append(Match(resting, order, resting.price, quantity))
+
+        if order.remaining and not order.cancelled:
+            self.sides[order.side].push(order)
+        return matches
+
+
+class MatchingEngine:
+    """
+    Order books by item, and the resting orders by id. Not thread-safe.
+    """
+
+    def __init__(self):
+        self.books = {}
+        self.orders = {}
+        self._seq = count()
+
+    def place(self, order):
+        """
+        Matches a new order, see `OrderBook.match`.
+        """
+
+        if order.id in self.orders:
+            raise ValueError(f"Order {order.id} is already placed.")
+
+        book = self.books.get(order.item)
+        if book is None:
+            book = self.books[order.item] = OrderBook(order.item)
+
+        order.seq = next(self._seq)
+        matches = book.match(order)
+        for match in matches:
+            if not match.buy.remaining:
+                self.orders.pop(match.buy.id, None)
+            if not match.sell.remaining:
+                self.orders.pop(match.sell.id, None)
+        if order.remaining and not order.cancelled:
+            self.orders[order.id] = order
+        return matches
+
+    def cancel(self, order_id):
+        """
+        Takes a resting order off its book and returns it with the quantity
+        that was still remaining, or (None, 0) if it is not resting.
+        """
+
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None, 0
+
+        remaining = order.remaining
+        self.books[order.item].sides[order.side].cancel(order)
+        return order, remaining
+
+    def depth(self, item, levels):
+        """
+        Returns up to `levels` (price, quantity) of the buy and of the sell side.
+        """
+
+        book = self.books.get(item)
+        if book is None:
+            return [], []
+        return book.sides[BUY].depth(levels), book.sides[SELL].depth(levels)
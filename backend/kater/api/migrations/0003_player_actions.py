@@ -0,0 +1,37 @@
+# Generated by Django 5.0.7 on 2026-10-18 14:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_player_version_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='actions_synced_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='experience',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='InventoryItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.player')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('player', 'name'), name='unique_player_item')],
+            },
+        ),
+    ]
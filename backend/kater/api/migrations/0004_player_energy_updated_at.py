@@ -0,0 +1,19 @@
+# Generated by Django 5.0.7 on 2026-10-18 14:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_player_actions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='energy_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-18 14:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_player_energy_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['-level', '-id'], name='player_level_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['-balance', '-id'], name='player_balance_rank'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['-experience', '-id'], name='player_experience_rank'),
+        ),
+    ]
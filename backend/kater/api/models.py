@@ -1,19 +1,129 @@
+from datetime import timedelta
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from api.rules import rules
 
 class Player(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     level = models.IntegerField(default=1)
-    energy = models.IntegerField(default=100)
+    energy = models.IntegerField(default=100)  # at energy_updated_at, refills lazily from then
+    energy_updated_at = models.DateTimeField(default=timezone.now)
     balance = models.IntegerField(default=0)
+    experience = models.IntegerField(default=0)
+    actions_synced_at = models.DateTimeField(default=timezone.now)  # end of the last applied batch of actions
+    version = models.PositiveIntegerField(default=0)  # incremented by every save, used as the ETag
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Leaderboards, ranked by the value and then by id.
+        indexes = [
+            models.Index(fields=["-level", "-id"], name="player_level_rank"),
+            models.Index(fields=["-balance", "-id"], name="player_balance_rank"),
+            models.Index(fields=["-experience", "-id"], name="player_experience_rank"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.version += 1
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "version", "updated_at"}
+        super().save(*args, **kwargs)
+
+    def energy_at(self, now):
+        """
+        Returns the energy at `now` with the refills of the rules since
+        `energy_updated_at`, and when the last of them happened.
+        """
+
+        cap = rules.caps.energy
+        if self.energy >= cap:
+            return self.energy, self.energy_updated_at
+
+        period = timedelta(milliseconds=rules.rates.energy)
+        refill = rules.rates.base_energy_refill
+        refills = min(
+            max((now - self.energy_updated_at) // period, 0),
+            -(-(cap - self.energy) // refill),  # until the cap
+        )
+        return min(self.energy + refills * refill, cap), self.energy_updated_at + refills * period
+
+    @property
+    def current_energy(self):
+        return self.energy_at(timezone.now())[0]
+
+    def refill_energy(self, now):
+        """
+        Stores the energy refilled until `now`, before changing it.
+        """
+
+        self.energy, refilled_at = self.energy_at(now)
+        # A refill in progress continues, a full one starts over when spent.
+        self.energy_updated_at = refilled_at if self.energy < rules.caps.energy else now
+
+    @property
+    def response_cache_key(self):
+        return f"user-response:{self.pk}"
+
+class InventoryItem(models.Model):
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name="items")
+    name = models.CharField(max_length=64)
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["player", "name"], name="unique_player_item"),
+        ]
+
+class Order(models.Model):
+    """
+    Order of the marketplace. The items of a sell order, or the balance a buy
+    order can spend, are taken from the player when it is placed and given
+    back for what it has remaining when it is cancelled.
+    """
+
+    BUY = "buy"
+    SELL = "sell"
+    SIDES = [(BUY, "Buy"), (SELL, "Sell")]
+
+    OPEN = "open"
+    FILLED = "filled"
+    CANCELLED = "cancelled"
+    STATUSES = [(OPEN, "Open"), (FILLED, "Filled"), (CANCELLED, "Cancelled")]
+
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name="orders")
+    item = models.CharField(max_length=64)
+    side = models.CharField(max_length=4, choices=SIDES)
+    price = models.PositiveIntegerField()  # balance per item, at most
+    quantity = models.PositiveIntegerField()
+    remaining = models.PositiveIntegerField()  # written behind, with the trades
+    status = models.CharField(max_length=9, choices=STATUSES, default=OPEN)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Open orders are loaded into the matching engine when it starts.
+        indexes = [
+            models.Index(fields=["id"], name="order_open", condition=models.Q(status="open")),
+        ]
+
+class Trade(models.Model):
+    item = models.CharField(max_length=64)
+    price = models.PositiveIntegerField()
+    quantity = models.PositiveIntegerField()
+    buy_order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="+")
+    sell_order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(default=timezone.now)  # when it matched
+
+@receiver(post_save, sender=Player)
+def invalidate_player_response(sender, instance, **kwargs):
+    cache.delete(instance.response_cache_key)
 
 @receiver(post_save, sender=User)
 def create_player(sender, instance, created, **kwargs):
     if created:
         Player.objects.create(user=instance)
-
-@receiver(post_save, sender=User)
-def save_player(sender, instance, **kwargs):
-    instance.player.save()
\ No newline at end of file
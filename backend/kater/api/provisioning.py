@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from api.models import Player
+
+
+def provision_players(accounts, batch_size=1000):
+    """
+    Creates users and their players from (username, email, password) tuples
+    with two bulk INSERTs per batch, skipping usernames that already exist
+    and repeated ones.
+    A None password makes the account unable to log in.
+
+    Returns the number of created accounts and the skipped usernames.
+    """
+
+    created = 0
+    skipped = []
+    accounts = iter(accounts)
+    with ThreadPoolExecutor(settings.PASSWORD_HASHING_WORKERS) as executor:
+        while batch := list(islice(accounts, batch_size)):
+            existing = set(
+                User.objects.filter(
+                    username__in=[username for username, _, _ in batch]
+                ).values_list("username", flat=True)
+            )
+            unique = []
+            for account in batch:
+                if account[0] in existing:
+                    skipped.append(account[0])
+                else:
+                    existing.add(account[0])  # repeated in the batch
+                    unique.append(account)
+            batch = unique
+
+            # Accounts sharing a password share its hash, e.g. generated ones.
+            passwords = list(dict.fromkeys(password for _, _, password in batch))
+            hashes = dict(zip(passwords, executor.map(make_password, passwords)))
+            users = [
+                User(username=username, email=email, password=hashes[password])
+                for username, email, password in batch
+            ]
+
+            with transaction.atomic():
+                # Bulk inserts send no post_save, so the players are created here.
+                User.objects.bulk_create(users)
+                Player.objects.bulk_create(Player(user=user, version=1) for user in users)
+            created += len(users)
+
+    return created, skipped
+
+
+def generated_accounts(prefix, count, password=None, start=0):
+    """
+    Yields `count` accounts named `prefix` followed by a number.
+    """
+
+    for i in range(start, start + count):
+        username = f"{prefix}{i}"
+        yield username, f"{username}@example.com", password
+
@@ -0,0 +1,196 @@
+"""
+Pushes player state to the frontend over a WebSocket, so it does not have to
+poll /user/.
+
+Saves of a player are published to an in-process broker, which hands them
+to the subscribed connections of that player. A connection sends at most
+one message per PUSH_COALESCE_MS with the fields that changed since its
+previous message, so a burst of saves becomes one small delta.
+"""
+
+import asyncio
+import json
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.http import parse_cookie
+from django.http.request import split_domain_port, validate_host
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import decode_token
+from api.models import Player
+from api.state_cache import player_states, players_flushed
+
+STATE_FIELDS = ["level", "energy", "balance", "experience", "version"]
+
+# Close codes of refused connections, in the range reserved for applications.
+CLOSE_UNAUTHENTICATED = 4401
+CLOSE_FORBIDDEN_ORIGIN = 4403
+
+
+def player_state(player):
+    """
+    Returns the pushed state of a player. Energy is the stored value with the
+    time it refills from, the frontend refills it like the game client does.
+    """
+
+    state = {field: getattr(player, field) for field in STATE_FIELDS}
+    state["energy_updated_at"] = int(player.energy_updated_at.timestamp() * 1000)
+    return state
+
+
+class Subscription:
+    __slots__ = ("pending", "changed")
+
+    def __init__(self):
+        self.pending = None  # latest state not sent yet
+        self.changed = asyncio.Event()
+
+
+class Broker:
+    """
+    In-process publish/subscribe of player states. Subscriptions live on the
+    event loop of the ASGI server, publishing is safe from any thread.
+    """
+
+    def __init__(self):
+        self._subscriptions = {}  # player id -> set of subscriptions
+        self._loop = None
+
+    def subscribe(self, player_id):
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription()
+        self._subscriptions.setdefault(player_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, player_id, subscription):
+        subscriptions = self._subscriptions.get(player_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[player_id]
+
+    def publish(self, player_id, state):
+        if player_id not in self._subscriptions or self._loop is None:
+            return
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(player_id, state)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, player_id, state)
+
+    def _deliver(self, player_id, state):
+        for subscription in self._subscriptions.get(player_id, ()):
+            subscription.pending = state
+            subscription.changed.set()
+
+    def __len__(self):
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+broker = Broker()
+
+
+@receiver(post_save, sender=Player)
+def publish_player(sender, instance, **kwargs):
+    state = player_state(player_states.current(instance))
+    transaction.on_commit(lambda: broker.publish(instance.pk, state))
+
+
+@receiver(players_flushed)
+def publish_flushed_players(sender, states, **kwargs):
+    for player_id, state in states.items():
+        broker.publish(player_id, player_state(Player(id=player_id, **state)))
+
+
+def origin_allowed(origin):
+    """
+    Whether a page of `origin` may open the WebSocket: one of
+    CORS_ALLOWED_ORIGINS, or served from a host of ALLOWED_HOSTS. Browsers
+    send the cookie to any page that connects, so other origins are refused.
+    """
+
+    if origin in getattr(settings, "CORS_ALLOWED_ORIGINS", ()):
+        return True
+
+    domain, _ = split_domain_port(urlsplit(origin).netloc)
+    allowed_hosts = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed_hosts:
+        allowed_hosts = [".localhost", "127.0.0.1", "[::1]"]  # as Django allows then
+    return bool(domain) and validate_host(domain, allowed_hosts)
+
+
+@sync_to_async
+def _authenticated_player(headers):
+    cookies = parse_cookie(headers.get(b"cookie", b"").decode("latin-1"))
+    token = cookies.get("jwt")
+    if not token:
+        return None
+
+    try:
+        claims = decode_token(token)
+    except AuthenticationFailed:
+        return None
+
+    player = Player.objects.filter(user_id=claims["id"], user__is_active=True).first()
+    return None if player is None else player_states.current(player)
+
+
+async def player_socket(scope, receive, send):
+    """
+    ASGI application of the player state WebSocket, authenticated by the
+    `jwt` cookie like the REST endpoints, for pages of allowed origins.
+    """
+
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+
+    headers = dict(scope["headers"])
+    # Clients other than browsers send no origin, and no cookie of their own.
+    origin = headers.get(b"origin")
+    if origin is not None and not origin_allowed(origin.decode("latin-1")):
+        await send({"type": "websocket.close", "code": CLOSE_FORBIDDEN_ORIGIN})
+        return
+
+    player = await _authenticated_player(headers)
+    if player is None:
+        await send({"type": "websocket.close", "code": CLOSE_UNAUTHENTICATED})
+        return
+
+    subscription = broker.subscribe(player.pk)
+    try:
+        await send({"type": "websocket.accept"})
+        state = player_state(player)
+        await send({"type": "websocket.send", "text": json.dumps({"state": state})})
+
+        sender = asyncio.ensure_future(_send_deltas(send, subscription, state))
+        try:
+            while message["type"] != "websocket.disconnect":
+                message = await receive()  # messages from the client are ignored
+        finally:
+            sender.cancel()
+    finally:
+        broker.unsubscribe(player.pk, subscription)
+
+
+async def _send_deltas(send, subscription, state):
+    interval = settings.PUSH_COALESCE_MS / 1000
+    while True:
+        await subscription.changed.wait()
+        await asyncio.sleep(interval)  # lets a burst of saves coalesce
+        subscription.changed.clear()
+
+        pending, subscription.pending = subscription.pending, None
+        delta = {field: value for field, value in pending.items() if state.get(field) != value}
+        if delta:
+            state = pending
+            await send({"type": "websocket.send", "text": json.dumps({"delta": delta})})
@@ -0,0 +1,10 @@
+"""
+Server's copy of the game rules, loaded from the configuration of the game
+client, so both apply the same energy costs, durations and rewards.
+"""
+
+from django.conf import settings
+
+from game.src.engine.config import Config
+
+rules = Config(settings.GAME_CONFIG_PATH)
@@ -1,12 +1,28 @@
+from collections import Counter
+
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Player
+from .market import ITEMS, order_status
+from .models import Order, Player
+from .rules import rules
 
 class PlayerSerializer(serializers.ModelSerializer):
+    """
+    Energy is refilled until the `now` of the context, the current time by default.
+    """
+
+    energy = serializers.SerializerMethodField()
+
     class Meta:
         model = Player
-        fields = "__all__"
+        fields = ["id", "level", "energy", "balance", "experience", "user"]
+
+    def get_energy(self, player):
+        return player.energy_at(self.context.get("now") or timezone.now())[0]
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,8 +36,81 @@ class UserSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         password = validated_data.pop("password")
+        hashed_password = validated_data.pop("hashed_password", None)  # hashed off the request
         instance = self.Meta.model(**validated_data)
-        if password is not None:
+        if hashed_password is not None:
+            instance.password = hashed_password
+        elif password is not None:
             instance.set_password(password)
         instance.save()
-        return instance
\ No newline at end of file
+        return instance
+
+class ActionSerializer(serializers.Serializer):
+    skill = serializers.ChoiceField(choices=list(rules.actions))  # skills and "explore"
+    item = serializers.IntegerField(min_value=0)
+    count = serializers.IntegerField(min_value=1, default=1)
+
+    def validate(self, data):
+        if data["item"] >= len(rules.items[data["skill"]]):
+            raise serializers.ValidationError({"item": "Unknown item."})
+        return data
+
+class ActionBatchSerializer(serializers.Serializer):
+    actions = serializers.ListField(
+        child=ActionSerializer(), allow_empty=False, max_length=settings.ACTION_BATCH_SIZE
+    )
+
+class ProvisionAccountSerializer(serializers.Serializer):
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField(required=False, default="")
+    password = serializers.CharField(required=False, default=None)
+
+class ProvisionSerializer(serializers.Serializer):
+    """
+    Either explicit accounts or `count` accounts named `prefix` and a number.
+    """
+
+    accounts = serializers.ListField(
+        child=ProvisionAccountSerializer(),
+        required=False,
+        max_length=settings.PROVISIONING_REQUEST_SIZE,
+    )
+    count = serializers.IntegerField(
+        required=False, min_value=1, max_value=settings.PROVISIONING_REQUEST_SIZE
+    )
+    prefix = serializers.CharField(required=False, default="player-", max_length=100)
+    start = serializers.IntegerField(required=False, default=0, min_value=0)
+    password = serializers.CharField(required=False, default=None)
+
+    def validate_accounts(self, accounts):
+        usernames = Counter(account["username"] for account in accounts)
+        repeated = [username for username, count in usernames.items() if count > 1]
+        if repeated:
+            raise serializers.ValidationError(f"Repeated usernames: {', '.join(repeated)}.")
+        return accounts
+
+    def validate(self, data):
+        if ("accounts" in data) == ("count" in data):
+            raise serializers.ValidationError("Pass either accounts or count.")
+        return data
+
+class OrderSerializer(serializers.Serializer):
+    item = serializers.ChoiceField(choices=ITEMS)
+    side = serializers.ChoiceField(choices=Order.SIDES)
+    price = serializers.IntegerField(min_value=1, max_value=settings.MARKET_MAX_PRICE)
+    quantity = serializers.IntegerField(min_value=1, max_value=settings.MARKET_MAX_QUANTITY)
+
+class BookOrderSerializer(serializers.Serializer):
+    """
+    An order as the matching engine holds it.
+    """
+
+    id = serializers.IntegerField()
+    item = serializers.CharField()
+    side = serializers.CharField()
+    price = serializers.IntegerField()
+    remaining = serializers.IntegerField()
+    status = serializers.SerializerMethodField()
+
+    def get_status(self, order):
+        return order_status(order)
@@ -0,0 +1,372 @@
+"""
+Write-behind cache of the action progress of players.
+
+Applying actions changes CACHED_FIELDS of a player and adds the gathered
+items to its inventory on every batch. The cache is the only writer of
+those fields: an update changes the cached state right away, adds the items
+to the ones pending for the player and marks it dirty. A background thread
+writes the dirty players behind, every PLAYER_STATE_FLUSH_INTERVAL seconds
+or as soon as PLAYER_STATE_FLUSH_SIZE players are dirty, with the state and
+the items of a player in the same transaction, so any number of updates of
+a player between two flushes costs one row of one bulk UPDATE and a batch
+is never written half. The remaining updates are flushed when the process
+exits, a crash loses the updates of the last interval as a whole.
+
+The balance, which the market changes, and the version stay with the
+database: the cache adds its updates to the version with an F() expression
+and its items to the stacks it reads under the row locks, like the market
+adds what players receive, so neither overwrites the other. Players read from the database are only
+current with the cached state laid over them, see `PlayerStateCache.current`,
+and their inventories with the pending items, see `PlayerStateCache.items`.
+Players are dropped from the cache once they are written.
+
+Like the market and the push broker, the cache runs in one process: it is
+the only writer of CACHED_FIELDS, any other process writing them, or a
+worker of its own, would be overwritten by the next flush.
+
+Flushed players send no post_save, so `players_flushed` tells the push and
+the leaderboards.
+"""
+
+import atexit
+from collections import Counter, OrderedDict
+from copy import copy
+import logging
+from threading import Event, Lock, Thread
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from api.models import InventoryItem, Player
+
+CACHED_FIELDS = ["energy", "energy_updated_at", "experience", "actions_synced_at"]
+
+# State of players sent with players_flushed.
+STATE_FIELDS = ["level", "energy", "energy_updated_at", "balance", "experience", "version"]
+
+logger = logging.getLogger(__name__)
+
+# Sent with `states`, player id -> STATE_FIELDS, after players were written
+# without a save, by the cache or by the market.
+players_flushed = Signal()
+
+
+class PlayerStateStore:
+    """
+    Where the cache writes the states of players behind to.
+    """
+
+    def load(self, player_ids):
+        """
+        Returns (state, updates) of the players among `player_ids` whose state
+        the store holds instead of their rows, with the updates since.
+        """
+
+        raise NotImplementedError
+
+    def write(self, batch):
+        """
+        Writes (state, updates, items) by player id, all or nothing.
+        """
+
+        raise NotImplementedError
+
+
+class DatabaseStore(PlayerStateStore):
+    def load(self, player_ids):
+        return {}  # the rows are written
+
+    def write(self, batch):
+        now = timezone.now()
+        items = {
+            (player_id, name): quantity
+            for player_id, (_, _, gathered) in batch.items()
+            for name, quantity in gathered.items()
+        }
+
+        with transaction.atomic():
+            # Locked in id order, like the market and applying actions lock
+            # them, before their stacks are read.
+            list(Player.objects.select_for_update().filter(id__in=batch).order_by("id").values("id"))
+
+            Player.objects.bulk_update(
+                [
+                    Player(id=player_id, version=F("version") + updates, updated_at=now, **state)
+                    for player_id, (state, updates, _) in batch.items()
+                ],
+                [*CACHED_FIELDS, "version", "updated_at"],
+                batch_size=settings.PLAYER_STATE_FLUSH_SIZE,
+            )
+
+            stock = {
+                (item.player_id, item.name): item
+                for item in InventoryItem.objects.filter(
+                    player_id__in={player_id for player_id, _ in items},
+                    name__in={name for _, name in items},
+                )
+            }
+            changed = []
+            for key, quantity in items.items():
+                if key in stock:
+                    stock[key].quantity += quantity
+                    changed.append(stock[key])
+            InventoryItem.objects.bulk_update(changed, ["quantity"], batch_size=1000)
+            InventoryItem.objects.bulk_create(
+                (
+                    InventoryItem(player_id=player_id, name=name, quantity=quantity)
+                    for (player_id, name), quantity in items.items()
+                    if (player_id, name) not in stock
+                ),
+                batch_size=1000,
+            )
+
+
+class MemoryStore(PlayerStateStore):
+    """
+    Local key-value stand-in for the database, e.g. for development and
+    tests of the cache. The gathered items are kept here too, so the market,
+    which reads inventories from the database, does not see them.
+    """
+
+    def __init__(self):
+        self._states = {}  # player id -> (state, updates)
+        self.items = Counter()  # (player id, item) -> quantity
+        self._lock = Lock()
+
+    def load(self, player_ids):
+        with self._lock:
+            return {
+                player_id: (dict(self._states[player_id][0]), self._states[player_id][1])
+                for player_id in player_ids
+                if player_id in self._states
+            }
+
+    def write(self, batch):
+        with self._lock:
+            for player_id, (state, updates, items) in batch.items():
+                written = self._states.get(player_id, (None, 0))[1]
+                self._states[player_id] = (dict(state), written + updates)
+                for name, quantity in items.items():
+                    self.items[player_id, name] += quantity
+
+
+class CachedState:
+    __slots__ = ("state", "items", "pending", "stored")
+
+    def __init__(self, state, stored=0):
+        self.state = state
+        self.items = Counter()  # gathered, not written yet
+        self.pending = 0  # updates not written yet
+        self.stored = stored  # updates the store holds instead of the row
+
+
+class PlayerStateCache:
+    def __init__(self, store, flush_interval, flush_size, size):
+        self._store = store
+        self._flush_interval = flush_interval
+        self._flush_size = flush_size
+        self._size = size  # most players loaded from the store, the clean ones are evicted first
+        self._states = OrderedDict()  # player id -> CachedState, least recently used first
+        self._dirty = set()
+        self._writing = set()  # flushed players whose write has not finished
+        self._lock = Lock()
+        self._flushing = Lock()  # one batch at a time, in order
+        self._wake = Event()
+        self._thread = None
+        self._closed = False
+
+    def current(self, player):
+        """
+        Returns a copy of a player read from the database with its cached
+        state, and its version counting the updates not written yet.
+        """
+
+        player = copy(player)
+        with self._lock:
+            cached = self._cached(player.pk)
+            if cached is not None:
+                for field, value in cached.state.items():
+                    setattr(player, field, value)
+                player.version += cached.stored + cached.pending
+        return player
+
+    def items(self, player_id):
+        """
+        Returns the quantities of the items gathered by a player that are
+        not written yet, by name.
+        """
+
+        with self._lock:
+            cached = self._states.get(player_id)
+            return {} if cached is None else dict(cached.items)
+
+    def update(self, player, items=None, **fields):
+        """
+        Changes CACHED_FIELDS of a current player, and of its cached state,
+        and adds `items`, quantities by name, to its inventory, written
+        behind with one more version. The player must be locked.
+        """
+
+        invalid = set(fields) - set(CACHED_FIELDS)
+        if invalid:
+            raise ValueError(f"Cannot update {sorted(invalid)}.")
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The player state cache is closed.")
+            self._start()
+
+            for field, value in fields.items():
+                setattr(player, field, value)
+            player.version += 1
+
+            cached = self._cached(player.pk)
+            if cached is None:
+                cached = self._states[player.pk] = CachedState({})
+            cached.state = {field: getattr(player, field) for field in CACHED_FIELDS}
+            cached.items.update(items or {})
+            cached.pending += 1
+            self._dirty.add(player.pk)
+
+            if len(self._dirty) >= self._flush_size:
+                self._wake.set()
+
+    def states(self, player_ids):
+        """
+        Returns STATE_FIELDS of the existing players among `player_ids`, with
+        their cached state.
+        """
+
+        rows = list(Player.objects.filter(id__in=player_ids).values("id", *STATE_FIELDS))
+        states = {}
+        with self._lock:
+            for row in rows:
+                player_id = row.pop("id")
+                cached = self._cached(player_id)
+                if cached is not None:
+                    row.update(
+                        (field, value) for field, value in cached.state.items() if field in row
+                    )
+                    row["version"] += cached.stored + cached.pending
+                states[player_id] = row
+        return states
+
+    def flush(self, player_ids=None):
+        """
+        Writes the dirty players, or the dirty ones among `player_ids`, and
+        puts them back if the write fails.
+        """
+
+        with self._flushing:
+            with self._lock:
+                if player_ids is None:
+                    dirty, self._dirty = self._dirty, set()
+                else:
+                    dirty = self._dirty.intersection(player_ids)
+                    self._dirty -= dirty
+                self._writing = dirty
+                batch = {}
+                for player_id in dirty:
+                    cached = self._states[player_id]
+                    batch[player_id] = (dict(cached.state), cached.pending, dict(cached.items))
+            if not batch:
+                return
+
+            try:
+                self._store.write(batch)
+                stored = self._store.load(list(batch))
+            except Exception:
+                with self._lock:
+                    self._dirty |= dirty
+                    self._writing = set()
+                raise
+
+            with self._lock:
+                for player_id, (_, updates, items) in batch.items():
+                    cached = self._states.get(player_id)
+                    if cached is None:  # cleared meanwhile
+                        continue
+                    cached.pending -= updates
+                    cached.items.subtract(items)
+                    cached.items = +cached.items
+                    cached.stored = stored.get(player_id, (None, 0))[1]
+                    if not cached.pending:
+                        # Written, and read from the store or the row again,
+                        # which other writers may change from now on.
+                        del self._states[player_id]
+                self._writing = set()
+
+        players_flushed.send(sender=type(self._store), states=self.states(list(batch)))
+
+    def clear(self):
+        """
+        Forgets every cached state, also the ones not written yet.
+        """
+
+        with self._lock:
+            self._states.clear()
+            self._dirty.clear()
+
+    def close(self):
+        """
+        Stops the flusher and writes what is still dirty.
+        """
+
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def __len__(self):
+        return len(self._states)
+
+    def _cached(self, player_id):
+        cached = self._states.get(player_id)
+        if cached is None:
+            loaded = self._store.load([player_id]).get(player_id)
+            if loaded is None:
+                return None
+            cached = self._states[player_id] = CachedState(*loaded)
+            self._evict()
+
+        self._states.move_to_end(player_id)
+        return cached
+
+    def _evict(self):
+        # The newest player, just loaded, is last and never evicted. Players
+        # not written yet stay too.
+        for player_id in list(self._states)[:-1]:
+            if len(self._states) <= self._size:
+                break
+            if player_id not in self._dirty and player_id not in self._writing:
+                del self._states[player_id]
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name="player-state-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing player states failed, retrying with the next batch.")
+
+
+STORES = {"database": DatabaseStore, "memory": MemoryStore}
+
+player_states = PlayerStateCache(
+    STORES[settings.PLAYER_STATE_STORE](),
+    settings.PLAYER_STATE_FLUSH_INTERVAL,
+    settings.PLAYER_STATE_FLUSH_SIZE,
+    settings.PLAYER_STATE_CACHE_SIZE,
+)
+atexit.register(player_states.close)
@@ -1,3 +1,925 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+import json
+from threading import Event
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import jwt
+
+from api import leaderboards
+from api.authentication import claims_cache, encode_token
+from api.hashing import HashingPool, PoolSaturated
+from api.market import ITEMS, Market, market
+from api.matching import BUY, SELL, BookOrder, MatchingEngine
+from api.models import InventoryItem, Order, Player, Trade
+from api.provisioning import generated_accounts, provision_players
+from api.push import CLOSE_FORBIDDEN_ORIGIN, CLOSE_UNAUTHENTICATED, origin_allowed, player_socket
+from api.rules import rules
+from api.state_cache import (
+    DatabaseStore,
+    MemoryStore,
+    PlayerStateCache,
+    player_states,
+    players_flushed,
+)
+
+
+def create_user(username, password="password", **player_fields):
+    user = User.objects.create_user(username, f"{username}@example.com", password)
+    if player_fields:
+        Player.objects.filter(user=user).update(**player_fields)
+    return user
+
+
+def logged_in(user):
+    client = Client()
+    client.cookies["jwt"] = encode_token(user)
+    return client
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        # Written behind only when a test flushes, in its transaction.
+        self.enterContext(mock.patch.object(PlayerStateCache, "_start"))
+        self.enterContext(mock.patch.object(Market, "_start"))
+        self.addCleanup(player_states.clear)
+        self.addCleanup(market.clear)
+        claims_cache.clear()
+        cache.clear()
+        for board in leaderboards.BOARDS:
+            leaderboards.top[board].invalidate()
+
+
+class AuthenticationTest(ApiTestCase):
+    def test_login_sets_the_cookie(self):
+        create_user("alice")
+
+        response = Client().post(
+            "/login/", {"username": "alice", "password": "password"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies["jwt"].value, response.json()["jwt"])
+
+    def test_login_rejects_a_wrong_password(self):
+        create_user("alice")
+
+        response = Client().post(
+            "/login/", {"username": "alice", "password": "wrong"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_user_in_one_query_with_cached_claims(self):
+        client = logged_in(create_user("alice"))
+        client.get("/user/")
+
+        with self.assertNumQueries(1):
+            response = client.get("/user/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["username"], "alice")
+        self.assertEqual(len(claims_cache), 1)
+
+    def test_rejects_bad_tokens(self):
+        user = create_user("alice")
+        expired = jwt.encode(
+            {"id": user.id, "exp": int(time.time()) - 1},
+            settings.JWT_SECRET,
+            algorithm=settings.JWT_ALGORITHM,
+        )
+
+        for token in ("garbage", expired, encode_token(user) + "x"):
+            client = Client()
+            client.cookies["jwt"] = token
+            with self.subTest(token=token):
+                self.assertEqual(client.get("/user/").status_code, 403)
+
+    def test_rejects_inactive_users(self):
+        user = create_user("alice")
+        client = logged_in(user)
+        User.objects.filter(pk=user.pk).update(is_active=False)
+
+        self.assertEqual(client.get("/user/").status_code, 403)
+
+
+class UserViewTest(ApiTestCase):
+    def test_unchanged_player_is_not_modified(self):
+        client = logged_in(create_user("alice"))
+        etag = client.get("/user/")["ETag"]
+
+        response = client.get("/user/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changed_player_is_sent_again(self):
+        user = create_user("alice")
+        client = logged_in(user)
+        etag = client.get("/user/")["ETag"]
+
+        user.player.balance = 5
+        user.player.save(update_fields=["balance"])
+        response = client.get("/user/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["player"]["balance"], 5)
+
+    def test_changed_user_is_sent_again(self):
+        user = create_user("alice")
+        client = logged_in(user)
+        etag = client.get("/user/")["ETag"]
+
+        user.email = "alice@example.org"
+        user.save()
+        response = client.get("/user/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["email"], "alice@example.org")
+
+    def test_user_saves_do_not_write_the_player(self):
+        user = create_user("alice")
+        client = logged_in(user)
+        etag = client.get("/user/")["ETag"]
+        version = Player.objects.get(user=user).version
+
+        user.last_login = timezone.now()
+        user.save(update_fields=["last_login"])
+        self.assertEqual(Player.objects.get(user=user).version, version)
+        self.assertEqual(client.get("/user/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class RegisterTest(ApiTestCase):
+    def test_registers_a_user_with_a_player(self):
+        response = Client().post(
+            "/register/",
+            {"username": "alice", "email": "alice@example.com", "password": "password"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(username="alice")
+        self.assertTrue(user.check_password("password"))
+        self.assertTrue(Player.objects.filter(user=user).exists())
+
+    def test_rejects_a_taken_username(self):
+        create_user("alice")
+
+        response = Client().post(
+            "/register/", {"username": "alice", "password": "password"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_refuses_when_the_hashing_pool_is_saturated(self):
+        create_user("alice")
+        saturated = HashingPool(1, 0)
+        self.addCleanup(saturated.shutdown)
+
+        with mock.patch("api.views.hashing_pool", saturated):
+            for path, username in (("/register/", "bob"), ("/login/", "alice")):
+                response = Client().post(
+                    path, {"username": username, "password": "password"}, content_type="application/json"
+                )
+                with self.subTest(path=path):
+                    self.assertEqual(response.status_code, 503)
+                    self.assertEqual(response["Retry-After"], "1")
+
+
+class HashingPoolTest(SimpleTestCase):
+    async def test_cancelled_hash_holds_its_slot_until_done(self):
+        pool = HashingPool(1, 1)
+        self.addCleanup(pool.shutdown)
+        started, done = Event(), Event()
+
+        def hash():
+            started.set()
+            done.wait()
+
+        waiting = asyncio.ensure_future(pool.run(hash))
+        await asyncio.to_thread(started.wait)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        with self.assertRaises(PoolSaturated):
+            await pool.run(time.sleep, 0)
+
+        done.set()
+        await asyncio.to_thread(pool._executor.submit(lambda: None).result)
+        self.assertIsNone(await pool.run(time.sleep, 0))
+
+
+class ActionsTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.synced_at = timezone.now() - timedelta(minutes=1)
+        # Refills from an hour ahead, so none happen during the test.
+        self.user = create_user(
+            "alice",
+            energy=rules.caps.energy,
+            energy_updated_at=timezone.now() + timedelta(hours=1),
+            actions_synced_at=self.synced_at,
+        )
+        self.client = logged_in(self.user)
+
+    def post(self, *actions):
+        return self.client.post("/actions/", {"actions": list(actions)}, content_type="application/json")
+
+    def test_applies_the_actions(self):
+        copper = rules.items["mining"][0]
+        explore = rules.items["explore"][0]
+
+        response = self.post(
+            {"skill": "mining", "item": 0, "count": 2}, {"skill": "explore", "item": 0}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["delta"],
+            {
+                "energy": -(copper.energy * 2 + explore.energy),
+                "experience": copper.experience * 2 + explore.experience,
+                "items": {copper.name: 2},
+            },
+        )
+
+        player_states.flush()
+        player = Player.objects.get(user=self.user)
+        self.assertEqual(player.energy, rules.caps.energy - copper.energy * 2 - explore.energy)
+        self.assertEqual(player.items.get(name=copper.name).quantity, 2)
+        # Skills run side by side, the next batch starts after the longest.
+        self.assertEqual(
+            player.actions_synced_at,
+            self.synced_at + timedelta(milliseconds=max(copper.duration * 2, explore.duration)),
+        )
+
+    def test_rejects_without_energy(self):
+        Player.objects.filter(user=self.user).update(energy=rules.items["mining"][0].energy)
+
+        response = self.post({"skill": "mining", "item": 0}, {"skill": "mining", "item": 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"actions": {"1": ["Not enough energy."]}})
+        self.assertFalse(InventoryItem.objects.exists())
+
+    def test_rejects_actions_faster_than_their_duration(self):
+        count = 60_000 // rules.items["mining"][0].duration + 1
+
+        response = self.post({"skill": "mining", "item": 0, "count": count})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json(), {"actions": {"0": ["Finished faster than its duration allows."]}}
+        )
+        self.assertEqual(Player.objects.get(user=self.user).actions_synced_at, self.synced_at)
+
+    def test_rejects_a_new_item_in_a_full_inventory(self):
+        player = Player.objects.get(user=self.user)
+        InventoryItem.objects.bulk_create(
+            InventoryItem(player=player, name=f"Item {i}", quantity=1)
+            for i in range(rules.inventory.size)
+        )
+
+        response = self.post({"skill": "mining", "item": 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"actions": {"0": ["Inventory is full."]}})
+
+    def test_full_inventory_rejects_the_action_that_needs_a_new_slot(self):
+        player = Player.objects.get(user=self.user)
+        InventoryItem.objects.bulk_create(
+            InventoryItem(player=player, name=f"Item {i}", quantity=1)
+            for i in range(rules.inventory.size - 1)
+        )
+
+        response = self.post(
+            {"skill": "mining", "item": 0},
+            {"skill": "mining", "item": 1},
+            {"skill": "explore", "item": 0},
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"actions": {"1": ["Inventory is full."]}})
+
+    def test_rejects_unknown_items(self):
+        response = self.post({"skill": "mining", "item": len(rules.items["mining"])})
+        self.assertEqual(response.status_code, 400)
+
+    def test_requires_a_login(self):
+        response = Client().post(
+            "/actions/", {"actions": [{"skill": "mining", "item": 0}]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class ProvisionPlayersTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        admin = create_user("admin")
+        admin.is_staff = True
+        admin.save()
+        self.client = logged_in(admin)
+
+    def post(self, data):
+        return self.client.post("/players/provision/", data, content_type="application/json")
+
+    def test_creates_accounts_and_skips_existing_ones(self):
+        create_user("alice")
+
+        response = self.post(
+            {"accounts": [{"username": "alice"}, {"username": "bob", "password": "password"}]}
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"created": 1, "skipped": ["alice"]})
+        bob = User.objects.get(username="bob")
+        self.assertTrue(bob.check_password("password"))
+        self.assertEqual(bob.player.version, 1)
+
+    def test_creates_generated_accounts(self):
+        response = self.post({"count": 3, "prefix": "test-", "start": 5})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(Player.objects.values_list("user__username", flat=True)),
+            ["admin", "test-5", "test-6", "test-7"],
+        )
+
+    def test_rejects_repeated_usernames(self):
+        response = self.post({"accounts": [{"username": "bob"}, {"username": "bob"}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(username="bob").exists())
+
+    def test_rejects_accounts_with_count(self):
+        response = self.post({"accounts": [{"username": "bob"}], "count": 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_is_for_staff_only(self):
+        response = logged_in(create_user("alice")).post(
+            "/players/provision/", {"count": 1}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(User.objects.count(), 2)
+
+    def test_skips_usernames_repeated_in_a_batch(self):
+        created, skipped = provision_players([("bob", "", None), ("bob", "", None)])
+        self.assertEqual((created, skipped), (1, ["bob"]))
+
+
+class EnergyTest(SimpleTestCase):
+    def setUp(self):
+        self.start = timezone.now()
+        self.period = timedelta(milliseconds=rules.rates.energy)
+        self.refill = rules.rates.base_energy_refill
+
+    def player(self, energy):
+        return Player(energy=energy, energy_updated_at=self.start)
+
+    def test_refills_once_per_period(self):
+        player = self.player(0)
+
+        self.assertEqual(player.energy_at(self.start), (0, self.start))
+        self.assertEqual(player.energy_at(self.start + self.period * 0.5), (0, self.start))
+        self.assertEqual(
+            player.energy_at(self.start + self.period * 3.5),
+            (3 * self.refill, self.start + self.period * 3),
+        )
+
+    def test_stops_at_the_cap(self):
+        cap = rules.caps.energy
+        player = self.player(cap - self.refill)
+
+        energy, refilled_at = player.energy_at(self.start + self.period * 10)
+        self.assertEqual((energy, refilled_at), (cap, self.start + self.period))
+        self.assertEqual(self.player(cap + 5).energy_at(self.start + self.period), (cap + 5, self.start))
+
+    def test_refill_in_progress_continues(self):
+        player = self.player(0)
+
+        player.refill_energy(self.start + self.period * 2.5)
+        self.assertEqual(player.energy, 2 * self.refill)
+        self.assertEqual(player.energy_updated_at, self.start + self.period * 2)
+        self.assertEqual(player.energy_at(self.start + self.period * 3)[0], 3 * self.refill)
+
+    def test_full_refill_starts_over(self):
+        player = self.player(rules.caps.energy)
+        now = self.start + self.period * 2.5
+
+        player.refill_energy(now)
+        self.assertEqual((player.energy, player.energy_updated_at), (rules.caps.energy, now))
+
+
+class LazyEnergyTest(ApiTestCase):
+    def test_user_shows_the_refilled_energy(self):
+        period = timedelta(milliseconds=rules.rates.energy)
+        user = create_user("alice", energy=0, energy_updated_at=timezone.now() - period * 3.5)
+
+        response = logged_in(user).get("/user/")
+        self.assertEqual(response.json()["player"]["energy"], 3 * rules.rates.base_energy_refill)
+        self.assertEqual(Player.objects.get(user=user).energy, 0)  # not written by reading
+
+    def test_actions_spend_the_refilled_energy(self):
+        period = timedelta(milliseconds=rules.rates.energy)
+        record = rules.items["mining"][0]
+        refills = -(-record.energy // rules.rates.base_energy_refill)
+        user = create_user(
+            "alice",
+            energy=0,
+            energy_updated_at=timezone.now() - period * (refills + 0.5),
+            actions_synced_at=timezone.now() - timedelta(minutes=1),
+        )
+
+        response = logged_in(user).post(
+            "/actions/", {"actions": [{"skill": "mining", "item": 0}]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        player_states.flush()
+        player = Player.objects.get(user=user)
+        self.assertEqual(player.energy, refills * rules.rates.base_energy_refill - record.energy)
+
+
+class PlayerStateCacheTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("alice", actions_synced_at=timezone.now() - timedelta(minutes=1))
+        self.client = logged_in(self.user)
+        self.player = Player.objects.get(user=self.user)
+
+    def act(self):
+        response = self.client.post(
+            "/actions/", {"actions": [{"skill": "mining", "item": 0}]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()["player"]
+
+    def test_coalesces_updates_into_one_write(self):
+        for _ in range(3):
+            experience = self.act()["experience"]
+        self.assertEqual(Player.objects.get(pk=self.player.pk).experience, 0)  # not written yet
+
+        flushed = []
+        receiver = lambda states, **kwargs: flushed.append(states)  # noqa: E731
+        players_flushed.connect(receiver)
+        self.addCleanup(players_flushed.disconnect, receiver)
+        with CaptureQueriesContext(connection) as queries:
+            player_states.flush()
+
+        updates = [query for query in queries if query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        player = Player.objects.get(pk=self.player.pk)
+        self.assertEqual(player.experience, experience)
+        self.assertEqual(player.version, self.player.version + 3)
+        self.assertEqual(flushed[0][player.pk]["experience"], experience)
+        self.assertEqual(flushed[0][player.pk]["version"], player.version)
+
+        with self.assertNumQueries(0):
+            player_states.flush()  # nothing dirty
+
+    def test_reads_see_the_updates_not_written(self):
+        etag = self.client.get("/user/")["ETag"]
+        experience = self.act()["experience"]
+
+        response = self.client.get("/user/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["player"]["experience"], experience)
+        etag = response["ETag"]
+
+        player_states.flush()
+        self.assertEqual(self.client.get("/user/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_flush_keeps_the_balance_and_versions_of_other_writers(self):
+        self.act()
+        # Like the market pays a player.
+        Player.objects.filter(pk=self.player.pk).update(
+            balance=F("balance") + 10, version=F("version") + 1
+        )
+        player_states.flush()
+
+        player = Player.objects.get(pk=self.player.pk)
+        self.assertEqual(player.balance, 10)
+        self.assertEqual(player.version, self.player.version + 2)
+        self.assertEqual(player.experience, rules.items["mining"][0].experience)
+
+    def test_failed_write_is_retried(self):
+        experience = self.act()["experience"]
+
+        with mock.patch.object(DatabaseStore, "write", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                player_states.flush()
+        self.assertEqual(player_states.current(self.player).experience, experience)
+
+        player_states.flush()
+        self.assertEqual(Player.objects.get(pk=self.player.pk).experience, experience)
+
+    def test_items_are_written_with_the_progress(self):
+        copper = rules.items["mining"][0].name
+        experience = self.act()["experience"]
+        self.assertFalse(InventoryItem.objects.exists())  # not written yet
+        self.assertEqual(player_states.items(self.player.pk), {copper: 1})
+
+        with mock.patch.object(InventoryItem.objects, "bulk_create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                player_states.flush()
+        self.assertEqual(Player.objects.get(pk=self.player.pk).experience, 0)  # rolled back
+
+        self.act()
+        player_states.flush()
+        self.assertEqual(self.player.items.get(name=copper).quantity, 2)
+        self.assertGreater(Player.objects.get(pk=self.player.pk).experience, experience)
+        self.assertEqual(player_states.items(self.player.pk), {})
+
+    def test_written_players_are_read_from_the_database(self):
+        self.act()
+        player_states.flush()
+        self.assertEqual(len(player_states), 0)
+
+        # Written by another process after the flush.
+        Player.objects.filter(pk=self.player.pk).update(experience=100, version=F("version") + 1)
+        self.assertEqual(player_states.current(self.player).experience, self.player.experience)
+        player = Player.objects.get(pk=self.player.pk)
+        self.assertEqual(player_states.current(player).experience, 100)
+
+        experience = self.act()["experience"]
+        self.assertEqual(experience, 100 + rules.items["mining"][0].experience)
+        player_states.flush()
+        self.assertEqual(Player.objects.get(pk=self.player.pk).experience, experience)
+
+    def test_gathered_items_can_be_sold(self):
+        copper = rules.items["mining"][0].name
+        self.act()
+
+        response = self.client.post(
+            "/market/orders/",
+            {"item": copper, "side": SELL, "price": 10, "quantity": 1},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.player.items.get(name=copper).quantity, 0)
+        self.assertEqual(player_states.items(self.player.pk), {})
+
+    def test_memory_store(self):
+        store = MemoryStore()
+        states = PlayerStateCache(store, 1, 100, 100)
+
+        player = states.current(self.player)
+        states.update(player, experience=5)
+        states.update(player, experience=7)
+        states.flush()
+        self.assertEqual(Player.objects.get(pk=self.player.pk).experience, 0)  # in the store
+
+        # Another process with the same store.
+        restarted = PlayerStateCache(store, 1, 100, 100)
+        player = restarted.current(self.player)
+        self.assertEqual((player.experience, player.version), (7, self.player.version + 2))
+
+    def test_rejects_fields_it_does_not_own(self):
+        with self.assertRaises(ValueError):
+            player_states.update(player_states.current(self.player), balance=5)
+
+
+class Socket:
+    """
+    One connection to the push WebSocket, driven in process.
+    """
+
+    def __init__(self, headers):
+        self.scope = {"type": "websocket", "path": "/ws/player/", "headers": headers}
+        self.inbound = asyncio.Queue()
+        self.sent = asyncio.Queue()
+        self.inbound.put_nowait({"type": "websocket.connect"})
+        self.task = asyncio.ensure_future(player_socket(self.scope, self.inbound.get, self.sent.put))
+
+    async def receive(self):
+        return await asyncio.wait_for(self.sent.get(), 5)
+
+    async def close(self):
+        self.inbound.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 5)
+
+
+@override_settings(ALLOWED_HOSTS=["kater.example"], CORS_ALLOWED_ORIGINS=["http://localhost:3000"])
+class PushTest(ApiTestCase):
+    def headers(self, user, origin=None):
+        headers = [(b"cookie", f"jwt={encode_token(user)}".encode())]
+        if origin is not None:
+            headers.append((b"origin", origin.encode()))
+        return headers
+
+    def test_origins(self):
+        for origin, allowed in (
+            ("https://kater.example", True),
+            ("https://kater.example:8443", True),
+            ("http://localhost:3000", True),
+            ("http://localhost:3001", False),
+            ("https://evil.example", False),
+            ("null", False),
+        ):
+            with self.subTest(origin=origin):
+                self.assertEqual(origin_allowed(origin), allowed)
+
+    async def test_sends_the_state_to_an_allowed_origin(self):
+        user = await User.objects.acreate(username="alice")
+        socket = Socket(self.headers(user, "https://kater.example"))
+
+        self.assertEqual((await socket.receive())["type"], "websocket.accept")
+        state = json.loads((await socket.receive())["text"])["state"]
+        self.assertEqual(state["balance"], 0)
+        await socket.close()
+
+    async def test_pushes_changes_as_deltas(self):
+        user = await User.objects.acreate(username="alice")
+        socket = Socket(self.headers(user, "https://kater.example"))
+        await socket.receive()
+        await socket.receive()
+
+        player = await Player.objects.aget(user=user)
+        player.balance = 5
+
+        @sync_to_async
+        def save():
+            with self.captureOnCommitCallbacks(execute=True):
+                player.save(update_fields=["balance"])
+
+        await save()
+        delta = json.loads((await socket.receive())["text"])["delta"]
+        self.assertEqual(delta, {"balance": 5, "version": player.version})
+        await socket.close()
+
+    async def test_accepts_clients_without_an_origin(self):
+        user = await User.objects.acreate(username="alice")
+        socket = Socket(self.headers(user))
+
+        self.assertEqual((await socket.receive())["type"], "websocket.accept")
+        await socket.close()
+
+    async def test_refuses_other_origins(self):
+        user = await User.objects.acreate(username="alice")
+        socket = Socket(self.headers(user, "https://evil.example"))
+
+        self.assertEqual(
+            await socket.receive(), {"type": "websocket.close", "code": CLOSE_FORBIDDEN_ORIGIN}
+        )
+        await asyncio.wait_for(socket.task, 5)
+
+    async def test_refuses_connections_without_a_login(self):
+        socket = Socket([(b"origin", b"https://kater.example")])
+
+        self.assertEqual(
+            await socket.receive(), {"type": "websocket.close", "code": CLOSE_UNAUTHENTICATED}
+        )
+        await asyncio.wait_for(socket.task, 5)
+
+
+class LeaderboardTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        provision_players(generated_accounts("player-", 50))
+        for i, player in enumerate(Player.objects.order_by("id")):
+            player.balance = i * 7 % 50
+            player.save(update_fields=["balance"])
+
+    def ranked(self):
+        return list(Player.objects.order_by("-balance", "-id").values_list("id", "balance"))
+
+    def test_pages_follow_the_cursor(self):
+        client = Client()
+        results = []
+        url = "/leaderboards/balance/?limit=20"
+        while url:
+            page = client.get(url).json()
+            results.extend(page["results"])
+            url = page["next"] and f"/leaderboards/balance/?limit=20&after={page['next']}"
+
+        self.assertEqual([(r["player"], r["value"]) for r in results], self.ranked())
+        self.assertEqual([r["rank"] for r in results], list(range(1, 51)))
+
+    def test_rejects_unknown_boards_and_cursors(self):
+        self.assertEqual(Client().get("/leaderboards/unknown/").status_code, 404)
+        self.assertEqual(Client().get("/leaderboards/balance/?after=1:2").status_code, 400)
+        self.assertEqual(Client().get("/leaderboards/balance/?limit=0").status_code, 400)
+
+    def test_pages_in_the_top_are_served_from_memory(self):
+        first = Client().get("/leaderboards/balance/?limit=20").json()
+        with self.assertNumQueries(1):  # the usernames
+            second = Client().get(f"/leaderboards/balance/?limit=20&after={first['next']}").json()
+        self.assertEqual([(r["player"], r["value"]) for r in second["results"]], self.ranked()[20:40])
+
+    def test_pages_below_the_top_come_from_the_index(self):
+        with mock.patch.object(leaderboards.top["balance"], "_size", 30):
+            leaderboards.top["balance"].invalidate()
+            first = Client().get("/leaderboards/balance/?limit=20").json()
+            # Reaches below the top, so all of it is read from the index.
+            Player.objects.filter(id=first["results"][-1]["player"]).update(balance=-1)
+            second = Client().get(f"/leaderboards/balance/?limit=20&after={first['next']}").json()
+        self.assertEqual(
+            [(r["player"], r["value"]) for r in second["results"]], self.ranked()[19:39]
+        )
+
+    def test_rank_in_the_top(self):
+        player_id, value = self.ranked()[3]
+        client = logged_in(Player.objects.get(id=player_id).user)
+
+        response = client.get("/leaderboards/balance/me/")
+        self.assertEqual(response.json(), {"rank": 4, "value": value})
+
+    def test_rank_below_the_top_is_counted(self):
+        with mock.patch.object(leaderboards.top["balance"], "_size", 10):
+            leaderboards.top["balance"].invalidate()
+            for rank, (player_id, _) in enumerate(self.ranked(), 1):
+                with self.subTest(rank=rank):
+                    self.assertEqual(
+                        leaderboards.rank("balance", Player.objects.get(id=player_id)), rank
+                    )
+
+
+class MatchingEngineTest(SimpleTestCase):
+    def setUp(self):
+        self.engine = MatchingEngine()
+        self.ids = iter(range(1, 1000))
+
+    def place(self, player_id, side, price, quantity, item="Carp"):
+        order = BookOrder(next(self.ids), player_id, item, side, price, quantity)
+        return order, self.engine.place(order)
+
+    def test_matches_best_price_then_oldest(self):
+        self.place(1, SELL, 12, 5)
+        cheap, _ = self.place(2, SELL, 10, 5)
+        older, _ = self.place(3, SELL, 11, 5)
+        newer, _ = self.place(4, SELL, 11, 5)
+
+        buy, matches = self.place(5, BUY, 11, 12)
+        self.assertEqual(
+            [(match.sell, match.price, match.quantity) for match in matches],
+            [(cheap, 10, 5), (older, 11, 5), (newer, 11, 2)],
+        )
+        self.assertEqual(buy.remaining, 0)
+        self.assertEqual(newer.remaining, 3)
+        self.assertEqual(self.engine.depth("Carp", 10), ([], [(11, 3), (12, 5)]))
+
+    def test_rests_what_does_not_cross(self):
+        self.place(1, SELL, 12, 5)
+        buy, matches = self.place(2, BUY, 11, 4)
+
+        self.assertEqual(matches, [])
+        self.assertIs(self.engine.orders[buy.id], buy)
+        self.assertEqual(self.engine.depth("Carp", 10), ([(11, 4)], [(12, 5)]))
+        self.assertEqual(self.engine.depth("Salmon", 10), ([], []))
+
+    def test_cancel(self):
+        sell, _ = self.place(1, SELL, 10, 5)
+        self.place(2, BUY, 10, 2)
+
+        self.assertEqual(self.engine.cancel(sell.id), (sell, 3))
+        self.assertEqual(self.engine.cancel(sell.id), (None, 0))
+        self.assertEqual(self.place(3, BUY, 10, 1)[1], [])
+        self.assertEqual(self.engine.depth("Carp", 10), ([(10, 1)], []))
+
+    def test_cancels_orders_meeting_their_own_player(self):
+        own, _ = self.place(1, SELL, 10, 5)
+        self.place(2, SELL, 11, 5)
+
+        buy, matches = self.place(1, BUY, 11, 3)
+        self.assertEqual(matches, [])
+        self.assertTrue(buy.cancelled)
+        self.assertEqual(buy.remaining, 3)
+        self.assertNotIn(buy.id, self.engine.orders)
+        self.assertEqual(self.engine.depth("Carp", 10), ([], [(10, 5), (11, 5)]))
+
+        # Matched with the orders of others until it meets its own.
+        other, _ = self.place(3, SELL, 9, 2)
+        buy, matches = self.place(1, BUY, 10, 4)
+        self.assertEqual([(match.sell, match.quantity) for match in matches], [(other, 2)])
+        self.assertEqual((buy.remaining, buy.cancelled), (2, True))
+        self.assertEqual(own.remaining, 5)
+
+    def test_rejects_orders_placed_twice(self):
+        order, _ = self.place(1, SELL, 10, 5)
+        with self.assertRaises(ValueError):
+            self.engine.place(order)
+
+
+class MarketTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.item = ITEMS[0]
+        self.seller = create_user("seller")
+        self.buyer = create_user("buyer", balance=1000)
+        InventoryItem.objects.create(player=self.seller.player, name=self.item, quantity=10)
+
+    def place(self, user, side, price, quantity, item=None):
+        return logged_in(user).post(
+            "/market/orders/",
+            {"item": item or self.item, "side": side, "price": price, "quantity": quantity},
+            content_type="application/json",
+        )
+
+    def quantity(self, user, item=None):
+        stock = InventoryItem.objects.filter(player__user=user, name=item or self.item).first()
+        return None if stock is None else stock.quantity
+
+    def balance(self, user):
+        return Player.objects.get(user=user).balance
+
+    def test_trades_are_written_when_flushed(self):
+        self.assertEqual(self.place(self.seller, SELL, 10, 4).status_code, 201)
+        self.assertEqual(self.quantity(self.seller), 6)  # taken when placed
+
+        response = self.place(self.buyer, BUY, 12, 6)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["trades"], [{"price": 10, "quantity": 4}])
+        self.assertEqual(response.json()["order"]["remaining"], 2)
+        self.assertEqual(self.balance(self.buyer), 1000 - 12 * 6)
+        self.assertEqual(Trade.objects.count(), 0)  # written behind
+
+        market.flush()
+        self.assertEqual(self.balance(self.seller), 40)
+        self.assertEqual(self.balance(self.buyer), 1000 - 10 * 4 - 12 * 2)
+        self.assertEqual(self.quantity(self.buyer), 4)
+        self.assertEqual(
+            list(Order.objects.order_by("id").values_list("remaining", "status")),
+            [(0, Order.FILLED), (2, Order.OPEN)],
+        )
+        self.assertEqual(list(Trade.objects.values_list("price", "quantity")), [(10, 4)])
+
+    def test_cancel_gives_back_what_remains(self):
+        order = self.place(self.buyer, BUY, 10, 5).json()["order"]
+
+        client = logged_in(self.seller)
+        self.assertEqual(client.delete(f"/market/orders/{order['id']}/").status_code, 404)
+        client = logged_in(self.buyer)
+        response = client.delete(f"/market/orders/{order['id']}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["order"]["status"], Order.CANCELLED)
+        self.assertEqual(self.balance(self.buyer), 1000)
+        self.assertEqual(Order.objects.get().status, Order.CANCELLED)
+        self.assertEqual(client.delete(f"/market/orders/{order['id']}/").status_code, 404)
+
+    def test_orders_meeting_their_own_player_are_cancelled(self):
+        Player.objects.filter(user=self.seller).update(balance=100)
+        self.place(self.seller, SELL, 10, 4)
+
+        response = self.place(self.seller, BUY, 10, 2)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["trades"], [])
+        self.assertEqual(response.json()["order"]["status"], Order.CANCELLED)
+        self.assertEqual(self.balance(self.seller), 100)  # given back
+        self.assertEqual(market.depth(self.item, 10), ([], [(10, 4)]))
+
+    def test_rejects_what_the_player_does_not_have(self):
+        self.assertEqual(self.place(self.seller, SELL, 10, 11).status_code, 400)
+        self.assertEqual(self.place(self.buyer, BUY, 10, 101).status_code, 400)
+        self.assertEqual(self.place(self.buyer, BUY, 10, 1, item="Gold").status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_buying_reserves_the_inventory_slot(self):
+        InventoryItem.objects.bulk_create(
+            InventoryItem(player=self.buyer.player, name=f"Item {i}", quantity=1)
+            for i in range(rules.inventory.size - 1)
+        )
+        self.assertEqual(self.place(self.buyer, BUY, 10, 3).status_code, 201)
+        self.assertEqual(self.quantity(self.buyer), 0)
+        self.assertEqual(
+            self.place(self.buyer, BUY, 10, 1, item=ITEMS[1]).json(),
+            {"item": ["Inventory is full."]},
+        )
+
+        self.place(self.seller, SELL, 10, 3)
+        market.flush()
+        self.assertEqual(self.quantity(self.buyer), 3)
+        self.assertEqual(
+            InventoryItem.objects.filter(player__user=self.buyer).count(), rules.inventory.size
+        )
+
+    def test_failed_flush_is_retried(self):
+        self.place(self.seller, SELL, 10, 4)
+        self.place(self.buyer, BUY, 10, 4)
+
+        with mock.patch("api.market._write", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                market.flush()
+        self.assertEqual(self.balance(self.seller), 0)
+
+        market.flush()
+        self.assertEqual(self.balance(self.seller), 40)
+        self.assertEqual(self.quantity(self.buyer), 4)
+        self.assertEqual(Trade.objects.count(), 1)
+
+    def test_open_orders_are_loaded_again(self):
+        self.place(self.seller, SELL, 10, 4)
+        market.flush()
+        market.clear()
+
+        self.assertEqual(market.depth(self.item, 10), ([], [(10, 4)]))
+        response = self.place(self.buyer, BUY, 10, 4)
+        self.assertEqual(response.json()["trades"], [{"price": 10, "quantity": 4}])
+
+    def test_depth(self):
+        self.place(self.seller, SELL, 11, 2)
+        self.place(self.seller, SELL, 12, 3)
+        self.place(self.buyer, BUY, 9, 5)
+
+        response = Client().get(f"/market/{self.item}/depth/?levels=1")
+        self.assertEqual(
+            response.json(),
+            {
+                "item": self.item,
+                "bids": [{"price": 9, "quantity": 5}],
+                "asks": [{"price": 11, "quantity": 2}],
+            },
+        )
+        self.assertEqual(Client().get("/market/Gold/depth/").status_code, 404)
+        self.assertEqual(Client().get(f"/market/{self.item}/depth/?levels=0").status_code, 400)
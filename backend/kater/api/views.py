@@ -1,67 +1,351 @@
-from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
-from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-import jwt
 
-from api.serializers import PlayerSerializer, UserSerializer
+from api import leaderboards
+from api.market import ITEMS, market
+from api.actions import apply_actions
+from api.authentication import JWTCookieAuthentication, encode_token
+from api.hashing import PoolSaturated, hashing_pool
+from api.models import Player
+from api.provisioning import generated_accounts, provision_players
+from api.state_cache import player_states
+from api.serializers import (
+    ActionBatchSerializer,
+    BookOrderSerializer,
+    OrderSerializer,
+    PlayerSerializer,
+    ProvisionSerializer,
+    UserSerializer,
+)
 
 
-class RegisterView(APIView):
-    def post(self, request):
-        serializer = UserSerializer(data=request.data)
-        if serializer.is_valid(raise_exception=True):
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+def request_data(request):
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
 
-        return Response(serializer.data, status=status.HTTP_400_BAD_REQUEST)
+    return request.POST
 
 
-class LoginView(APIView):
-    def post(self, request):
-        username = request.data["username"]
-        password = request.data["password"]
+def error_response(detail, status_code):
+    return JsonResponse({"detail": detail}, status=status_code)
+
+
+def user_digest(user):
+    """
+    Short hash of the user fields of the /user/ payload.
+    """
+
+    fields = f"{user.username}\0{user.email}".encode()
+    return hashlib.blake2b(fields, digest_size=6).hexdigest()
+
+
+def saturated_response():
+    response = error_response(
+        "Too many requests, try again later.", status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response["Retry-After"] = "1"
+    return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class RegisterView(View):
+    """
+    Async, so that hashing the password on the hashing pool does not hold
+    a request worker.
+    """
 
-        user = User.objects.get(username=username)
+    async def post(self, request):
+        data = request_data(request)
+        if data is None:
+            return error_response("Malformed request.", status.HTTP_400_BAD_REQUEST)
+
+        serializer = UserSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            hashed_password = await hashing_pool.run(
+                make_password, serializer.validated_data["password"]
+            )
+        except PoolSaturated:
+            return saturated_response()
+
+        await sync_to_async(serializer.save)(hashed_password=hashed_password)
+        return JsonResponse(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class LoginView(View):
+    """
+    Async, so that checking the password on the hashing pool does not hold
+    a request worker.
+    """
+
+    async def post(self, request):
+        data = request_data(request)
+        if data is None or "username" not in data or "password" not in data:
+            return error_response("Malformed request.", status.HTTP_400_BAD_REQUEST)
+
+        user = await User.objects.filter(username=data["username"]).afirst()
         if user is None:
-            raise AuthenticationFailed("User not found!")
+            return error_response("User not found!", status.HTTP_403_FORBIDDEN)
 
-        if not user.check_password(password):
-            raise AuthenticationFailed()
+        try:
+            valid = await hashing_pool.run(check_password, data["password"], user.password)
+        except PoolSaturated:
+            return saturated_response()
+        if not valid:
+            return error_response(
+                "Incorrect authentication credentials.", status.HTTP_403_FORBIDDEN
+            )
 
-        payload = {
-            "id": user.id,
-            "exp": datetime.now(timezone.utc) + timedelta(minutes=60),
-            "iat": datetime.now(timezone.utc),
-        }
-        token = jwt.encode(payload, "secret", algorithm="HS256")
+        token = encode_token(user)
 
-        response = Response(status=status.HTTP_200_OK)
+        response = JsonResponse({"jwt": token}, status=status.HTTP_200_OK)
         response.set_cookie(key="jwt", value=token, httponly=True)
-        response.data = {"jwt": token}
 
         return response
 
 
 class UserView(APIView):
+    """
+    Polled by the frontend, so unchanged players are answered with 304 Not
+    Modified and the payload of changed ones is serialized once per version,
+    energy and user fields. User saves, e.g. of last_login on every login, do
+    not write the player, so the fields of the payload are hashed instead.
+    """
+
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [IsAuthenticated]
+
     def get(self, request):
-        token = request.COOKIES.get("jwt")
-        if not token:
-            raise AuthenticationFailed("Unauthenticated!")
+        player = player_states.current(request.user.player)
+        now = timezone.now()
+        energy, refilled_at = player.energy_at(now)
+        validator = (player.version, energy, user_digest(request.user))
+        etag = f'"{player.pk}-{player.version}-{energy}-{validator[2]}"'
+        last_modified = int(max(player.updated_at, refilled_at).timestamp())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(
+                self.payload(request.user, player, validator, now), status.HTTP_200_OK
+            )
+
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    def payload(self, user, player, validator, now):
+        cached = cache.get(player.response_cache_key)
+        if cached is not None and cached[0] == validator:
+            return cached[1]
+
+        data = {
+            "user": UserSerializer(user).data,
+            "player": PlayerSerializer(player, context={"now": now}).data,
+        }
+        cache.set(player.response_cache_key, (validator, data), None)
+        return data
+
+
+class ActionsView(APIView):
+    """
+    Applies a batch of actions the client finished, see `apply_actions`.
+    """
+
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ActionBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        now = timezone.now()
+        player, delta = apply_actions(
+            request.user.player.pk, serializer.validated_data["actions"], now
+        )
+
+        return Response(
+            {"delta": delta, "player": PlayerSerializer(player, context={"now": now}).data},
+            status.HTTP_200_OK,
+        )
 
+
+class LeaderboardView(APIView):
+    """
+    Pages of a leaderboard, continued with the `next` cursor of the previous page.
+    """
+
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request, board):
+        if board not in leaderboards.BOARDS:
+            raise NotFound("Unknown leaderboard.")
+
+        # The cursor is the value, player id and rank of the last entry.
+        cursor = request.query_params.get("after")
         try:
-            payload = jwt.decode(token, "secret", algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            raise AuthenticationFailed("Unauthenticated!")
+            limit = int(request.query_params.get("limit", 50))
+            after = None if cursor is None else tuple(map(int, cursor.split(":")))
+        except ValueError:
+            raise ValidationError("Malformed limit or cursor.")
+        if not 1 <= limit <= settings.LEADERBOARD_PAGE_SIZE or (after and len(after) != 3):
+            raise ValidationError("Malformed limit or cursor.")
+
+        entries = leaderboards.page(board, limit, None if after is None else after[:2])
+        usernames = dict(
+            Player.objects.filter(id__in=[player_id for player_id, _ in entries])
+            .values_list("id", "user__username")
+        )
+
+        rank = 0 if after is None else after[2]
+        results = [
+            {
+                "rank": rank + i,
+                "player": player_id,
+                "username": usernames.get(player_id),
+                "value": value,
+            }
+            for i, (player_id, value) in enumerate(entries, 1)
+        ]
+
+        next_cursor = None
+        if len(results) == limit:
+            last = results[-1]
+            next_cursor = f"{last['value']}:{last['player']}:{last['rank']}"
+
+        return Response({"results": results, "next": next_cursor}, status.HTTP_200_OK)
+
+
+class LeaderboardRankView(APIView):
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, board):
+        if board not in leaderboards.BOARDS:
+            raise NotFound("Unknown leaderboard.")
+
+        player = player_states.current(request.user.player)
+        return Response(
+            {"rank": leaderboards.rank(board, player), "value": getattr(player, board)},
+            status.HTTP_200_OK,
+        )
+
+
+class ProvisionPlayersView(APIView):
+    """
+    Creates accounts with their players in bulk, for staff only.
+    """
+
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        serializer = ProvisionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
 
-        user = User.objects.get(pk=payload["id"])
-        user_serializer = UserSerializer(user)
-        player_serializer = PlayerSerializer(user.player)
+        if "accounts" in data:
+            accounts = [
+                (account["username"], account["email"], account["password"])
+                for account in data["accounts"]
+            ]
+        else:
+            accounts = generated_accounts(
+                data["prefix"], data["count"], data["password"], data["start"]
+            )
+        created, skipped = provision_players(accounts)
+
+        return Response({"created": created, "skipped": skipped}, status.HTTP_201_CREATED)
+
+
+class OrdersView(APIView):
+    """
+    Places an order on the marketplace, which matches at once as far as the
+    book allows and rests with the rest.
+    """
+
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = OrderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        order, matches = market.place(request.user.player.pk, **serializer.validated_data)
+        trades = [{"price": match.price, "quantity": match.quantity} for match in matches]
+
+        return Response(
+            {"order": BookOrderSerializer(order).data, "trades": trades},
+            status.HTTP_201_CREATED,
+        )
+
+
+class OrderView(APIView):
+    authentication_classes = [JWTCookieAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, pk):
+        order = market.cancel(request.user.player.pk, pk)
+        if order is None:
+            raise NotFound("No open order.")
+
+        return Response({"order": BookOrderSerializer(order).data}, status.HTTP_200_OK)
+
+
+class MarketDepthView(APIView):
+    """
+    Total quantity of the open orders of an item at the best prices.
+    """
+
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request, item):
+        if item not in ITEMS:
+            raise NotFound("Unknown item.")
+
+        try:
+            levels = int(request.query_params.get("levels", 10))
+        except ValueError:
+            raise ValidationError("Malformed levels.")
+        if not 1 <= levels <= settings.MARKET_DEPTH_LEVELS:
+            raise ValidationError("Malformed levels.")
 
+        bids, asks = market.depth(item, levels)
         return Response(
-            {"user": user_serializer.data, "player": player_serializer.data},
+            {
+                "item": item,
+                "bids": [{"price": price, "quantity": quantity} for price, quantity in bids],
+                "asks": [{"price": price, "quantity": quantity} for price, quantity in asks],
+            },
             status.HTTP_200_OK,
         )
 
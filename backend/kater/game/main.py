@@ -1,6 +1,8 @@
 import asyncio
+import logging
 
 from src.game import main
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     asyncio.run(main())
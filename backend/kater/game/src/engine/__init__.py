@@ -1,21 +1,28 @@
+from .action_queue import QueuedAction
+from .autosave import Autosave
 from .events import *
 from .inventory import Inventory
 from .item import Item
 from .player import Player
+from .save import SaveError
 from .config import *
+from .scheduler import Scheduler, Timer
+from .simulation import PendingAction, Simulation
 
 __all__ = [
+    "QueuedAction",
+    "Autosave",
     "Inventory",
     "Item",
     "Player",
-    "REFILL_ENERGY",
-    "REFILL_HITPOINTS",
-    "EXPLORE_FINISHED",
-    "ORE_MINED",
-    "LOG_CHOPPED",
-    "FISH_CAUGHT",
-    "HERB_PICKED",
-    "CRYSTAL_GATHERED",
-    "BLINK_INVENTORY_UPDATE_TEXT",
-    "Config"
+    "SaveError",
+    "ExploreFinished",
+    "SkillActionFinished",
+    "PendingAction",
+    "Scheduler",
+    "Timer",
+    "Simulation",
+    "Config",
+    "ConfigError",
+    "ConfigWatcher",
 ]
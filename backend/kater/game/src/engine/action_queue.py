@@ -0,0 +1,186 @@
+"""
+Queue of repeated gathering actions and its progress while the game is closed.
+
+Offline progress is resolved in closed form instead of replaying every refill
+and action: between two starts the energy only grows by whole refills, so the
+state after each finish is fully described by the energy and the position of
+the clock within the refill period. Once such a state repeats, the actions in
+between form a cycle that is skipped as a whole as often as it fits, which
+bounds the work by the number of distinct states instead of the elapsed time.
+"""
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from .config import Config
+from .item import gathered_items
+
+if TYPE_CHECKING:
+    from .player import Player
+
+
+@dataclass
+class QueuedAction:
+    skill: str
+    item: int  # index of the item in the skill configuration
+    repeat: Optional[int] = None  # actions left, None repeats until energy runs out
+    started: bool = False  # the first of them is running, its energy is spent
+
+
+@dataclass(frozen=True)
+class OfflineAction:
+    """
+    Queued action still running at the end of the offline time.
+    """
+
+    skill: str
+    item: int
+    remaining: int  # ms until it finishes
+
+
+def resolve_offline(player: "Player", config: Config, ms: int) -> Optional[OfflineAction]:
+    """
+    Applies `ms` milliseconds of refills and queued actions to the player,
+    the same way `Simulation.advance` would if it was started with the queue
+    of the player and no running actions.
+
+    Returns the queued action that is still running at the end, if any. Its
+    energy is already spent, only its completion is left to the caller.
+    """
+
+    rates, caps = config.rates, config.caps
+    queue = player.action_queue
+    items = gathered_items(config)
+
+    hitpoint_refills = ms // rates.hitpoints
+    player.hitpoints = min(
+        player.hitpoints + hitpoint_refills * rates.base_hitpoints_refill, caps.hitpoints
+    )
+
+    time, energy = 0, player.energy
+    while queue:
+        action = queue[0]
+        record = config.items[action.skill][action.item]
+        item = items[action.skill][action.item]
+        if not player.inventory.fits(item):
+            queue.popleft()
+            continue
+
+        time, energy, finished, running, done = _resolve_action(
+            action,
+            action.started,
+            record.energy,
+            record.duration,
+            time,
+            energy,
+            ms,
+            rates.energy,
+            rates.base_energy_refill,
+            caps.energy,
+        )
+
+        action.started = running is not None
+        if finished:
+            player.experience += finished * record.experience
+            player.inventory.add(item, finished)
+            if action.repeat is not None:
+                action.repeat -= finished
+
+        if not done:
+            player.energy = _refill(
+                energy, time, ms, rates.energy, rates.base_energy_refill, caps.energy
+            )
+            if running is not None:
+                return OfflineAction(action.skill, action.item, running)
+            return None
+
+        queue.popleft()
+
+    player.energy = _refill(energy, time, ms, rates.energy, rates.base_energy_refill, caps.energy)
+    return None
+
+
+def _refill(energy: int, start: int, end: int, period: int, amount: int, cap: int) -> int:
+    """
+    Energy after the refills due in (start, end], refills happen at every
+    multiple of the period.
+    """
+
+    return min(energy + (end // period - start // period) * amount, cap)
+
+
+def _resolve_action(
+    action: QueuedAction,
+    started: bool,
+    cost: int,
+    duration: int,
+    time: int,
+    energy: int,
+    end: int,
+    period: int,
+    amount: int,
+    cap: int,
+) -> Tuple[int, int, int, Optional[int], bool]:
+    """
+    Repeats one queued action from `time` with `energy` until it is done or
+    `end` is reached. Returns the time and energy of the last start or
+    finish, the number of finished actions, the remaining ms of the action
+    running at `end` and whether the queued action is done.
+
+    A `started` action was running before `time`, its first repetition
+    starts at `time` without spending energy again.
+
+    The refills between the returned time and `end` are not applied yet.
+    """
+
+    finished = 0
+    repeat = action.repeat
+    seen: Dict[Tuple[int, int], Tuple[int, int]] = {}  # state -> (time, finished)
+
+    while repeat is None or finished < repeat:
+        if started:
+            started = False
+        else:
+            if cost > cap:
+                return time, energy, finished, None, True  # never affordable
+
+            # The state after a finish, before waiting for the next start, so
+            # that skipping to the last repetition does not wait for another.
+            state = (energy, time % period)
+            if state in seen:
+                cycle_time = time - seen[state][0]
+                cycle_length = finished - seen[state][1]
+                cycles = (end - time) // cycle_time
+                if repeat is not None:
+                    cycles = min(cycles, (repeat - finished) // cycle_length)
+
+                time += cycles * cycle_time
+                finished += cycles * cycle_length
+                seen.clear()
+                if finished == repeat:
+                    break
+            seen[state] = (time, finished)
+
+            if energy < cost:
+                if repeat is None:
+                    break
+
+                # Wait for the refill that makes the action affordable.
+                refills = -(-(cost - energy) // amount)
+                start = (time // period + refills) * period
+                if start > end:
+                    return time, energy, finished, None, False
+
+                energy = min(energy + refills * amount, cap)
+                time = start
+
+            energy -= cost
+
+        if time + duration > end:
+            return time, energy, finished, time + duration - end, False
+
+        energy = _refill(energy, time, time + duration, period, amount, cap)
+        time += duration
+        finished += 1
+
+    return time, energy, finished, None, True
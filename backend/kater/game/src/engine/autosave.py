@@ -0,0 +1,304 @@
+"""
+Write-behind autosave of a player.
+
+Changes of the player are appended to a journal next to the save file and
+periodically compacted into a full save. The journal is a sequence of records:
+
+    payload length, CRC32 of the payload   2 x uint32
+    payload                                 entries
+
+where the first entry of the journal names the CRC32 of the save it applies
+to, so that a journal left over from before a compaction is never replayed
+on top of the save that already contains it. A record torn by a crash fails
+its checksum and ends the replay.
+"""
+
+import asyncio
+from pathlib import Path
+import struct
+import sys
+import threading
+from time import monotonic
+from typing import Dict, Optional, Tuple
+import zlib
+
+from . import save
+from .action_queue import QueuedAction
+from .item import Item
+from .player import Player
+from .save import SaveData, SaveError, pack_str, unpack_str
+
+# Threads are not available in the browser build, there the writes run
+# directly in the autosave task between frames.
+_THREADS = sys.platform != "emscripten"
+
+_RECORD = struct.Struct("<II")  # payload length, crc32
+_BASE = struct.Struct("<I")  # crc32 of the save the journal applies to
+_ATTRIBUTE = struct.Struct("<Bi")  # index in _ATTRIBUTES, new value
+_SKILL = struct.Struct("<2i")  # level, experience
+_QUANTITY = struct.Struct("<i")  # change of the quantity of an item
+_SAVED_AT = struct.Struct("<q")  # time of the record in ms since the epoch
+_COUNT = struct.Struct("<H")  # number of queued actions
+_QUEUED_ACTION = struct.Struct("<Bi?")  # item, repeat, started
+
+_ATTRIBUTES = ("energy", "hitpoints", "balance", "level", "experience")
+(
+    _KIND_BASE,
+    _KIND_ATTRIBUTE,
+    _KIND_SKILL,
+    _KIND_ITEM,
+    _KIND_QUEUE,
+    _KIND_SAVED_AT,
+) = range(6)
+
+
+def journal_path(path: Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + ".journal")
+
+
+def restore(path: Path) -> Player:
+    """
+    Loads the player from its save and replays its journal on top of it.
+    """
+
+    raw = Path(path).read_bytes()
+    data = save.loads(raw)
+
+    try:
+        journal = journal_path(path).read_bytes()
+    except FileNotFoundError:
+        journal = b""
+
+    _replay(data, memoryview(journal), zlib.crc32(raw))
+
+    return Player.from_save_data(data)
+
+
+class Autosave:
+    """
+    Every `interval` ms journals what changed on the player since the last
+    time, every `snapshot_interval` ms compacts the journal into the save.
+
+    Runs as an asyncio task next to the game loop. Finding the changes takes
+    microseconds, the writes run in a worker thread, so the loop never waits
+    for the disk.
+    """
+
+    def __init__(
+        self,
+        player: Player,
+        path: Path,
+        interval: int = 1000,
+        snapshot_interval: int = 60000,
+    ) -> None:
+        self._player = player
+        self._path = Path(path)
+        self._journal_path = journal_path(path)
+        self._interval = interval
+        self._snapshot_interval = snapshot_interval
+
+        self._journaled = player.save_data()  # state of the player in the journal
+        self._pending = bytearray()  # records not written yet
+        self._last_snapshot: Optional[float] = None  # compact right after the start
+        self._io_lock = threading.Lock()
+        self._closed = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval / 1000)
+            self.record()
+
+            if (
+                self._last_snapshot is None
+                or (monotonic() - self._last_snapshot) * 1000 >= self._snapshot_interval
+            ):
+                self._pending.clear()
+                await self._io(self._compact, self._journaled)
+                self._last_snapshot = monotonic()
+            elif self._pending:
+                pending, self._pending = bytes(self._pending), bytearray()
+                await self._io(self._append, pending)
+
+    def record(self) -> None:
+        """
+        Adds what changed on the player since the last call to the pending records.
+        """
+
+        current = self._player.save_data()
+        payload = _diff(self._journaled, current)
+        if payload:
+            self._pending += _frame(payload)
+            self._journaled = current
+
+    def close(self) -> None:
+        """
+        Stops the autosave and saves the current state of the player.
+        Blocks until everything is written.
+        """
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        # Writes of the task that are still running in the worker thread
+        # must not overwrite the final save.
+        self._closed = True
+
+        self.record()
+        self._pending.clear()
+        self._compact(self._journaled, final=True)
+
+    async def _io(self, function, *args) -> None:
+        if _THREADS:
+            await asyncio.to_thread(function, *args)
+        else:
+            function(*args)
+
+    def _append(self, records: bytes) -> None:
+        with self._io_lock:
+            if self._closed:
+                return
+
+            with self._journal_path.open("ab") as f:
+                f.write(records)
+                f.flush()
+
+    def _compact(self, data: SaveData, final: bool = False) -> None:
+        raw = save.dumps(data)
+
+        with self._io_lock:
+            if self._closed and not final:
+                return
+
+            # The save is replaced before the journal, a crash in between
+            # leaves a journal that does not apply to the new save.
+            save.write_atomic(raw, self._path)
+            save.write_atomic(
+                _frame(bytes([_KIND_BASE]) + _BASE.pack(zlib.crc32(raw))),
+                self._journal_path,
+            )
+
+
+def _frame(payload: bytes) -> bytes:
+    return _RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _diff(old: SaveData, new: SaveData) -> bytearray:
+    payload = bytearray()
+
+    for i, attribute in enumerate(_ATTRIBUTES):
+        value = getattr(new, attribute)
+        if value != getattr(old, attribute):
+            payload.append(_KIND_ATTRIBUTE)
+            payload += _ATTRIBUTE.pack(i, value)
+
+    for name, progress in new.skills_progress.items():
+        if old.skills_progress.get(name) != progress:
+            payload.append(_KIND_SKILL)
+            pack_str(payload, name)
+            payload += _SKILL.pack(*progress)
+
+    old_items = _quantities(old)
+    new_items = _quantities(new)
+    removed = {name: (item, 0) for name, (item, _) in old_items.items() if name not in new_items}
+    for name, (item, quantity) in {**new_items, **removed}.items():
+        change = quantity - old_items.get(name, (item, 0))[1]
+        if change:
+            payload.append(_KIND_ITEM)
+            pack_str(payload, item.name)
+            pack_str(payload, item.resource_path)
+            payload += _QUANTITY.pack(change)
+
+    if new.action_queue != old.action_queue:
+        payload.append(_KIND_QUEUE)
+        payload += _COUNT.pack(len(new.action_queue))
+        for action in new.action_queue:
+            pack_str(payload, action.skill)
+            payload += _QUEUED_ACTION.pack(
+                action.item, -1 if action.repeat is None else action.repeat, action.started
+            )
+
+    # Only records with changes are written, the time of the last one is when
+    # the state was last known to be current.
+    if payload:
+        payload.append(_KIND_SAVED_AT)
+        payload += _SAVED_AT.pack(new.saved_at)
+
+    return payload
+
+
+def _quantities(data: SaveData) -> Dict[str, Tuple[Item, int]]:
+    return {item.name: (item, quantity) for item, quantity in data.items}
+
+
+def _replay(data: SaveData, journal: memoryview, base: int) -> None:
+    offset = 0
+    while offset + _RECORD.size <= len(journal):
+        length, checksum = _RECORD.unpack_from(journal, offset)
+        payload = journal[offset + _RECORD.size : offset + _RECORD.size + length]
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            break
+
+        try:
+            if offset == 0:
+                if payload[0] != _KIND_BASE or _BASE.unpack_from(payload, 1)[0] != base:
+                    break
+            else:
+                _apply(data, payload)
+        except (IndexError, struct.error, UnicodeDecodeError) as e:
+            raise SaveError(f"Malformed journal record: {e}") from e
+
+        offset += _RECORD.size + length
+
+
+def _apply(data: SaveData, payload: memoryview) -> None:
+    items = {item.name: i for i, (item, _) in enumerate(data.items)}
+
+    offset = 0
+    while offset < len(payload):
+        kind = payload[offset]
+        offset += 1
+
+        if kind == _KIND_ATTRIBUTE:
+            attribute, value = _ATTRIBUTE.unpack_from(payload, offset)
+            offset += _ATTRIBUTE.size
+            setattr(data, _ATTRIBUTES[attribute], value)
+        elif kind == _KIND_SKILL:
+            name, offset = unpack_str(payload, offset)
+            data.skills_progress[name] = _SKILL.unpack_from(payload, offset)
+            offset += _SKILL.size
+        elif kind == _KIND_ITEM:
+            name, offset = unpack_str(payload, offset)
+            resource_path, offset = unpack_str(payload, offset)
+            (change,) = _QUANTITY.unpack_from(payload, offset)
+            offset += _QUANTITY.size
+
+            if name in items:
+                item, quantity = data.items[items[name]]
+                data.items[items[name]] = (item, quantity + change)
+            else:
+                items[name] = len(data.items)
+                data.items.append((Item(name, resource_path), change))
+        elif kind == _KIND_QUEUE:
+            (actions,) = _COUNT.unpack_from(payload, offset)
+            offset += _COUNT.size
+            data.action_queue.clear()
+            for _ in range(actions):
+                skill, offset = unpack_str(payload, offset)
+                item, repeat, started = _QUEUED_ACTION.unpack_from(payload, offset)
+                offset += _QUEUED_ACTION.size
+                data.action_queue.append(
+                    QueuedAction(skill, item, None if repeat < 0 else repeat, started)
+                )
+        elif kind == _KIND_SAVED_AT:
+            (data.saved_at,) = _SAVED_AT.unpack_from(payload, offset)
+            offset += _SAVED_AT.size
+        else:
+            raise SaveError(f"Unknown journal entry {kind}.")
+
+    data.items[:] = [(item, quantity) for item, quantity in data.items if quantity > 0]
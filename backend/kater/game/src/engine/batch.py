@@ -0,0 +1,243 @@
+"""
+Simulation of many players at once, used to balance the configuration.
+
+Requires NumPy, which the game client itself does not need, so this module is
+not imported by the engine package.
+"""
+
+from math import gcd
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import Config
+from .player import Player
+from .simulation import Simulation
+
+
+class BatchSimulation:
+    """
+    Struct-of-arrays simulation of N players that keep repeating one gathering
+    action each, e.g. half of them mine Copper Ore and half chop Maple Logs.
+
+    All players advance together in steps of `step_ms`. At the start of every
+    step idle players with enough energy start their action; during the step
+    refills are applied and due actions finish. Driving a scalar `Simulation`
+    the same way gives the same state, see `compare_with_simulation`.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        item_ids: Sequence[int],
+        step_ms: Optional[int] = None,
+    ) -> None:
+        self._config = config
+
+        # Items of all skills are numbered in the order of config.skills.
+        self._items: List[Tuple[str, int]] = [
+            (skill, item)
+            for skill in config.skills
+            for item in range(len(config.actions[skill].items))
+        ]
+        item_energy, item_duration, item_experience = (
+            np.array(
+                [getattr(config.actions[skill], attribute)[item] for skill, item in self._items],
+                dtype=dtype,
+            )
+            for attribute, dtype in (
+                ("energy", np.int16),
+                ("duration", np.int32),
+                ("experience", np.int32),
+            )
+        )
+
+        self._item_ids = np.asarray(item_ids, dtype=np.int64)
+        n = len(self._item_ids)
+
+        # Per-player constants of the repeated action.
+        self._cost = item_energy[self._item_ids]
+        self._duration = item_duration[self._item_ids]
+        self._experience_gain = item_experience[self._item_ids]
+
+        self.time = 0
+        self.step_ms = step_ms or default_step(config)
+
+        # Energy and hitpoints are 16 bit, they must hold the caps and what a
+        # step refills on top before it is capped.
+        rates, caps = config.rates, config.caps
+        limit = np.iinfo(np.int16).max
+        for name, cap, rate, refill in (
+            ("energy", caps.energy, rates.energy, rates.base_energy_refill),
+            ("hitpoints", caps.hitpoints, rates.hitpoints, rates.base_hitpoints_refill),
+        ):
+            if cap + (self.step_ms // rate + 1) * refill > limit:
+                raise ValueError(
+                    f"The {name} cap and its refills per step of {self.step_ms} ms "
+                    f"exceed the 16 bit limit {limit}."
+                )
+
+        self.energy = np.full(n, config.caps.energy, dtype=np.int16)
+        self.hitpoints = np.full(n, config.caps.hitpoints, dtype=np.int16)
+        self.experience = np.zeros(n, dtype=np.int32)
+        self.gathered = np.zeros(n, dtype=np.int32)  # items gathered by each player
+
+        # Milliseconds left of the running action of each player, 0 if there is none.
+        self._remaining = np.zeros(n, dtype=np.int32)
+
+        # Caps as arrays, np.minimum with an array operand is much faster
+        # than with a scalar one.
+        self._energy_cap = np.full(n, config.caps.energy, dtype=np.int16)
+        self._hitpoints_cap = np.full(n, config.caps.hitpoints, dtype=np.int16)
+        self._zero = np.zeros(n, dtype=np.int32)
+
+        # Preallocated buffers, so that steps do not allocate.
+        self._mask = np.empty(n, dtype=bool)
+        self._other_mask = np.empty(n, dtype=bool)
+        self._energy_buffer = np.empty(n, dtype=np.int16)
+        self._buffer = np.empty(n, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self._item_ids)
+
+    @property
+    def items(self) -> List[Tuple[str, int]]:
+        """
+        (skill, item index) of every inventory column.
+        """
+
+        return self._items
+
+    @property
+    def inventory(self) -> np.ndarray:
+        """
+        Quantities of every item (columns) held by every player (rows).
+        """
+
+        inventory = np.zeros((len(self), len(self._items)), dtype=np.int32)
+        inventory[np.arange(len(self)), self._item_ids] = self.gathered
+
+        return inventory
+
+    def skill_inventory(self, skill: str) -> np.ndarray:
+        """
+        Quantities of the items of one skill held by every player.
+        """
+
+        columns = [i for i, (item_skill, _) in enumerate(self._items) if item_skill == skill]
+        return self.inventory[:, columns]
+
+    def step(self) -> None:
+        # Masked arithmetic is used instead of the `where` argument of ufuncs,
+        # which is several times slower.
+        rates, caps = self._config.rates, self._config.caps
+        start, end = self.time, self.time + self.step_ms
+
+        # Start actions of idle players that can afford them.
+        starting, idle = self._mask, self._other_mask
+        np.greater_equal(self.energy, self._cost, out=starting)
+        np.equal(self._remaining, 0, out=idle)
+        np.logical_and(starting, idle, out=starting)
+        np.multiply(self._cost, starting, out=self._energy_buffer)
+        np.subtract(self.energy, self._energy_buffer, out=self.energy)
+        np.multiply(self._duration, starting, out=self._buffer)
+        np.add(self._remaining, self._buffer, out=self._remaining)
+
+        # Refills happen at every multiple of their rate, spending only happens
+        # at the start of a step, so capping once is the same as capping every refill.
+        energy_refills = end // rates.energy - start // rates.energy
+        if energy_refills:
+            np.add(
+                self.energy,
+                energy_refills * rates.base_energy_refill,
+                out=self.energy,
+                casting="unsafe",
+            )
+            np.minimum(self.energy, self._energy_cap, out=self.energy)
+
+        hitpoints_refills = end // rates.hitpoints - start // rates.hitpoints
+        if hitpoints_refills:
+            np.add(
+                self.hitpoints,
+                hitpoints_refills * rates.base_hitpoints_refill,
+                out=self.hitpoints,
+                casting="unsafe",
+            )
+            np.minimum(self.hitpoints, self._hitpoints_cap, out=self.hitpoints)
+
+        # Finish due actions, i.e. those that had between 1 and step_ms left.
+        finished, busy = self._mask, self._other_mask
+        np.subtract(self._remaining, self.step_ms, out=self._remaining)
+        np.greater(self._remaining, -self.step_ms, out=busy)
+        np.less_equal(self._remaining, 0, out=finished)
+        np.logical_and(finished, busy, out=finished)
+        np.maximum(self._remaining, self._zero, out=self._remaining)
+
+        np.multiply(self._experience_gain, finished, out=self._buffer)
+        np.add(self.experience, self._buffer, out=self.experience)
+        np.add(self.gathered, finished, out=self.gathered, casting="unsafe")
+
+        self.time = end
+
+    def run(self, ms: int) -> None:
+        for _ in range(ms // self.step_ms):
+            self.step()
+
+
+def default_step(config: Config) -> int:
+    """
+    Largest step that all gathering durations are a multiple of, so players
+    restart their actions without idling between steps.
+    """
+
+    step = 0
+    for skill in config.skills:
+        for duration in config.actions[skill].duration:
+            step = gcd(step, duration)
+
+    return step
+
+
+def compare_with_simulation(
+    config: Config, item_ids: Sequence[int], steps: int, step_ms: Optional[int] = None
+) -> List[int]:
+    """
+    Runs the batch and a scalar `Simulation` per player side by side.
+    Returns the players whose states differ.
+    """
+
+    batch = BatchSimulation(config, item_ids, step_ms)
+
+    simulations = []
+    for item_id in item_ids:
+        skill, item = batch.items[item_id]
+        player = Player()
+        player.energy, player.hitpoints = config.caps.energy, config.caps.hitpoints
+        simulations.append((Simulation(player, config), skill, item))
+
+    for _ in range(steps):
+        batch.step()
+        for simulation, skill, item in simulations:
+            if simulation.skill_action(skill) is None:
+                simulation.start_skill_action(skill, item)
+            simulation.advance(batch.step_ms)
+
+    inventory = batch.inventory
+    mismatched = []
+    for i, (simulation, _, _) in enumerate(simulations):
+        player = simulation.player
+        quantities = {item.name: quantity for item, quantity in player.inventory}
+        expected_inventory = [
+            quantities.get(config.actions[skill].items[item], 0)
+            for skill, item in batch.items
+        ]
+
+        if (
+            player.energy != batch.energy[i]
+            or player.hitpoints != batch.hitpoints[i]
+            or player.experience != batch.experience[i]
+            or expected_inventory != inventory[i].tolist()
+        ):
+            mismatched.append(i)
+
+    return mismatched
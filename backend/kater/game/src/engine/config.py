@@ -1,91 +1,368 @@
+"""
+Configuration of the game, loaded from a JSON file (config.json next to this
+module by default).
+
+Everything is validated when the file is loaded and compiled into immutable
+records, so the game never reads a malformed value and lookups while playing
+are plain indexed reads, e.g. `config.items[skill][item].energy`.
+"""
+
+from dataclasses import dataclass, fields
+import json
+import os
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Optional, Tuple
+import warnings
+
+DEFAULT_PATH = Path(__file__).with_name("config.json")
+
+
+class ConfigError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ConfigAssets:
+    memory_budget: int  # max bytes of cached image surfaces
+    text_cache_size: int  # max number of cached rendered texts
+    preload_workers: int  # threads decoding resources in the background at startup
+
+
+@dataclass(frozen=True)
+class ConfigAutosave:
+    path: str
+    interval: int  # ms between journaling the changes of the player
+    snapshot_interval: int  # ms between compacting the journal into the save
+
+
+@dataclass(frozen=True)
 class ConfigCaps:
-    def __init__(self):
-        self.energy = 100  # max limit of energy
-        self.hitpoints = 100  # max hitpoints
-        self.level = 100  # max level
+    energy: int  # max limit of energy
+    hitpoints: int  # max hitpoints
+    level: int  # max level
 
 
+@dataclass(frozen=True)
 class ConfigDisplay:
-    def __init__(self):
-        self.size = [1280, 720]
-        self.caption = "Kater"
+    size: Tuple[int, int]
+    caption: str
+    dirty_rects: bool  # redraw only changed objects instead of the whole screen
 
 
+@dataclass(frozen=True)
 class ConfigGlobals:
-    def __init__(self):
-        self.seed = 38  # for reproducibility
+    seed: int  # for reproducibility
+    reload_interval: int  # ms between checks whether the configuration file changed
+
+
+@dataclass(frozen=True)
+class ConfigProfiler:
+    enabled: bool  # profile from the start, otherwise from the first toggle of the overlay
+    overlay_key: str  # shows and hides the overlay
+    window: int  # frames the percentiles are taken over
+    trace_path: Optional[str]  # writes the trace there on exit, as CSV if it ends with .csv else as JSON
 
 
+@dataclass(frozen=True)
 class ConfigRates:
-    def __init__(self) -> None:
-        self.base_energy_refill = (
-            1  # how much energy is going to refill per 1 time unit
-        )
-        self.base_hitpoints_refill = (
-            1  # how much hitpoints is going to refill per 1 time unit
-        )
-        self.energy = 1000  # 1 energy per 1 second
-        self.hitpoints = 1000  # 1 hitpoints per 1 second
+    base_energy_refill: int  # how much energy is going to refill per 1 time unit
+    base_hitpoints_refill: int  # how much hitpoints is going to refill per 1 time unit
+    energy: int  # ms of 1 time unit of energy
+    hitpoints: int  # ms of 1 time unit of hitpoints
 
 
+@dataclass(frozen=True)
 class ConfigInventory:
-    def __init__(self) -> None:
-        self.size = 24
+    size: int
+
+
+@dataclass(frozen=True)
+class ConfigItem:
+    index: int  # in its skill
+    name: str
+    energy: int
+    duration: int  # ms
+    experience: int
+    resource: str  # image file of the item
 
 
+@dataclass(frozen=True)
 class ConfigSkill:
-    def __init__(self, items, energy, duration, experience):
-        self.items = items
-        self.energy = energy
-        self.duration = duration
-        self.experience = experience
+    """
+    Items of a skill, or of exploring, both as records and as parallel tuples.
+    """
+
+    records: Tuple[ConfigItem, ...]
+    items: Tuple[str, ...]
+    energy: Tuple[int, ...]
+    duration: Tuple[int, ...]
+    experience: Tuple[int, ...]
+
+    @classmethod
+    def from_records(cls, records: Tuple[ConfigItem, ...]) -> "ConfigSkill":
+        return cls(
+            records,
+            tuple(record.name for record in records),
+            tuple(record.energy for record in records),
+            tuple(record.duration for record in records),
+            tuple(record.experience for record in records),
+        )
+
+
+def item_resource(item_name: str) -> str:
+    """
+    Returns the resource file of a gathered item, e.g. "Copper Ore" -> "copper_ore.png".
+    """
+
+    return "_".join(map(str.lower, item_name.split())) + ".png"
+
 
 class Config:
-    def __init__(self):
-        self.sidebar = ["Inventory", "Travel", "Skills", "Explore"]
-        self.skills = ["mining", "woodcutting", "fishing", "herbalism", "divination"]
-
-        self.caps = ConfigCaps()
-        self.display = ConfigDisplay()
-        self.globals = ConfigGlobals()
-        self.rates = ConfigRates()
-        self.inventory = ConfigInventory()
-
-        self.mining = ConfigSkill(
-            items=["Copper Ore", "Silver Ore"],
-            energy=[5, 10],
-            duration=[5000, 10000],
-            experience=[1, 2],
+    """
+    Immutable configuration loaded from `path`.
+
+    Skills are also available as attributes, e.g. `config.mining`, and
+    `config.items` maps every skill and "explore" to its item records.
+    `config.overlay_key_code` is the PyGame key code of the profiler overlay key.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        path = Path(path) if path is not None else DEFAULT_PATH
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise ConfigError(f"Cannot read {path}: {e}") from e
+
+        _check(isinstance(data, dict), "", "must be an object")
+        _check_keys(
+            data,
+            "",
+            {
+                "assets", "autosave", "caps", "display", "globals", "profiler",
+                "rates", "inventory", "sidebar", "skills", "explore",
+            },
         )
-        self.woodcutting = ConfigSkill(
-            items=["Oak Log", "Maple Log"],
-            energy=[5, 10],
-            duration=[5000, 10000],
-            experience=[1, 2],
+
+        assign = super().__setattr__
+        assign("path", path)
+        assign("mtime", mtime)  # of the file when it was loaded, in ns
+
+        assign("assets", _section(data, "assets", ConfigAssets))
+        assign("autosave", _section(data, "autosave", ConfigAutosave))
+        assign("caps", _section(data, "caps", ConfigCaps))
+        assign("display", _section(data, "display", ConfigDisplay))
+        assign("globals", _section(data, "globals", ConfigGlobals))
+        assign("profiler", _section(data, "profiler", ConfigProfiler))
+        assign("overlay_key_code", _key_code(self.profiler.overlay_key, "profiler.overlay_key"))
+        assign("rates", _section(data, "rates", ConfigRates))
+        assign("inventory", _section(data, "inventory", ConfigInventory))
+
+        sidebar = data["sidebar"]
+        _check(
+            isinstance(sidebar, list) and sidebar and all(isinstance(s, str) for s in sidebar),
+            "sidebar",
+            "must be a non-empty list of strings",
         )
-        self.fishing = ConfigSkill(
-            items=["Carp", "Salmon"],
-            energy=[5, 10],
-            duration=[5000, 10000],
-            experience=[1, 2],
+        assign("sidebar", tuple(sidebar))
+
+        skills = data["skills"]
+        _check(isinstance(skills, dict) and skills, "skills", "must be a non-empty object")
+        _check("explore" not in skills, "skills", "must not define explore")
+        assign("skills", tuple(skills))
+
+        actions = {
+            skill: _skill(records, f"skills.{skill}", self) for skill, records in skills.items()
+        }
+        actions["explore"] = _skill(data["explore"], "explore", self)
+        assign("explore", actions["explore"])
+        assign("actions", MappingProxyType(actions))
+        assign(
+            "items",
+            MappingProxyType({name: skill.records for name, skill in actions.items()}),
         )
-        self.herbalism = ConfigSkill(
-            items=["Mugwort", "Thistle"],
-            energy=[5, 10],
-            duration=[5000, 10000],
-            experience=[1, 2],
+
+        names = [record.name for skill in self.skills for record in actions[skill].records]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        _check(not duplicates, "skills", f"items must have unique names, repeated: {duplicates}")
+
+        _check(min(self.display.size) > 0, "display.size", "must be positive")
+        for section in ("assets", "autosave", "caps", "rates", "inventory"):
+            for field in fields(getattr(self, section)):
+                value = getattr(getattr(self, section), field.name)
+                if field.type is int:
+                    _check(value > 0, f"{section}.{field.name}", "must be positive")
+
+    def __getattr__(self, name: str) -> ConfigSkill:
+        # Only called for missing attributes, i.e. skills.
+        try:
+            return self.__dict__["actions"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Config is immutable, load a new one instead.")
+
+    def changed(self) -> bool:
+        """
+        Returns whether the file was modified since it was loaded.
+        """
+
+        try:
+            return os.stat(self.path).st_mtime_ns != self.mtime
+        except OSError:
+            return False
+
+
+class ConfigWatcher:
+    """
+    Checks every `interval` ms whether the configuration file changed and
+    loads it again. A file that fails to load is reported once and the
+    current configuration stays in use.
+
+    Sections read once at startup (assets, autosave, display) only take
+    effect after a restart.
+    """
+
+    def __init__(self, config: Config, interval: int) -> None:
+        self._config = config
+        self._interval = interval
+        self._waited = 0
+        self._failed_mtime: Optional[int] = None
+        self.error: Optional[ConfigError] = None  # of the last failed reload
+
+    def poll(self, elapsed: int) -> Optional[Config]:
+        """
+        Returns the reloaded configuration if the file changed, None otherwise.
+        """
+
+        self._waited += elapsed
+        if self._waited < self._interval:
+            return None
+        self._waited = 0
+
+        if not self._config.changed():
+            return None
+
+        try:
+            mtime = os.stat(self._config.path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime == self._failed_mtime:
+            return None
+
+        try:
+            config = Config(self._config.path)
+        except ConfigError as e:
+            self.error = e
+            self._failed_mtime = mtime
+            return None
+
+        self._config = config
+        self.error = None
+        return config
+
+
+def _check(condition: Any, path: str, message: str) -> None:
+    if not condition:
+        raise ConfigError(f"{path or 'config'} {message}.")
+
+
+def _check_keys(data: Dict[str, Any], path: str, expected) -> None:
+    missing = sorted(set(expected) - set(data))
+    unknown = sorted(set(data) - set(expected))
+    _check(not missing, path, f"misses {missing}")
+    _check(not unknown, path, f"has unknown keys {unknown}")
+
+
+def _section(data: Dict[str, Any], name: str, cls):
+    section = data[name]
+    _check(isinstance(section, dict), name, "must be an object")
+    _check_keys(section, name, [field.name for field in fields(cls)])
+
+    values = {}
+    for field in fields(cls):
+        value = section[field.name]
+        path = f"{name}.{field.name}"
+        if field.type is int:
+            _check(isinstance(value, int) and not isinstance(value, bool), path, "must be an integer")
+        elif field.type is bool:
+            _check(isinstance(value, bool), path, "must be true or false")
+        elif field.type is str:
+            _check(isinstance(value, str), path, "must be a string")
+        elif field.type == Optional[str]:
+            _check(value is None or isinstance(value, str), path, "must be a string or null")
+        elif field.type == Tuple[int, int]:
+            _check(
+                isinstance(value, list)
+                and len(value) == 2
+                and all(isinstance(v, int) and not isinstance(v, bool) for v in value),
+                path,
+                "must be a list of two integers",
+            )
+            value = tuple(value)
+        values[field.name] = value
+
+    return cls(**values)
+
+
+def _key_code(name: str, path: str) -> Optional[int]:
+    # Only the game reads key codes and it cannot run without PyGame, the
+    # rest of the engine can.
+    try:
+        import pygame
+    except ImportError:
+        return None
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # key names resolve before pygame.init()
+        try:
+            return pygame.key.key_code(name)
+        except ValueError:
+            _check(False, path, f"must be a key name known to PyGame, not {name!r}")
+
+
+def _skill(records: Any, path: str, config: Config) -> ConfigSkill:
+    _check(isinstance(records, list) and records, path, "must be a non-empty list")
+
+    items = []
+    for index, record in enumerate(records):
+        record_path = f"{path}[{index}]"
+        _check(isinstance(record, dict), record_path, "must be an object")
+        _check_keys(
+            record,
+            record_path,
+            {"name", "energy", "duration", "experience"} | ({"resource"} & set(record)),
+        )
+
+        name = record["name"]
+        _check(isinstance(name, str) and name, f"{record_path}.name", "must be a non-empty string")
+        for key in ("energy", "duration", "experience"):
+            value = record[key]
+            _check(
+                isinstance(value, int) and not isinstance(value, bool) and value >= 0,
+                f"{record_path}.{key}",
+                "must be a non-negative integer",
+            )
+        _check(record["duration"] > 0, f"{record_path}.duration", "must be positive")
+        _check(
+            record["energy"] <= config.caps.energy,
+            f"{record_path}.energy",
+            f"must not exceed the energy cap {config.caps.energy}",
         )
 
-        self.divination = ConfigSkill(
-            items=["Quartz", "Jade"],
-            energy=[5, 10],
-            duration=[5000, 10000],
-            experience=[1, 2],
+        resource = record.get("resource", item_resource(name))
+        _check(
+            isinstance(resource, str) and resource,
+            f"{record_path}.resource",
+            "must be a non-empty string",
         )
 
-        self.explore = ConfigSkill(
-            items=["short", "medium", "long"],
-            energy=[10, 20, 30],
-            duration=[5000, 10000, 15000],
-            experience=[10, 20, 30],
+        items.append(
+            ConfigItem(
+                index, name, record["energy"], record["duration"], record["experience"], resource
+            )
         )
+
+    return ConfigSkill.from_records(tuple(items))
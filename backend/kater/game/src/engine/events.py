@@ -1,17 +1,15 @@
-import pygame
+from dataclasses import dataclass
 
-# Basic attributes
-REFILL_ENERGY = pygame.USEREVENT + 1
-REFILL_HITPOINTS = pygame.USEREVENT + 2
 
-# Explore actions
-EXPLORE_FINISHED = pygame.USEREVENT + 3
+@dataclass(frozen=True)
+class SkillActionFinished:
+    time: int  # simulation time in ms when the action finished
+    skill: str
+    item: int  # index of the item in the skill configuration
+    quantity: int
 
-ORE_MINED = pygame.USEREVENT + 4
-LOG_CHOPPED = pygame.USEREVENT + 5
-FISH_CAUGHT = pygame.USEREVENT + 6
-HERB_PICKED = pygame.USEREVENT + 7
-CRYSTAL_GATHERED = pygame.USEREVENT + 8
 
-# UI stuff
-BLINK_INVENTORY_UPDATE_TEXT = pygame.USEREVENT + 9
\ No newline at end of file
+@dataclass(frozen=True)
+class ExploreFinished:
+    time: int  # simulation time in ms when the exploration finished
+    item: int  # index of the explore type in the explore configuration
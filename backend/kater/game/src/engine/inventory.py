@@ -1,22 +1,121 @@
-from typing import Dict, Tuple
+from array import array
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 from .item import Item
 
 
 class Inventory:
+    """
+    Holds up to `size` kinds of items, each in its own slot.
+
+    Quantities are kept in an array indexed by slot and the item names in
+    sorted order, so neither iterating nor sorting allocates per item. The
+    version increases with every change, consumers can skip their work while
+    it stays the same.
+    """
+
     def __init__(self, size: int=12):
         self._size = size
-        self._items: Dict[str, Tuple[Item, int]] = {}
+        self._items: List[Item] = []  # item in each slot
+        self._quantities = array("q")  # quantity in each slot
+        self._slots: Dict[str, int] = {}  # slot of each item name
+        self._names: List[str] = []  # item names in sorted order
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Tuple[Item, int]]:
+        return zip(self._items, self._quantities)
+
+    def sorted(self) -> Iterator[Tuple[Item, int]]:
+        """
+        Iterates over the items ordered by their name.
+        """
+
+        for name in self._names:
+            slot = self._slots[name]
+            yield self._items[slot], self._quantities[slot]
+
+    def count(self, item: Item) -> int:
+        slot = self._slots.get(item.name)
+        return self._quantities[slot] if slot is not None else 0
+
+    def fits(self, item: Item) -> bool:
+        """
+        Returns whether the item can be added, i.e. it is held already or there is a free slot.
+        """
+
+        return item.name in self._slots or len(self._items) < self._size
+
+    def add(self, item: Item, quantity: int) -> bool:
+        """
+        Adds items to the inventory. Returns False if the item does not fit.
+        """
+
+        if not self._add(item, quantity):
+            return False
+
+        self._version += 1
+        return True
+
+    def add_many(self, items: Iterable[Tuple[Item, int]]) -> int:
+        """
+        Adds (item, quantity) pairs to the inventory. Returns how many of them fit.
+        """
+
+        added = sum(self._add(item, quantity) for item, quantity in items)
+        if added:
+            self._version += 1
+
+        return added
+
+    def remove(self, item: Item, quantity: int) -> bool:
+        """
+        Removes items from the inventory. Returns False, without removing
+        anything, if there are not enough of them.
+        """
+
+        slot = self._slots.get(item.name)
+        if slot is None or self._quantities[slot] < quantity:
+            return False
+
+        self._quantities[slot] -= quantity
+        if self._quantities[slot] == 0:
+            self._free(slot)
+
+        self._version += 1
+        return True
+
+    def _add(self, item: Item, quantity: int) -> bool:
+        slot = self._slots.get(item.name)
+        if slot is not None:
+            self._quantities[slot] += quantity
+            return True
+
+        if len(self._items) >= self._size:
+            return False
+
+        self._slots[item.name] = len(self._items)
+        self._items.append(item)
+        self._quantities.append(quantity)
+        insort(self._names, item.name)
+
+        return True
 
-    def __iter__(self):
-        for item, quantity in self._items.values():
-            yield item, quantity
+    def _free(self, slot: int) -> None:
+        name = self._items[slot].name
 
-    def add(self, item: Item, quantity: int) -> None:
-        if item.name in self._items:
-            item, old_quantity = self._items[item.name]
-            self._items[item.name] = (item, old_quantity + quantity)
-            return
+        del self._items[slot]
+        del self._quantities[slot]
+        del self._slots[name]
+        del self._names[bisect_left(self._names, name)]
 
-        if len(self._items) < self._size:
-            self._items[item.name] = (item, quantity)
+        # Slots keep the order in which the items were added.
+        for later_slot in range(slot, len(self._items)):
+            self._slots[self._items[later_slot].name] = later_slot
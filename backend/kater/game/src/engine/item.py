@@ -1,6 +1,42 @@
-from dataclasses import dataclass
+from typing import Dict, List
+
+from .config import Config
+
 
-@dataclass
 class Item:
-    name: str
-    resource_path: str
\ No newline at end of file
+    """
+    Kind of item that can be held in an inventory.
+
+    Items are interned by name, the key of inventory slots, so creating an
+    item with the name of an existing one returns that instance and they can
+    be compared by identity. A different resource path replaces the one of
+    the existing item, e.g. after the configuration is reloaded.
+    """
+
+    __slots__ = ("name", "resource_path")
+
+    _interned: Dict[str, "Item"] = {}
+
+    def __new__(cls, name: str, resource_path: str) -> "Item":
+        item = cls._interned.get(name)
+        if item is None:
+            item = super().__new__(cls)
+            item.name = name
+            cls._interned[name] = item
+        item.resource_path = resource_path
+
+        return item
+
+    def __repr__(self) -> str:
+        return f"Item(name={self.name!r}, resource_path={self.resource_path!r})"
+
+
+def gathered_items(config: Config) -> Dict[str, List[Item]]:
+    """
+    Returns the items gathered by every skill, indexed like the skill configuration.
+    """
+
+    return {
+        skill: [Item(record.name, record.resource) for record in config.items[skill]]
+        for skill in config.skills
+    }
@@ -1,14 +1,20 @@
-from ast import literal_eval
+from collections import deque
+from dataclasses import replace
 from pathlib import Path
-from typing import Dict, Tuple
+from time import time
+from typing import Deque, Dict, Optional, Tuple
 
+from .action_queue import QueuedAction
+from .save import SaveData, load as load_save, save as write_save
 from .inventory import Inventory
-from .item import Item
 
 
 class Player:
-    def __init__(self, character_save_path: Path) -> None:
-        self._load_from(character_save_path)
+    def __init__(self, character_save_path: Optional[Path] = None) -> None:
+        if character_save_path is None:
+            self._new()
+        else:
+            self._load_from(character_save_path)
 
     @property
     def energy(self) -> int:
@@ -58,47 +64,69 @@ class Player:
     def skills_progress(self) -> Dict[str, Tuple[int, int]]:
         return self._skills_progress
 
+    @property
+    def action_queue(self) -> Deque[QueuedAction]:
+        return self._action_queue
+
+    @property
+    def saved_at(self) -> int:
+        """
+        Time of the save the player was loaded from in ms since the epoch, 0 if unknown.
+        """
+
+        return self._saved_at
+
+    @classmethod
+    def from_save_data(cls, data: SaveData) -> "Player":
+        player = cls.__new__(cls)
+        player._restore(data)
+
+        return player
+
+    def save_data(self) -> SaveData:
+        """
+        Returns a copy of the state of the player that is not affected by later changes.
+        """
+
+        return SaveData(
+            self._energy,
+            self._hitpoints,
+            self._balance,
+            self._level,
+            self._experience,
+            dict(self._skills_progress),
+            list(self._inventory),
+            int(time() * 1000),
+            [replace(action) for action in self._action_queue],
+        )
+
     def save(self, path: str) -> None:
-        # TODO: Better serialization.
-        try:
-            p = Path(path)
-            with p.open("w", encoding="utf-8") as f:
-                f.write(
-                    f"{self._energy} {self._hitpoints} {self._balance} {self._level} {self._experience}\n"
-                )
-                f.write(
-                    ";".join([f"{k} {v}" for k, v in self._skills_progress.items()]) + "\n"
-                )
-                for item, quantity in self._inventory:
-                    f.write(f"{item.name},{item.resource_path},{quantity}\n")
-        except IOError as e:
-            print(f"An error occurred while saving to {path}: {e}")
+        write_save(self.save_data(), Path(path))
+
+    def _new(self) -> None:
+        self._energy = 100
+        self._hitpoints = 100
+        self._balance = 0
+        self._level = 1
+        self._experience = 0
+        self._skills_progress = {}
+        self._inventory = Inventory()
+        self._saved_at = 0
+        self._action_queue = deque()
 
     def _load_from(self, path: Path) -> None:
-        try:
-            with Path(path).open("r", encoding="utf-8") as f:
-                data = f.read().splitlines()
-
-                (
-                    self._energy,
-                    self._hitpoints,
-                    self._balance,
-                    self._level,
-                    self._experience,
-                ) = map(int, data[0].split())
-
-                self._skills_progress = {}
-                for skill in data[1].split(";"):
-                    name, level, exp = skill.split()
-                    self._skills_progress[name] = literal_eval(level + exp)
-
-                self._inventory = Inventory()
-                if len(data) > 1:
-                    for item in data[2:]:
-                        item_name, item_resource_path, quantity = item.split(",")
-                        self._inventory.add(
-                            Item(item_name, item_resource_path), int(quantity)
-                        )
-
-        except (IOError, ValueError) as e:
-            print(f"An error occurred while loading from {path}: {e}")
+        self._restore(load_save(path))
+
+    def _restore(self, data: SaveData) -> None:
+        self._energy = data.energy
+        self._hitpoints = data.hitpoints
+        self._balance = data.balance
+        self._level = data.level
+        self._experience = data.experience
+        self._skills_progress = data.skills_progress
+
+        self._inventory = Inventory()
+        self._inventory.add_many(data.items)
+
+        self._saved_at = data.saved_at
+        self._action_queue = deque(replace(action) for action in data.action_queue)
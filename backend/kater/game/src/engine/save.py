@@ -0,0 +1,239 @@
+"""
+Binary save files of players.
+
+A save file starts with a header (magic, format version, length of the
+compressed payload and CRC32 of the payload) followed by the payload
+compressed with raw deflate:
+
+    energy, hitpoints, balance, level, experience   5 x int32
+    number of skills                                uint16
+        name, level, experience                     str8, 2 x int32
+    number of items                                 uint16
+        name, resource path, quantity               str8, str8, uint32
+    time of the save in ms since the epoch          int64
+    number of queued actions                        uint16
+        skill, item, repeat, started                str8, uint8, int32, bool
+
+where str8 is a UTF-8 string prefixed by its uint8 length and a repeat of -1
+repeats until energy runs out. Files written by older versions of the game
+in the text format are still loaded.
+"""
+
+from ast import literal_eval
+from dataclasses import dataclass, field
+import os
+from pathlib import Path
+import struct
+from typing import Dict, List, Tuple
+import zlib
+
+from .action_queue import QueuedAction
+from .item import Item
+
+MAGIC = b"KATR"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHII")  # magic, version, compressed length, crc32
+_ATTRIBUTES = struct.Struct("<5i")
+_COUNT = struct.Struct("<H")
+_SKILL = struct.Struct("<2i")
+_QUANTITY = struct.Struct("<I")
+_SAVED_AT = struct.Struct("<q")
+_QUEUED_ACTION = struct.Struct("<Bi?")  # item, repeat, started
+
+
+class SaveError(Exception):
+    pass
+
+
+@dataclass
+class SaveData:
+    energy: int
+    hitpoints: int
+    balance: int
+    level: int
+    experience: int
+    skills_progress: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    items: List[Tuple[Item, int]] = field(default_factory=list)
+    saved_at: int = 0  # ms since the epoch, 0 if unknown
+    action_queue: List[QueuedAction] = field(default_factory=list)
+
+
+def dumps(data: SaveData) -> bytes:
+    payload = bytearray(
+        _ATTRIBUTES.pack(
+            data.energy, data.hitpoints, data.balance, data.level, data.experience
+        )
+    )
+
+    payload += _COUNT.pack(len(data.skills_progress))
+    for name, (level, experience) in data.skills_progress.items():
+        pack_str(payload, name)
+        payload += _SKILL.pack(level, experience)
+
+    payload += _COUNT.pack(len(data.items))
+    for item, quantity in data.items:
+        pack_str(payload, item.name)
+        pack_str(payload, item.resource_path)
+        payload += _QUANTITY.pack(quantity)
+
+    payload += _SAVED_AT.pack(data.saved_at)
+    payload += _COUNT.pack(len(data.action_queue))
+    for action in data.action_queue:
+        pack_str(payload, action.skill)
+        payload += _QUEUED_ACTION.pack(
+            action.item, -1 if action.repeat is None else action.repeat, action.started
+        )
+
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = compressor.compress(payload) + compressor.flush()
+
+    return (
+        _HEADER.pack(MAGIC, VERSION, len(compressed), zlib.crc32(payload)) + compressed
+    )
+
+
+def loads(raw: bytes) -> SaveData:
+    if not raw.startswith(MAGIC):
+        try:
+            return _loads_text(raw.decode("utf-8"))
+        except UnicodeDecodeError as e:
+            raise SaveError(f"Unknown save format: {e}") from e
+
+    if len(raw) < _HEADER.size:
+        raise SaveError("Truncated save header.")
+
+    _, version, length, checksum = _HEADER.unpack_from(raw)
+    if version != VERSION:
+        raise SaveError(f"Unsupported save version {version}.")
+
+    compressed = memoryview(raw)[_HEADER.size :]
+    if len(compressed) != length:
+        raise SaveError("Truncated save payload.")
+
+    try:
+        payload = zlib.decompress(compressed, -zlib.MAX_WBITS)
+    except zlib.error as e:
+        raise SaveError(f"Corrupted save payload: {e}") from e
+    if zlib.crc32(payload) != checksum:
+        raise SaveError("Corrupted save payload.")
+
+    try:
+        return _loads_payload(memoryview(payload))
+    except (struct.error, UnicodeDecodeError) as e:
+        raise SaveError(f"Malformed save payload: {e}") from e
+
+
+def save(data: SaveData, path: Path) -> None:
+    write_atomic(dumps(data), path)
+
+
+def write_atomic(raw: bytes, path: Path) -> None:
+    """
+    Writes to a temporary file first, which then replaces the old file,
+    so a crash never leaves a half-written file behind.
+    """
+
+    path = Path(path)
+    temporary_path = path.with_name(path.name + ".tmp")
+
+    with temporary_path.open("wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temporary_path, path)
+
+
+def load(path: Path) -> SaveData:
+    return loads(Path(path).read_bytes())
+
+
+def pack_str(buffer: bytearray, value: str) -> None:
+    """
+    Appends `value` to `buffer` as a str8.
+    """
+
+    encoded = value.encode("utf-8")
+    if len(encoded) > 255:
+        raise SaveError(f"String too long to save: {value!r}")
+
+    buffer.append(len(encoded))
+    buffer += encoded
+
+
+def unpack_str(payload: memoryview, offset: int) -> Tuple[str, int]:
+    """
+    Returns the str8 at `offset` of `payload` and the offset after it.
+    """
+
+    length = payload[offset]
+    offset += 1
+    end = offset + length
+    if end > len(payload):
+        raise struct.error("string out of bounds")
+
+    return str(payload[offset:end], "utf-8"), end
+
+
+def _loads_payload(payload: memoryview) -> SaveData:
+    data = SaveData(*_ATTRIBUTES.unpack_from(payload))
+    offset = _ATTRIBUTES.size
+
+    (skills,) = _COUNT.unpack_from(payload, offset)
+    offset += _COUNT.size
+    for _ in range(skills):
+        name, offset = unpack_str(payload, offset)
+        data.skills_progress[name] = _SKILL.unpack_from(payload, offset)
+        offset += _SKILL.size
+
+    (items,) = _COUNT.unpack_from(payload, offset)
+    offset += _COUNT.size
+    for _ in range(items):
+        name, offset = unpack_str(payload, offset)
+        resource_path, offset = unpack_str(payload, offset)
+        (quantity,) = _QUANTITY.unpack_from(payload, offset)
+        offset += _QUANTITY.size
+        data.items.append((Item(name, resource_path), quantity))
+
+    (data.saved_at,) = _SAVED_AT.unpack_from(payload, offset)
+    offset += _SAVED_AT.size
+
+    (actions,) = _COUNT.unpack_from(payload, offset)
+    offset += _COUNT.size
+    for _ in range(actions):
+        skill, offset = unpack_str(payload, offset)
+        item, repeat, started = _QUEUED_ACTION.unpack_from(payload, offset)
+        offset += _QUEUED_ACTION.size
+        data.action_queue.append(
+            QueuedAction(skill, item, None if repeat < 0 else repeat, started)
+        )
+
+    return data
+
+
+def _loads_text(text: str) -> SaveData:
+    """
+    Loads the original text format:
+
+        energy hitpoints balance level experience
+        skill (level, experience);skill (level, experience);...
+        item name,resource path,quantity
+        ...
+    """
+
+    try:
+        lines = text.splitlines()
+        data = SaveData(*map(int, lines[0].split()))
+
+        for skill in lines[1].split(";"):
+            name, level, experience = skill.split()
+            data.skills_progress[name] = literal_eval(level + experience)
+
+        for line in lines[2:]:
+            item_name, item_resource_path, quantity = line.split(",")
+            data.items.append((Item(item_name, item_resource_path), int(quantity)))
+    except (IndexError, TypeError, ValueError, SyntaxError) as e:
+        raise SaveError(f"Malformed text save: {e}") from e
+
+    return data
@@ -0,0 +1,122 @@
+from heapq import heapify, heappop, heappush
+from itertools import count
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class Timer:
+    """
+    Callback scheduled to run at a given time.
+    """
+
+    __slots__ = ("due", "callback", "owner", "active")
+
+    def __init__(self, due: int, callback: Callable[[], Any], owner: Any = None) -> None:
+        self.due = due
+        self.callback = callback
+        self.owner = owner
+        self.active = True  # False once the timer ran or was cancelled
+
+    def __repr__(self) -> str:
+        return f"Timer(due={self.due}, owner={self.owner!r}, active={self.active})"
+
+
+class Scheduler:
+    """
+    Holds any number of pending timers in a binary heap, so scheduling and
+    expiring a timer takes O(log n).
+
+    The scheduler owns the clock of everything scheduled on it. Timers that are
+    due at the same time run in the order they were scheduled. Cancelled timers
+    are only marked and dropped lazily when they reach the top of the heap.
+    """
+
+    def __init__(self, now: int = 0) -> None:
+        self._now = now
+        self._heap: List[Tuple[int, int, Timer]] = []
+        self._sequence = count()
+        self._cancelled = 0
+
+    @property
+    def now(self) -> int:
+        return self._now
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    def schedule(self, due: int, callback: Callable[[], Any], owner: Any = None) -> Timer:
+        """
+        Schedules `callback` to run at time `due`. `owner` only serves to tell
+        apart timers of different users of a shared scheduler.
+        """
+
+        timer = Timer(due, callback, owner)
+        heappush(self._heap, (due, next(self._sequence), timer))
+
+        return timer
+
+    def cancel(self, timer: Timer) -> bool:
+        """
+        Cancels a pending timer. Returns whether it was still pending.
+        """
+
+        if not timer.active:
+            return False
+
+        timer.active = False
+        self._cancelled += 1
+
+        # Do not let cancelled timers take over the heap.
+        if self._cancelled > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if entry[2].active]
+            heapify(self._heap)
+            self._cancelled = 0
+
+        return True
+
+    def next_due(self) -> Optional[int]:
+        self._drop_cancelled()
+
+        return self._heap[0][0] if self._heap else None
+
+    def pending(self, owner: Any = None) -> List[Timer]:
+        """
+        Returns pending timers in the order they will run, optionally only those of `owner`.
+        """
+
+        return [
+            timer
+            for _, _, timer in sorted(self._heap)
+            if timer.active and (owner is None or timer.owner is owner)
+        ]
+
+    def advance(self, ms: int) -> List[Any]:
+        """
+        Moves the clock forward by `ms` milliseconds and runs every timer that
+        becomes due, in order. Timers scheduled by the callbacks run as well if
+        they are due before the new time.
+        Returns the results of the callbacks that are not None.
+        """
+
+        end = self._now + ms
+        results = []
+
+        while True:
+            self._drop_cancelled()
+            if not self._heap or self._heap[0][0] > end:
+                break
+
+            due, _, timer = heappop(self._heap)
+            self._now = due
+            timer.active = False
+
+            result = timer.callback()
+            if result is not None:
+                results.append(result)
+
+        self._now = end
+        return results
+
+    def _drop_cancelled(self) -> None:
+        while self._heap and not self._heap[0][2].active:
+            heappop(self._heap)
+            self._cancelled -= 1
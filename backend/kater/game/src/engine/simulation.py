@@ -0,0 +1,313 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+from .action_queue import QueuedAction, resolve_offline
+from .config import Config
+from .events import ExploreFinished, SkillActionFinished
+from .item import gathered_items
+from .player import Player
+from .scheduler import Scheduler, Timer
+
+
+@dataclass(frozen=True)
+class PendingAction:
+    item: int  # index of the item in the skill configuration
+    start: int  # simulation time in ms
+    end: int  # simulation time in ms
+
+
+class Simulation:
+    """
+    Game rules of a single player, independent of PyGame.
+
+    Time only moves through `advance`, so the same sequence of actions and
+    advances always ends in the same state. This makes it possible to run
+    hours of play in milliseconds.
+
+    Refills and running actions are timers of a `Scheduler`. Simulations that
+    share a scheduler also share its clock, advancing any of them advances
+    all of them and returns the finished actions of all of them.
+
+    The action queue of the player starts its actions one after the other
+    once the simulation is resumed. When a refill is due at the same time as
+    a queued action finishes, the refill is applied before the next action
+    starts.
+    """
+
+    def __init__(
+        self, player: Player, config: Config, scheduler: Optional[Scheduler] = None
+    ) -> None:
+        self._player = player
+        self._config = config
+        self._scheduler = scheduler if scheduler is not None else Scheduler()
+
+        self._items = config.items  # item records of every skill and "explore"
+        self._gathered_items = gathered_items(config)
+
+        self._explore: Optional[Tuple[PendingAction, Timer]] = None
+        self._skill_actions: Dict[str, Optional[Tuple[PendingAction, Timer]]] = {
+            skill: None for skill in config.skills
+        }
+        self._queued_skill: Optional[str] = None  # skill of the running queued action
+
+        self._schedule(self._refill_energy, config.rates.energy)
+        self._schedule(self._refill_hitpoints, config.rates.hitpoints)
+
+    @property
+    def player(self) -> Player:
+        return self._player
+
+    @property
+    def time(self) -> int:
+        return self._scheduler.now
+
+    @property
+    def explore(self) -> Optional[PendingAction]:
+        return self._explore[0] if self._explore is not None else None
+
+    def skill_action(self, skill: str) -> Optional[PendingAction]:
+        action = self._skill_actions[skill]
+        return action[0] if action is not None else None
+
+    def pending_actions(self) -> List[Tuple[str, PendingAction]]:
+        """
+        Returns (skill or "explore", action) of all running actions, ordered by their end.
+        """
+
+        actions = [(skill, action) for skill, (action, _) in self._running()]
+        return sorted(actions, key=lambda pending: pending[1].end)
+
+    def start_skill_action(self, skill: str, item: int) -> bool:
+        """
+        Starts gathering an item of a skill. Returns whether the action was started.
+        """
+
+        record = self._items[skill][item]
+        if self._skill_actions[skill] is not None or self._player.energy < record.energy:
+            return False
+
+        self._player.energy -= record.energy
+        self._skill_actions[skill] = self._start(
+            item,
+            record.duration,
+            lambda: self._finish_skill_action(skill),
+        )
+
+        return True
+
+    def enqueue(self, skill: str, item: int, repeat: Optional[int] = None) -> None:
+        """
+        Queues `repeat` gathering actions of an item, or as many as the energy
+        allows if `repeat` is None.
+        """
+
+        self._player.action_queue.append(QueuedAction(skill, item, repeat))
+        self._run_queue()
+
+    def clear_queue(self) -> None:
+        """
+        Removes the waiting queued actions, a running one is finished.
+        """
+
+        queue = self._player.action_queue
+        running = queue[0] if self._queued_skill is not None else None
+        queue.clear()
+        if running is not None:
+            running.repeat = 1
+            queue.append(running)
+
+    def resume(self, ms: int) -> None:
+        """
+        Applies `ms` milliseconds during which the game was closed, e.g. the
+        time since the player was saved, and starts the action queue. Only
+        refills and the action queue progress while the game is closed. Must
+        be called before any action is started.
+        """
+
+        offline = resolve_offline(self._player, self._config, ms)
+        if offline is not None:
+            duration = self._items[offline.skill][offline.item].duration
+            action = PendingAction(
+                offline.item,
+                self.time - duration + offline.remaining,
+                self.time + offline.remaining,
+            )
+            timer = self._schedule(
+                lambda: self._finish_skill_action(offline.skill), offline.remaining
+            )
+            self._skill_actions[offline.skill] = action, timer
+            self._queued_skill = offline.skill
+
+        self._run_queue()
+
+    def reconfigure(self, config: Config) -> None:
+        """
+        Switches to a reloaded configuration. Running actions keep their end,
+        actions and queued actions of items that no longer exist are dropped.
+        """
+
+        self._config = config
+        self._items = config.items
+        self._gathered_items = gathered_items(config)
+
+        def exists(skill: str, item: int) -> bool:
+            return skill in config.items and item < len(config.items[skill])
+
+        for skill, action in list(self._skill_actions.items()):
+            if action is not None and not exists(skill, action[0].item):
+                self.cancel_skill_action(skill)
+        if self._explore is not None and not exists("explore", self._explore[0].item):
+            self.cancel_explore()
+
+        self._skill_actions = {
+            skill: self._skill_actions.get(skill) for skill in config.skills
+        }
+
+        queue = self._player.action_queue
+        running = queue[0] if self._queued_skill is not None else None
+        kept = [
+            action for action in queue if action is running or exists(action.skill, action.item)
+        ]
+        queue.clear()
+        queue.extend(kept)
+
+    def start_explore(self, item: int) -> bool:
+        """
+        Starts an exploration. Returns whether the exploration was started.
+        """
+
+        record = self._items["explore"][item]
+        if self._explore is not None or self._player.energy < record.energy:
+            return False
+
+        self._player.energy -= record.energy
+        self._explore = self._start(item, record.duration, self._finish_explore)
+
+        return True
+
+    def cancel_skill_action(self, skill: str) -> bool:
+        """
+        Cancels the running action of a skill, the spent energy is not returned.
+        Returns whether there was an action to cancel.
+        """
+
+        if self._skill_actions[skill] is None:
+            return False
+
+        self._scheduler.cancel(self._skill_actions[skill][1])
+        self._skill_actions[skill] = None
+        if skill == self._queued_skill:
+            self._queued_skill = None
+            self._player.action_queue.popleft()
+        if self._player.action_queue:
+            self._schedule(self._run_queue, 0)
+
+        return True
+
+    def cancel_explore(self) -> bool:
+        """
+        Cancels the running exploration, the spent energy is not returned.
+        Returns whether there was an exploration to cancel.
+        """
+
+        if self._explore is None:
+            return False
+
+        self._scheduler.cancel(self._explore[1])
+        self._explore = None
+
+        return True
+
+    def advance(self, ms: int) -> List[Union[SkillActionFinished, ExploreFinished]]:
+        """
+        Moves the simulation time forward by `ms` milliseconds, applying refills
+        and finishing actions in the order they are due.
+        Returns the finished actions.
+        """
+
+        return self._scheduler.advance(ms)
+
+    def _running(self):
+        if self._explore is not None:
+            yield "explore", self._explore
+        for skill, action in self._skill_actions.items():
+            if action is not None:
+                yield skill, action
+
+    def _schedule(self, callback, delay: int) -> Timer:
+        return self._scheduler.schedule(self.time + delay, callback, owner=self)
+
+    def _start(self, item: int, duration: int, callback) -> Tuple[PendingAction, Timer]:
+        action = PendingAction(item, self.time, self.time + duration)
+        return action, self._schedule(callback, duration)
+
+    def _run_queue(self) -> None:
+        """
+        Starts the next queued action, if none is running and it can start now.
+        """
+
+        queue = self._player.action_queue
+        caps = self._config.caps
+
+        while self._queued_skill is None and queue:
+            action = queue[0]
+            cost = self._items[action.skill][action.item].energy
+            if (
+                not self._player.inventory.fits(
+                    self._gathered_items[action.skill][action.item]
+                )
+                or cost > caps.energy
+                or (action.repeat is None and self._player.energy < cost)
+            ):
+                queue.popleft()
+            elif self.start_skill_action(action.skill, action.item):
+                self._queued_skill = action.skill
+                action.started = True
+            else:
+                break  # waits for energy or for the skill to be free
+
+    def _refill_energy(self) -> None:
+        self._player.energy = min(
+            self._player.energy + self._config.rates.base_energy_refill,
+            self._config.caps.energy,
+        )
+        self._schedule(self._refill_energy, self._config.rates.energy)
+        self._run_queue()
+
+    def _refill_hitpoints(self) -> None:
+        self._player.hitpoints = min(
+            self._player.hitpoints + self._config.rates.base_hitpoints_refill,
+            self._config.caps.hitpoints,
+        )
+        self._schedule(self._refill_hitpoints, self._config.rates.hitpoints)
+
+    def _finish_explore(self) -> ExploreFinished:
+        item = self._explore[0].item
+        self._player.experience += self._items["explore"][item].experience
+        self._explore = None
+
+        return ExploreFinished(self.time, item)
+
+    def _finish_skill_action(self, skill: str) -> SkillActionFinished:
+        item = self._skill_actions[skill][0].item
+        quantity = 1
+
+        self._player.experience += self._items[skill][item].experience
+        self._player.inventory.add(self._gathered_items[skill][item], quantity)
+        self._skill_actions[skill] = None
+
+        if skill == self._queued_skill:
+            self._queued_skill = None
+            action = self._player.action_queue[0]
+            action.started = False
+            if action.repeat is not None:
+                action.repeat -= 1
+                if action.repeat == 0:
+                    self._player.action_queue.popleft()
+
+        if self._player.action_queue:
+            # Runs after the other timers due now, so that a refill due at
+            # the same time is applied first.
+            self._schedule(self._run_queue, 0)
+
+        return SkillActionFinished(self.time, skill, item, quantity)
@@ -1,117 +1,135 @@
 import asyncio
 
+import logging
 from pathlib import Path
 import random
-from typing import List
+from time import perf_counter, time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import pygame
 import sys
 
 from .engine import *
+from .engine import autosave
+from .engine.item import gathered_items
 from .ui import *
 
+SKILL_ICON_SIZE = (100, 100)
+
+logger = logging.getLogger(__name__)
+
+
+class GameState:
+    """
+    State of the running game shared by the event handlers and the UI objects.
+    """
+
+    __slots__ = (
+        "clicked_sidebar_button",
+        "player",
+        "autosave",
+        "simulation",
+        "skill_buttons",
+        "blink_inventory_update_text",
+        "full_redraw",
+        "sidebar",
+        "content_area",
+        "profiler_overlay",
+    )
+
+    def __init__(self, player: Player, autosave: Autosave, simulation: Simulation) -> None:
+        self.clicked_sidebar_button = "Inventory"  # remembers what sidebar button was clicked, default is the Inventory
+        self.player = player  # remembers the player
+        self.autosave = autosave  # journals changes of the player in the background
+        self.simulation = simulation  # applies the game rules to the player
+        self.skill_buttons: Dict[Tuple[str, int], Tuple[int, int]] = {}  # position of the button of every (skill, item)
+        self.blink_inventory_update_text: Optional[Tuple[pygame.Surface, int, int]] = None  # shows a small amount of new items that were added to inventory shortly after the action was finished
+        self.full_redraw = True  # whether the whole screen has to be redrawn in the dirty rectangles mode
+        self.sidebar: List[SidebarButton] = []
+        self.content_area: Dict[str, List[Widget]] = {}
+        self.profiler_overlay = ProfilerOverlay(5, 330)  # frame times, toggled by a key
+
 
 async def main() -> None:
     """
     Game entry function.
     """
 
+    started = perf_counter()
+
     # Load configuration.
     global CONFIG
     CONFIG = Config()
+    config_watcher = ConfigWatcher(CONFIG, CONFIG.globals.reload_interval)
 
     # Run configurations.
-    global SCREEN, CLOCK, FONTS
+    global SCREEN, CLOCK, FONTS, ASSETS, TEXTS, PROFILER
     SCREEN, CLOCK, FONTS = configure_pygame()
+    PROFILER = Profiler(CONFIG.profiler.window) if CONFIG.profiler.enabled else NullProfiler()
+    ASSETS = AssetCache(CONFIG.assets.memory_budget)
+    TEXTS = TextCache(CONFIG.assets.text_cache_size)
 
     global GAME_STATE
     GAME_STATE = configure_engine()
+    GAME_STATE.autosave.start()
+    GAME_STATE.profiler_overlay.profiler = PROFILER
 
     # Create UI objects.
     top_menu, sidebar, content_area = init_ui_objects()
+    GAME_STATE.sidebar = sidebar
+    GAME_STATE.content_area = content_area
+
+    # Decode the images in the background while the first frames show.
+    ASSETS.preload(preload_resources(), CONFIG.assets.preload_workers)
+    first_frame = True
+
+    # Objects of every content that change with the game state.
+    updated_objects = {
+        name: [obj for obj in objects if not isinstance(obj, (Button, Image))]
+        for name, objects in content_area.items()
+    }
+
+    drawn_sidebar_button = None
+    drawn_blink_rect = None
+    reported_error = None  # of the configuration file, printed once
+
+    # Milliseconds since the previous frame.
+    elapsed = 0
 
     running = True
     while running:
+        PROFILER.start_frame()
+
         """
         1. Handle events.
         """
         for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                GAME_STATE["player"].save("example_players/player1")
-                sys.exit()
-            elif event.type == REFILL_ENERGY:
-                GAME_STATE["player"].energy = min(
-                    GAME_STATE["player"].energy + CONFIG.rates.base_energy_refill,
-                    CONFIG.caps.energy,
-                )
-            elif event.type == REFILL_HITPOINTS:
-                GAME_STATE["player"].hitpoints = min(
-                    GAME_STATE["player"].hitpoints
-                    + CONFIG.rates.base_hitpoints_refill,
-                    CONFIG.caps.hitpoints,
-                )
-            elif event.type == pygame.MOUSEBUTTONUP:
-                pos = pygame.mouse.get_pos()
-
-                # Check whether any sidebar menu button was clicked.
-                clicked_sidebar_button = [
-                    obj for obj in sidebar if obj.rect.collidepoint(pos)
-                ]
-                if clicked_sidebar_button:
-                    clicked_sidebar_button[0].onclick()
-
-                clicked_content_button = [
-                    obj
-                    for obj in content_area[GAME_STATE["clicked_sidebar_button"]]
-                    if isinstance(obj, Button) and obj.rect.collidepoint(pos)
-                ]
-                if clicked_content_button:
-                    clicked_content_button[0].onclick()
-            elif event.type == EXPLORE_FINISHED:
-                GAME_STATE["player"].experience += CONFIG.explore.experience[
-                    GAME_STATE["explore"]["item"]
-                ]
-                GAME_STATE["explore"] = {}
-            elif event.type in [
-                ORE_MINED,
-                LOG_CHOPPED,
-                FISH_CAUGHT,
-                HERB_PICKED,
-                CRYSTAL_GATHERED,
-            ]:
-                event_i = [
-                    ORE_MINED,
-                    LOG_CHOPPED,
-                    FISH_CAUGHT,
-                    HERB_PICKED,
-                    CRYSTAL_GATHERED,
-                ].index(event.type)
-                skill = CONFIG.skills[event_i]
-
-                item_number = GAME_STATE["skill_action"][skill]["item"]
-                item_name = getattr(CONFIG, skill).items[item_number]
-                item_resource = "_".join(map(str.lower, item_name.split())) + ".png"
-                quantity = 1
-
-                GAME_STATE["player"].experience += getattr(CONFIG, skill).experience[
-                    item_number
-                ]
-                GAME_STATE["player"].inventory.add(
-                    Item(item_name, item_resource), quantity
-                )
-
-                # +1 notification
-                GAME_STATE["blink_inventory_update_text"] = (
-                    FONTS["sidebar_font"].render(
-                        f"+{quantity}", True, pygame.Color("black")
-                    ),
-                    GAME_STATE["skill_action"][skill]["button_x"] + 125,
-                    GAME_STATE["skill_action"][skill]["button_y"] + 10,
-                )
-                pygame.time.set_timer(BLINK_INVENTORY_UPDATE_TEXT, 1000, loops=1)
-
-                GAME_STATE["skill_action"][skill] = {}
-            elif event.type == BLINK_INVENTORY_UPDATE_TEXT:
-                GAME_STATE["blink_inventory_update_text"] = None
+            handler = EVENT_HANDLERS.get(event.type)
+            if handler is not None:
+                handler(event)
+        PROFILER.mark("events")
+
+        config = config_watcher.poll(elapsed)
+        if config is not None:
+            CONFIG = config
+            GAME_STATE.simulation.reconfigure(CONFIG)
+            top_menu, sidebar, content_area = init_ui_objects()
+            GAME_STATE.sidebar = sidebar
+            GAME_STATE.content_area = content_area
+            updated_objects = {
+                name: [obj for obj in objects if not isinstance(obj, (Button, Image))]
+                for name, objects in content_area.items()
+            }
+            GAME_STATE.full_redraw = True
+            print(f"Reloaded {CONFIG.path}")
+        elif config_watcher.error is not None and config_watcher.error is not reported_error:
+            print(config_watcher.error)
+            reported_error = config_watcher.error
+
+        for finished in GAME_STATE.simulation.advance(elapsed):
+            handler = FINISHED_HANDLERS.get(type(finished))
+            if handler is not None:
+                handler(finished)
+        PROFILER.mark("simulation")
 
         """
         2. Update objects.
@@ -119,54 +137,239 @@ async def main() -> None:
         for label in top_menu:
             label.update(GAME_STATE)
 
-        for obj in content_area[GAME_STATE["clicked_sidebar_button"]]:
-            if not isinstance(obj, Button) and not isinstance(obj, Image):
-                obj.update(GAME_STATE)
+        for obj in updated_objects[GAME_STATE.clicked_sidebar_button]:
+            obj.update(GAME_STATE)
 
-        """
-        3. Clear the screen.
-        """
-        SCREEN.fill(pygame.Color("white"))
+        overlay = GAME_STATE.profiler_overlay
+        if overlay.visible:
+            overlay.update(GAME_STATE)
+
+        ASSETS.collect()
+        PROFILER.mark("update")
 
         """
-        4. Draw objects.
+        3. Clear the screen and 4. draw objects.
         """
-        # Draw objects in content area.
-        for obj in content_area[GAME_STATE["clicked_sidebar_button"]]:
-            obj.draw(
-                SCREEN, FONTS[f'{GAME_STATE["clicked_sidebar_button"].lower()}_font']
-            )
-
-        # Draw objects on screen (top menu labels + sidebar buttons).
-        for obj in top_menu:
-            obj.draw(SCREEN, FONTS["player_attribute_font"])
-
-        for obj in sidebar:
-            obj.draw(SCREEN, FONTS["sidebar_font"])
-
-        # Separate top menu and side bar from content.
-        pygame.draw.line(
-            SCREEN, pygame.Color("black"), (0, 50), (SCREEN.get_width(), 50)
-        )
-        pygame.draw.line(
-            SCREEN, pygame.Color("black"), (170, 50), (170, SCREEN.get_height())
+        full_redraw = (
+            GAME_STATE.full_redraw
+            or not CONFIG.display.dirty_rects
+            or drawn_sidebar_button != GAME_STATE.clicked_sidebar_button
         )
+        if full_redraw:
+            draw_full(top_menu, sidebar, content_area)
+        else:
+            damaged_rects = draw_dirty(top_menu, sidebar, content_area)
 
         # +quantity notifications
+        if not full_redraw and drawn_blink_rect is not None:
+            SCREEN.fill(pygame.Color("white"), drawn_blink_rect)
+            damaged_rects.append(drawn_blink_rect)
+
+        blink_rect = None
         if (
-            GAME_STATE["blink_inventory_update_text"] is not None
-            and GAME_STATE["clicked_sidebar_button"] == "Skills"
+            GAME_STATE.blink_inventory_update_text is not None
+            and GAME_STATE.clicked_sidebar_button == "Skills"
         ):
-            text, x, y = GAME_STATE["blink_inventory_update_text"]
-            SCREEN.blit(text, (x, y))
+            text, x, y = GAME_STATE.blink_inventory_update_text
+            blink_rect = SCREEN.blit(text, (x, y))
+            if not full_redraw:
+                damaged_rects.append(blink_rect)
+
+        if overlay.visible and (full_redraw or overlay.dirty):
+            if not full_redraw:
+                SCREEN.fill(pygame.Color("white"), overlay.drawn_rect)
+                damaged_rects.append(overlay.drawn_rect)
+            overlay.draw(SCREEN, FONTS["profiler_font"])
+            if not full_redraw:
+                damaged_rects.append(overlay.drawn_rect)
+        PROFILER.mark("overlays")
 
         """
         5. Update screen.
         """
-        pygame.display.flip()
-
-        CLOCK.tick(60)
+        if full_redraw:
+            pygame.display.flip()
+        elif damaged_rects:
+            draw_separators()
+            pygame.display.update(damaged_rects)
+        PROFILER.mark("flip")
+
+        if first_frame:
+            logger.info("First frame after %.0f ms", (perf_counter() - started) * 1000)
+            first_frame = False
+
+        GAME_STATE.full_redraw = False
+        drawn_sidebar_button = GAME_STATE.clicked_sidebar_button
+        drawn_blink_rect = blink_rect
+
+        elapsed = CLOCK.tick(60)
         await asyncio.sleep(0)
+        PROFILER.mark("tick")
+        PROFILER.end_frame()
+
+
+def on_quit(event: pygame.event.Event) -> None:
+    GAME_STATE.autosave.close()
+    if PROFILER.enabled and CONFIG.profiler.trace_path is not None:
+        PROFILER.dump(Path(CONFIG.profiler.trace_path))
+    sys.exit()
+
+
+def on_video_expose(event: pygame.event.Event) -> None:
+    GAME_STATE.full_redraw = True
+
+
+def on_mouse_button_up(event: pygame.event.Event) -> None:
+    pos = pygame.mouse.get_pos()
+
+    # Check whether any sidebar menu button was clicked.
+    clicked_sidebar_button = [
+        obj for obj in GAME_STATE.sidebar if obj.rect.collidepoint(pos)
+    ]
+    if clicked_sidebar_button:
+        clicked_sidebar_button[0].onclick()
+
+    clicked_content_button = [
+        obj
+        for obj in GAME_STATE.content_area[GAME_STATE.clicked_sidebar_button]
+        if isinstance(obj, Button) and obj.rect.collidepoint(pos)
+    ]
+    if clicked_content_button:
+        if event.button == 3:
+            clicked_content_button[0].onrightclick()
+        else:
+            clicked_content_button[0].onclick()
+
+
+def on_key_down(event: pygame.event.Event) -> None:
+    if event.key == CONFIG.overlay_key_code:
+        # Profiling starts with the first look at the overlay.
+        global PROFILER
+        if not PROFILER.enabled:
+            PROFILER = Profiler(CONFIG.profiler.window)
+            GAME_STATE.profiler_overlay.profiler = PROFILER
+
+        GAME_STATE.profiler_overlay.visible = not GAME_STATE.profiler_overlay.visible
+        GAME_STATE.full_redraw = True
+
+
+def on_blink_inventory_update_text(event: pygame.event.Event) -> None:
+    GAME_STATE.blink_inventory_update_text = None
+
+
+def on_skill_action_finished(finished: SkillActionFinished) -> None:
+    button_x, button_y = GAME_STATE.skill_buttons[finished.skill, finished.item]
+
+    # +quantity notification
+    GAME_STATE.blink_inventory_update_text = (
+        TEXTS.render(
+            FONTS["sidebar_font"],
+            f"+{finished.quantity}",
+            pygame.Color("black"),
+        ),
+        button_x + 125,
+        button_y + 10,
+    )
+    pygame.time.set_timer(BLINK_INVENTORY_UPDATE_TEXT, 1000, loops=1)
+
+
+# Handlers of PyGame events by event type.
+EVENT_HANDLERS: Dict[int, Callable[[pygame.event.Event], None]] = {
+    pygame.QUIT: on_quit,
+    pygame.VIDEOEXPOSE: on_video_expose,
+    pygame.MOUSEBUTTONUP: on_mouse_button_up,
+    pygame.KEYDOWN: on_key_down,
+    BLINK_INVENTORY_UPDATE_TEXT: on_blink_inventory_update_text,
+}
+
+# Handlers of actions finished by the simulation by their type.
+FINISHED_HANDLERS: Dict[type, Callable[[Any], None]] = {
+    SkillActionFinished: on_skill_action_finished,
+}
+
+
+def draw_full(top_menu, sidebar, content_area) -> None:
+    """
+    Clears the screen and draws every object.
+    """
+
+    SCREEN.fill(pygame.Color("white"))
+    PROFILER.mark("clear")
+
+    # Draw objects in content area.
+    for obj in content_area[GAME_STATE.clicked_sidebar_button]:
+        start = PROFILER.now()
+        obj.draw(SCREEN, FONTS[f'{GAME_STATE.clicked_sidebar_button.lower()}_font'])
+        PROFILER.widget(type(obj).__name__, start)
+    PROFILER.mark(GAME_STATE.clicked_sidebar_button)
+
+    # Draw objects on screen (top menu labels + sidebar buttons).
+    for obj in top_menu:
+        start = PROFILER.now()
+        obj.draw(SCREEN, FONTS["player_attribute_font"])
+        PROFILER.widget(type(obj).__name__, start)
+
+    for obj in sidebar:
+        start = PROFILER.now()
+        obj.draw(SCREEN, FONTS["sidebar_font"])
+        PROFILER.widget(type(obj).__name__, start)
+
+    draw_separators()
+    PROFILER.mark("menus")
+
+
+def draw_dirty(top_menu, sidebar, content_area) -> List[pygame.Rect]:
+    """
+    Clears and redraws only the objects that changed since they were last drawn.
+    Returns the damaged areas of the screen.
+    """
+
+    content_font = FONTS[f'{GAME_STATE.clicked_sidebar_button.lower()}_font']
+    groups = [
+        (
+            GAME_STATE.clicked_sidebar_button,
+            [(obj, content_font) for obj in content_area[GAME_STATE.clicked_sidebar_button]],
+        ),
+        (
+            "menus",
+            [
+                *((obj, FONTS["player_attribute_font"]) for obj in top_menu),
+                *((obj, FONTS["sidebar_font"]) for obj in sidebar),
+            ],
+        ),
+    ]
+
+    damaged_rects = []
+    for phase, objects in groups:
+        for obj, font in objects:
+            if not obj.dirty:
+                continue
+
+            start = PROFILER.now()
+            old_rect = obj.drawn_rect
+            if old_rect is not None:
+                SCREEN.fill(pygame.Color("white"), old_rect)
+
+            obj.draw(SCREEN, font)
+            PROFILER.widget(type(obj).__name__, start)
+
+            damaged_rects.append(
+                obj.drawn_rect if old_rect is None else old_rect.union(obj.drawn_rect)
+            )
+        PROFILER.mark(phase)
+
+    return damaged_rects
+
+
+def draw_separators() -> None:
+    """
+    Separates top menu and side bar from content.
+    """
+
+    pygame.draw.line(SCREEN, pygame.Color("black"), (0, 50), (SCREEN.get_width(), 50))
+    pygame.draw.line(
+        SCREEN, pygame.Color("black"), (170, 50), (170, SCREEN.get_height())
+    )
 
 
 def configure_pygame():
@@ -175,7 +378,9 @@ def configure_pygame():
     Returns important objects used during the game.
     """
 
-    pygame.init()
+    # Only the modules the game uses, initializing e.g. the mixer takes time.
+    pygame.display.init()
+    pygame.font.init()
     screen = pygame.display.set_mode(CONFIG.display.size)
     pygame.display.set_caption(CONFIG.display.caption)
 
@@ -194,27 +399,31 @@ def configure_engine():
     # Reproducibility.
     random.seed(CONFIG.globals.seed)
 
-    # Add custom events.
-    pygame.time.set_timer(REFILL_ENERGY, CONFIG.rates.energy)
-    pygame.time.set_timer(REFILL_HITPOINTS, CONFIG.rates.hitpoints)
-
     # For now, we only support one player in the game.
-    player = Player(Path("example_players/player1"))
-    print(player.skills_progress)
-    game_state = {
-        "clicked_sidebar_button": "Inventory",  # remembers what sidebar button was clicked, default is the Inventory
-        "explore": {},  # remembers the end time of clicked explore action (if there is one)
-        "player": player,  # remembers the player,
-        "skill_action": {skill: {} for skill in CONFIG.skills},
-        "blink_inventory_update_text": None,  # shows a small amount of new items that were added to inventory shortly after the action was finished
-    }
-
-    return game_state
+    player = autosave.restore(Path(CONFIG.autosave.path))
+
+    # Catch up on the action queue while the game was closed.
+    simulation = Simulation(player, CONFIG)
+    offline = int(time() * 1000) - player.saved_at if player.saved_at else 0
+    simulation.resume(max(offline, 0))
+
+    return GameState(
+        player,
+        Autosave(
+            player,
+            Path(CONFIG.autosave.path),
+            CONFIG.autosave.interval,
+            CONFIG.autosave.snapshot_interval,
+        ),
+        simulation,
+    )
 
 
 def init_ui_objects() -> List[object]:
     top_menu = [
-        PlayerAttributeLabel(200 + i * 225, 15, attribute, pygame.Color(color))
+        PlayerAttributeLabel(
+            200 + i * 225, 15, attribute, pygame.Color(color), TEXTS
+        )
         for i, (attribute, color) in enumerate(
             zip(
                 ["hitpoints", "balance", "energy", "level"],
@@ -230,11 +439,19 @@ def init_ui_objects() -> List[object]:
 
     content_area = {}
     content_area["Inventory"] = [
-        InventoryGrid(CONFIG.inventory.size, FONTS["inventory_font"])
+        InventoryGrid(CONFIG.inventory.size, FONTS["inventory_font"], ASSETS, TEXTS)
     ]
 
     content_area["Skills"] = [
-        Image(250 + i * 200, 125, 100, 100, f"{skill}_icon.png", skill.capitalize())
+        Image(
+            250 + i * 200,
+            125,
+            *SKILL_ICON_SIZE,
+            f"{skill}_icon.png",
+            skill.capitalize(),
+            ASSETS,
+            TEXTS,
+        )
         for i, skill in enumerate(CONFIG.skills)
     ]
     content_area["Skills"].extend(
@@ -244,26 +461,21 @@ def init_ui_objects() -> List[object]:
                 300 + row * 50,
                 120,
                 35,
-                f'{item} ({getattr(CONFIG, skill).energy[row]}e, {getattr(CONFIG, skill).duration[row] // 1000}s)',
-                on_skill_action(skill, event, row, 250 + col * 200, 300 + row * 50),
-            )
-            for col, (skill, event) in enumerate(
-                zip(
-                    CONFIG.skills,
-                    [
-                        ORE_MINED,
-                        LOG_CHOPPED,
-                        FISH_CAUGHT,
-                        HERB_PICKED,
-                        CRYSTAL_GATHERED,
-                    ],
-                )
+                f'{item.name} ({item.energy}e, {item.duration // 1000}s)',
+                on_skill_action(skill, row),
+                on_queue_skill_action(skill, row),
             )
-            for row, item in enumerate(getattr(CONFIG, skill).items)
+            for col, skill in enumerate(CONFIG.skills)
+            for row, item in enumerate(CONFIG.items[skill])
         ]
     )
+    GAME_STATE.skill_buttons = {
+        (skill, row): (250 + col * 200, 300 + row * 50)
+        for col, skill in enumerate(CONFIG.skills)
+        for row in range(len(CONFIG.items[skill]))
+    }
 
-    content_area["Explore"] = [ExploreActionLabel(750, 370, pygame.Color("black"))]
+    content_area["Explore"] = [ExploreActionLabel(750, 370, pygame.Color("black"), TEXTS)]
     content_area["Explore"].extend(
         [
             Button(
@@ -271,52 +483,53 @@ def init_ui_objects() -> List[object]:
                 250 + i * 100,
                 250,
                 50,
-                f'{explore_type.capitalize()} ({CONFIG.explore.duration[i] // 1000}s, {CONFIG.explore.energy[i]}e)',
+                f'{explore_type.name.capitalize()} ({explore_type.duration // 1000}s, {explore_type.energy}e)',
                 on_explore(i),
             )
-            for i, explore_type in enumerate(CONFIG.explore.items)
+            for i, explore_type in enumerate(CONFIG.items["explore"])
         ]
     )
 
     return top_menu, sidebar, content_area
 
 
+def preload_resources():
+    """
+    Yields the (resource, size) pairs the content areas draw, the inventory first.
+    """
+
+    for item, _ in GAME_STATE.player.inventory:
+        yield item.resource_path, InventoryGrid.SLOT_SIZE
+
+    for skill in CONFIG.skills:
+        yield f"{skill}_icon.png", SKILL_ICON_SIZE
+
+    for items in gathered_items(CONFIG).values():
+        for item in items:
+            yield item.resource_path, InventoryGrid.SLOT_SIZE
+
+
 def on_explore(item):
     def callback():
-        if (
-            GAME_STATE["explore"]
-            or GAME_STATE["player"].energy < CONFIG.explore.energy[item]
-        ):
-            return
-
-        GAME_STATE["explore"] = {
-            "end": pygame.time.get_ticks() + CONFIG.explore.duration[item],
-            "item": item,
-        }
-        GAME_STATE["player"].energy -= CONFIG.explore.energy[item]
-        pygame.time.set_timer(
-            EXPLORE_FINISHED, CONFIG.explore.duration[item], loops=1
-        )
+        GAME_STATE.simulation.start_explore(item)
 
     return callback
 
 
-def on_skill_action(skill, event, item, button_x, button_y):
+def on_skill_action(skill, item):
     def callback():
-        if (
-            GAME_STATE["skill_action"][skill]
-            or GAME_STATE["player"].energy < getattr(CONFIG, skill).energy[item]
-        ):
-            return
-
-        GAME_STATE["player"].energy -= getattr(CONFIG, skill).energy[item]
-        GAME_STATE["skill_action"][skill] = {
-            "end": pygame.time.get_ticks() + getattr(CONFIG, skill).duration[item],
-            "item": item,
-            "button_x": button_x,
-            "button_y": button_y,
-        }
-        pygame.time.set_timer(event, getattr(CONFIG, skill).duration[item], loops=1)
+        GAME_STATE.simulation.start_skill_action(skill, item)
+
+    return callback
+
+
+def on_queue_skill_action(skill, item):
+    """
+    Right click queues the action until energy runs out.
+    """
+
+    def callback():
+        GAME_STATE.simulation.enqueue(skill, item)
 
     return callback
 
@@ -1,15 +1,28 @@
+from .assets import AssetCache
 from .button import Button, SidebarButton
+from .events import *
 from .image import Image
 from .inventory import InventoryGrid
 from .label import ExploreActionLabel, PlayerAttributeLabel
-from .fonts import init_fonts
+from .fonts import Fonts, init_fonts
+from .profiler import NullProfiler, Profiler, ProfilerOverlay
+from .text import TextCache
+from .widget import Widget
 
 __all__ = [
+    "AssetCache",
     "Button",
     "SidebarButton",
+    "BLINK_INVENTORY_UPDATE_TEXT",
     "Image",
     "InventoryGrid",
     "ExploreActionLabel",
     "PlayerAttributeLabel",
-    "init_fonts"
+    "Fonts",
+    "init_fonts",
+    "NullProfiler",
+    "Profiler",
+    "ProfilerOverlay",
+    "TextCache",
+    "Widget",
 ]
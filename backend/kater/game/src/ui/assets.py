@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import sys
+from typing import Dict, Iterable, Optional, Tuple
+import pygame
+
+# Threads are not available in the browser build, there resources are only
+# loaded when they are first drawn.
+_THREADS = sys.platform != "emscripten"
+
+
+class AssetCache:
+    """
+    Keeps decoded and scaled resource images in memory, so that widgets
+    do not load them from disk on every frame.
+
+    Surfaces are keyed by (resource path, target size) and evicted in least
+    recently used order once their total size exceeds the memory budget.
+
+    Resources can be preloaded, they are then decoded and scaled by a thread
+    pool and added to the cache by `collect`, or by `get` if they are needed
+    before that.
+    """
+
+    def __init__(self, memory_budget: int, resources_path: str = "resources/") -> None:
+        self._memory_budget = memory_budget
+        self._resources_path = resources_path
+        self._surfaces: "OrderedDict[Tuple[str, Tuple[int, int]], pygame.Surface]" = (
+            OrderedDict()
+        )
+        self._memory_used = 0
+        self._pending: Dict[Tuple[str, Tuple[int, int]], Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def memory_used(self) -> int:
+        return self._memory_used
+
+    def __len__(self) -> int:
+        return len(self._surfaces)
+
+    def get(self, resource: str, size: Tuple[int, int]) -> pygame.Surface:
+        key = (resource, tuple(size))
+
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        future = self._pending.pop(key, None)
+        if future is not None and future.exception() is None:
+            surface = future.result()
+        else:
+            surface = self._decode(resource, key[1])
+
+        return self._insert(key, surface)
+
+    def preload(self, resources: Iterable[Tuple[str, Tuple[int, int]]], workers: int = 4) -> None:
+        """
+        Starts decoding (resource, size) pairs in the background.
+        """
+
+        if not _THREADS:
+            return
+
+        for resource, size in resources:
+            key = (resource, tuple(size))
+            if key in self._surfaces or key in self._pending:
+                continue
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(workers, "assets")
+            self._pending[key] = self._executor.submit(self._decode, resource, key[1])
+
+    def collect(self) -> None:
+        """
+        Adds the preloaded surfaces that are ready to the cache. Failed ones
+        are dropped, `get` loads them again and raises their error.
+        """
+
+        if not self._pending:
+            return
+
+        for key, future in list(self._pending.items()):
+            if future.done():
+                del self._pending[key]
+                if future.exception() is None:
+                    self._insert(key, future.result())
+
+        if not self._pending:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def clear(self) -> None:
+        self._surfaces.clear()
+        self._memory_used = 0
+
+    def _insert(self, key: Tuple[str, Tuple[int, int]], surface: pygame.Surface) -> pygame.Surface:
+        # convert_alpha() needs a display mode to be set and is left to the
+        # main thread.
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert_alpha()
+
+        self._surfaces[key] = surface
+        self._memory_used += self._surface_size(surface)
+        self._evict()
+
+        return surface
+
+    def _decode(self, resource: str, size: Tuple[int, int]) -> pygame.Surface:
+        surface = pygame.image.load(self._resources_path + resource)
+        return pygame.transform.scale(surface, size)
+
+    def _evict(self) -> None:
+        # Always keep the most recently used surface, even if it alone
+        # does not fit into the budget.
+        while self._memory_used > self._memory_budget and len(self._surfaces) > 1:
+            _, surface = self._surfaces.popitem(last=False)
+            self._memory_used -= self._surface_size(surface)
+
+    @staticmethod
+    def _surface_size(surface: pygame.Surface) -> int:
+        width, height = surface.get_size()
+        return width * height * surface.get_bytesize()
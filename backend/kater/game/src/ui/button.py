@@ -1,7 +1,9 @@
 import pygame
 
+from .widget import Widget
 
-class Button:
+
+class Button(Widget):
     def __init__(
         self,
         x: int,
@@ -10,16 +12,21 @@ class Button:
         height: int,
         text: str,
         onclick,
+        onrightclick=None,
     ) -> None:
+        Widget.__init__(self)
         self._x = x
         self._y = y
         self._width = width
         self._height = height
         self._text = text
         self._onclick = onclick
+        self._onrightclick = onrightclick
 
         self._button_surface = pygame.Surface((self._width, self._height))
         self._button_rect = pygame.Rect(self._x, self._y, self._width, self._height)
+        # font the button surface was composited with, None if it is outdated
+        self._button_font = None
 
     @property
     def rect(self) -> pygame.Rect:
@@ -29,7 +36,27 @@ class Button:
     def text(self) -> str:
         return self._text
 
+    @text.setter
+    def text(self, value: str) -> None:
+        if value != self._text:
+            self._text = value
+            self._button_font = None
+            self.mark_dirty()
+
     def draw(self, screen: pygame.Surface, font: pygame.font.Font) -> None:
+        if self._button_font is not font:
+            self._composite(font)
+
+        self._drawn(screen.blit(self._button_surface, self._button_rect))
+
+    def onclick(self) -> None:
+        self._onclick()
+
+    def onrightclick(self) -> None:
+        if self._onrightclick is not None:
+            self._onrightclick()
+
+    def _composite(self, font: pygame.font.Font) -> None:
         self._button_surface.fill(pygame.Color("gray"))
         self._button_surf = font.render(self._text, True, pygame.Color("black"))
         self._button_surface.blit(
@@ -39,16 +66,12 @@ class Button:
                 self._button_rect.height / 2 - self._button_surf.get_rect().height / 2,
             ],
         )
-
-        screen.blit(self._button_surface, self._button_rect)
-
-    def onclick(self) -> None:
-        self._onclick()
+        self._button_font = font
 
 
 class SidebarButton(Button):
     def __init__(self, game_state, x: int, y: int, width: int, height: int, text: str) -> None:
         def onclick() -> None:
-            game_state["clicked_sidebar_button"] = self._text
+            game_state.clicked_sidebar_button = self._text
 
         Button.__init__(self, x, y, width, height, text, onclick)
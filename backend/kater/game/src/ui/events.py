@@ -0,0 +1,3 @@
+import pygame
+
+BLINK_INVENTORY_UPDATE_TEXT = pygame.USEREVENT + 1
@@ -1,20 +1,49 @@
 from pathlib import Path
 import pygame
 import sys
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 
-def init_fonts() -> Dict[str, pygame.font.Font]:
+class Fonts:
+    """
+    Fonts by name, each opened on first use. Names with the same file and
+    size share one font object.
+    """
+
+    def __init__(self, fonts: Dict[str, Tuple[Optional[Path], int]]) -> None:
+        self._fonts = fonts  # file (None for the default font) and size of every name
+        self._opened: Dict[Tuple[Optional[Path], int], pygame.font.Font] = {}
+
+    def __getitem__(self, name: str) -> pygame.font.Font:
+        key = self._fonts[name]
+        font = self._opened.get(key)
+        if font is None:
+            font = self._opened[key] = pygame.font.Font(*key)
+
+        return font
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._fonts
+
+    def __len__(self) -> int:
+        return len(self._opened)
+
+
+def init_fonts(fonts_path: Optional[Path] = None) -> Fonts:
     pygame.font.init()
 
-    fonts_path = Path(sys.path[0]) / "fonts"
+    if fonts_path is None:
+        fonts_path = Path(sys.path[0]) / "fonts"
     medieval_sharp_path = fonts_path / "MedievalSharp-xOZ5.ttf"
 
-    return {
-        "player_attribute_font": pygame.font.Font(medieval_sharp_path, 30),
-        "sidebar_font": pygame.font.Font(medieval_sharp_path, 24),
-        "content_font": pygame.font.Font(medieval_sharp_path, 28),
-        "inventory_font": pygame.font.Font(medieval_sharp_path, 16),
-        "skills_font": pygame.font.Font(medieval_sharp_path, 18),
-        "explore_font": pygame.font.Font(medieval_sharp_path, 20),
-    }
+    return Fonts(
+        {
+            "player_attribute_font": (medieval_sharp_path, 30),
+            "sidebar_font": (medieval_sharp_path, 24),
+            "content_font": (medieval_sharp_path, 28),
+            "inventory_font": (medieval_sharp_path, 16),
+            "skills_font": (medieval_sharp_path, 18),
+            "explore_font": (medieval_sharp_path, 20),
+            "profiler_font": (None, 16),
+        }
+    )
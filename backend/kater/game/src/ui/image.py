@@ -1,25 +1,39 @@
 import pygame
 
+from .assets import AssetCache
+from .text import TextCache
+from .widget import Widget
 
-class Image:
+
+class Image(Widget):
     def __init__(
-        self, x: int, y: int, width: int, height: int, resource: str, text: str
+        self,
+        x: int,
+        y: int,
+        width: int,
+        height: int,
+        resource: str,
+        text: str,
+        assets: AssetCache,
+        texts: TextCache,
     ):
+        Widget.__init__(self)
         self._x = x
         self._y = y
         self._width = width
         self._height = height
         self._resource = resource
         self._text = text
+        self._assets = assets
+        self._texts = texts
 
     def draw(self, screen: pygame.surface.Surface, font: pygame.font.Font) -> None:
-        image_surface = pygame.image.load("resources/" + self._resource)
-        image_surface = pygame.transform.scale(
-            image_surface, (self._width, self._height)
-        )
-        screen.blit(image_surface, (self._x, self._y))
+        image_surface = self._assets.get(self._resource, (self._width, self._height))
+        image_rect = screen.blit(image_surface, (self._x, self._y))
 
-        image_text = font.render(
-            self._text, True, pygame.Color("black")
+        image_text = self._texts.render(font, self._text, pygame.Color("black"))
+        text_rect = screen.blit(
+            image_text, (self._x + 25, self._y + self._height + 25)
         )
-        screen.blit(image_text, (self._x + 25, self._y + self._height + 25))
+
+        self._drawn(image_rect.union(text_rect))
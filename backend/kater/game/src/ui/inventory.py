@@ -1,24 +1,40 @@
 from itertools import zip_longest
 import pygame
 
-class InventoryGrid:
-    def __init__(self, size, font) -> None:
+from .assets import AssetCache
+from .text import TextCache
+from .widget import Widget
+
+
+class InventoryGrid(Widget):
+    SLOT_SIZE = (100, 100)
+
+    def __init__(self, size, font, assets: AssetCache, texts: TextCache) -> None:
+        Widget.__init__(self)
         self._size = size
         self._font = font
+        self._assets = assets
+        self._texts = texts
+        self._inventory_items = []
+        self._inventory = None
+        self._inventory_version = None
 
     def update(self, game_state) -> None:
-        self._inventory_items = sorted(
-            game_state["player"].inventory, key=lambda x: x[0].name
-        )
+        inventory = game_state.player.inventory
+        if inventory is self._inventory and inventory.version == self._inventory_version:
+            return
 
-    def draw(self, content_area: pygame.Surface, font: pygame.font.Font) -> None:
-        content_area.fill(pygame.Color("white"))
+        self._inventory_items = list(inventory.sorted())
+        self._inventory = inventory
+        self._inventory_version = inventory.version
+        self.mark_dirty()
 
+    def draw(self, content_area: pygame.Surface, font: pygame.font.Font) -> None:
         self._font = self._font or font
 
         # make square slots for items
         rows, cols = self._size // 6, 6
-        slot_width, slot_height = 100, 100
+        slot_width, slot_height = self.SLOT_SIZE
         padding = 50
         start_x, start_y = 300, 100
         item_rects = []
@@ -34,21 +50,26 @@ class InventoryGrid:
                 )
 
         # draw the grid
+        drawn_rects = []
         for item_rect, inventory_item in zip_longest(item_rects, self._inventory_items):
-            pygame.draw.rect(content_area, pygame.Color("black"), item_rect, width=1)
+            drawn_rects.append(
+                pygame.draw.rect(content_area, pygame.Color("black"), item_rect, width=1)
+            )
 
             if inventory_item is None:
                 continue
 
             item, quantity = inventory_item
-            item_image_surface = pygame.image.load("resources/" + item.resource_path)
-            item_image_surface = pygame.transform.scale(
-                item_image_surface, (item_rect.width, item_rect.height)
-            )
+            item_image_surface = self._assets.get(item.resource_path, item_rect.size)
 
-            quantity_text = self._font.render(
-                f"{quantity}x {item.name}", True, pygame.Color("black")
+            quantity_text = self._texts.render(
+                self._font, f"{quantity}x {item.name}", pygame.Color("black")
             )
 
             content_area.blit(item_image_surface, item_rect.topleft)
-            content_area.blit(quantity_text, (item_rect.left, item_rect.bottom))
+            drawn_rects.append(
+                content_area.blit(quantity_text, (item_rect.left, item_rect.bottom))
+            )
+
+        self._drawn(drawn_rects[0].unionall(drawn_rects[1:]))
+
@@ -1,46 +1,66 @@
 import pygame
 
-class ExploreActionLabel:
+from .text import TextCache
+from .widget import Widget
+
+
+class ExploreActionLabel(Widget):
     def __init__(
         self,
         x: int,
         y: int,
-        text_color: pygame.color.Color
+        text_color: pygame.color.Color,
+        texts: TextCache,
     ) -> None:
+        Widget.__init__(self)
         self._x = x
         self._y = y
         self._text_color = text_color
+        self._texts = texts
+        self._text_value = None
 
     def update(self, game_state) -> None:
-        if not game_state["explore"]:
-            self._text_value = "You are not exploring now."
+        simulation = game_state.simulation
+        if simulation.explore is None:
+            text_value = "You are not exploring now."
         else:
-            current_ticks = pygame.time.get_ticks()
-            remaining_ticks = game_state["explore"]["end"] - current_ticks
+            remaining_ticks = simulation.explore.end - simulation.time
             remaining_time = remaining_ticks // 1000
-            self._text_value = f"Remaining time: {remaining_time} seconds"
+            text_value = f"Remaining time: {remaining_time} seconds"
+
+        if text_value != self._text_value:
+            self._text_value = text_value
+            self.mark_dirty()
 
     def draw(self, screen: pygame.Surface, font: pygame.font.Font):
-        image = font.render(self._text_value, True, self._text_color)
-        screen.blit(image, (self._x, self._y))
+        image = self._texts.render(font, self._text_value, self._text_color)
+        self._drawn(screen.blit(image, (self._x, self._y)))
+
 
-class PlayerAttributeLabel:
+class PlayerAttributeLabel(Widget):
     def __init__(
         self,
         x: int,
         y: int,
         property_name: str,
         text_color: pygame.color.Color,
+        texts: TextCache,
     ) -> None:
+        Widget.__init__(self)
         self._x = x
         self._y = y
         self._property_name = property_name
         self._text_color = text_color
+        self._texts = texts
+        self._property_value = None
 
     def update(self, game_state) -> None:
-        self._property_value = getattr(game_state["player"], self._property_name)
+        property_value = getattr(game_state.player, self._property_name)
+        if property_value != self._property_value:
+            self._property_value = property_value
+            self.mark_dirty()
 
     def draw(self, screen: pygame.Surface, font: pygame.font.Font) -> None:
         label_text = f"{self._property_name.capitalize()}: {self._property_value}"
-        image = font.render(label_text, True, self._text_color)
-        screen.blit(image, (self._x, self._y))
\ No newline at end of file
+        image = self._texts.render(font, label_text, self._text_color)
+        self._drawn(screen.blit(image, (self._x, self._y)))
@@ -0,0 +1,196 @@
+from collections import deque
+import csv
+import json
+from pathlib import Path
+from time import perf_counter
+from typing import Deque, Dict, List, Tuple
+import pygame
+
+from .widget import Widget
+
+
+class NullProfiler:
+    """
+    Stands in for the profiler while profiling is disabled, every call does nothing.
+    """
+
+    enabled = False
+    frames = 0
+
+    def start_frame(self) -> None:
+        pass
+
+    def mark(self, phase: str) -> None:
+        pass
+
+    def now(self) -> float:
+        return 0.0
+
+    def widget(self, name: str, start: float) -> None:
+        pass
+
+    def end_frame(self) -> None:
+        pass
+
+
+class Profiler:
+    """
+    Times the phases of every frame and the draws of every kind of widget.
+
+    A phase lasts from the previous mark (or the start of the frame) to its
+    own mark. Percentiles are taken over the last `window` frames, the trace
+    keeps every phase of the last `trace_frames` frames for `dump`.
+    """
+
+    enabled = True
+
+    def __init__(self, window: int = 300, trace_frames: int = 100000) -> None:
+        self.frames = 0
+        self._window = window
+        self._phases: Dict[str, Deque[float]] = {}  # ms of the last frames per phase
+        self._widgets: Dict[str, Deque[float]] = {}  # ms per frame per widget class
+        self._trace: Deque[Tuple[int, Dict[str, float], Dict[str, float]]] = deque(
+            maxlen=trace_frames
+        )
+
+        self._frame_phases: Dict[str, float] = {}
+        self._frame_widgets: Dict[str, float] = {}
+        self._last = perf_counter()
+
+    def start_frame(self) -> None:
+        self._last = perf_counter()
+
+    def mark(self, phase: str) -> None:
+        now = perf_counter()
+        self._frame_phases[phase] = (
+            self._frame_phases.get(phase, 0.0) + (now - self._last) * 1000
+        )
+        self._last = now
+
+    def now(self) -> float:
+        return perf_counter()
+
+    def widget(self, name: str, start: float) -> None:
+        """
+        Adds the time since `start`, taken with `now`, to the draws of a widget class.
+        """
+
+        self._frame_widgets[name] = (
+            self._frame_widgets.get(name, 0.0) + (perf_counter() - start) * 1000
+        )
+
+    def end_frame(self) -> None:
+        for samples, frame in (
+            (self._phases, self._frame_phases),
+            (self._widgets, self._frame_widgets),
+        ):
+            for name, ms in frame.items():
+                if name not in samples:
+                    samples[name] = deque(maxlen=self._window)
+                samples[name].append(ms)
+
+        self._trace.append((self.frames, self._frame_phases, self._frame_widgets))
+        self._frame_phases = {}
+        self._frame_widgets = {}
+        self.frames += 1
+
+    def phase_percentiles(self) -> Dict[str, Tuple[float, float, float]]:
+        """
+        Returns the 50th, 95th and 99th percentile in ms of every phase.
+        """
+
+        return _percentiles(self._phases)
+
+    def widget_percentiles(self) -> Dict[str, Tuple[float, float, float]]:
+        """
+        Returns the 50th, 95th and 99th percentile in ms per frame of every widget class.
+        """
+
+        return _percentiles(self._widgets)
+
+    def dump(self, path: Path) -> None:
+        """
+        Writes the trace as JSON, or as CSV with one row per frame and
+        phase or widget if the path ends with .csv.
+        """
+
+        path = Path(path)
+        if path.suffix == ".csv":
+            with path.open("w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame", "kind", "name", "ms"])
+                for frame, phases, widgets in self._trace:
+                    for kind, times in (("phase", phases), ("widget", widgets)):
+                        for name, ms in times.items():
+                            writer.writerow([frame, kind, name, f"{ms:.4f}"])
+        else:
+            trace = [
+                {"frame": frame, "phases": phases, "widgets": widgets}
+                for frame, phases, widgets in self._trace
+            ]
+            path.write_text(json.dumps(trace))
+
+
+def _percentiles(samples: Dict[str, Deque[float]]) -> Dict[str, Tuple[float, float, float]]:
+    percentiles = {}
+    for name, values in samples.items():
+        ordered = sorted(values)
+        last = len(ordered) - 1
+        percentiles[name] = tuple(
+            ordered[round(last * q)] for q in (0.5, 0.95, 0.99)
+        )
+
+    return percentiles
+
+
+class ProfilerOverlay(Widget):
+    """
+    Shows the percentiles of a profiler, refreshed every `refresh` frames.
+    Texts change all the time, so they are rendered without the text cache.
+    """
+
+    _COLUMNS = (0, 80, 109, 138)  # x offsets of the name, p50, p95 and p99
+
+    def __init__(self, x: int, y: int, refresh: int = 15) -> None:
+        Widget.__init__(self)
+        self._x = x
+        self._y = y
+        self._refresh = refresh
+        self._rows: List[Tuple[str, ...]] = []
+        self._refreshed = None  # frame of the profiler the rows were taken at
+        self.profiler = NullProfiler()
+        self.visible = False
+
+    def update(self, game_state) -> None:
+        frames = self.profiler.frames
+        if not self.profiler.enabled or (
+            self._refreshed is not None and frames - self._refreshed < self._refresh
+        ):
+            return
+
+        rows = [("phase ms", "p50", "p95", "p99")]
+        for title, percentiles in (
+            (None, self.profiler.phase_percentiles()),
+            ("widgets", self.profiler.widget_percentiles()),
+        ):
+            if title is not None:
+                rows.append((title,))
+            rows.extend(
+                (name[:13], *(f"{ms:.2f}" for ms in values))
+                for name, values in percentiles.items()
+            )
+
+        self._refreshed = frames
+        if rows != self._rows:
+            self._rows = rows
+            self.mark_dirty()
+
+    def draw(self, screen: pygame.Surface, font: pygame.font.Font) -> None:
+        rect = pygame.Rect(self._x, self._y, 0, 0)
+        for i, row in enumerate(self._rows):
+            y = self._y + i * font.get_linesize()
+            for text, offset in zip(row, self._COLUMNS):
+                image = font.render(text, True, pygame.Color("black"))
+                rect.union_ip(screen.blit(image, (self._x + offset, y)))
+
+        self._drawn(rect)
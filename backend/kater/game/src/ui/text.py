@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from typing import Tuple
+import pygame
+
+
+class TextCache:
+    """
+    Keeps rendered text surfaces, so that strings that rarely change are not
+    rasterized again on every frame.
+
+    Surfaces are keyed by (font, text, color, antialias) and evicted in least
+    recently used order once there are more than `max_size` of them.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._surfaces: "OrderedDict[Tuple, pygame.Surface]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._surfaces)
+
+    def render(
+        self,
+        font: pygame.font.Font,
+        text: str,
+        color: pygame.Color,
+        antialias: bool = True,
+    ) -> pygame.Surface:
+        # pygame.Color is not hashable.
+        key = (font, text, tuple(color), antialias)
+
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self._max_size:
+            self._surfaces.popitem(last=False)
+
+        return surface
+
+    def clear(self) -> None:
+        self._surfaces.clear()
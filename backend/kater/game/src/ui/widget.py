@@ -0,0 +1,31 @@
+from typing import Optional
+import pygame
+
+
+class Widget:
+    """
+    Base class of UI objects drawn by the game loop.
+
+    A widget is dirty when its look changed since it was last drawn. Together
+    with the area covered by its last draw, this lets the loop clear and
+    redraw only the damaged parts of the screen.
+    """
+
+    def __init__(self) -> None:
+        self._dirty = True
+        self._drawn_rect: Optional[pygame.Rect] = None
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    @property
+    def drawn_rect(self) -> Optional[pygame.Rect]:
+        return self._drawn_rect
+
+    def mark_dirty(self) -> None:
+        self._dirty = True
+
+    def _drawn(self, rect: pygame.Rect) -> None:
+        self._drawn_rect = rect
+        self._dirty = False
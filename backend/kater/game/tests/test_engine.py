@@ -0,0 +1,518 @@
+"""
+Tests of the game rules, independent of PyGame.
+
+Run from the game directory:
+
+    python -m unittest tests.test_engine
+"""
+
+import json
+import os
+from pathlib import Path
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from src.engine import (
+    Autosave,
+    Config,
+    ConfigError,
+    ConfigWatcher,
+    Inventory,
+    Item,
+    Player,
+    QueuedAction,
+    SaveError,
+    Scheduler,
+    Simulation,
+)
+from src.engine import save
+from src.engine.autosave import journal_path, restore
+from src.engine.config import DEFAULT_PATH
+from src.engine.item import gathered_items
+from src.engine.save import SaveData, dumps, loads
+
+
+def config_with(**sections) -> Config:
+    """
+    The default configuration with some fields of its sections replaced.
+    """
+
+    data = json.loads(DEFAULT_PATH.read_text(encoding="utf-8"))
+    for section, values in sections.items():
+        data[section].update(values)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "config.json"
+        path.write_text(json.dumps(data), encoding="utf-8")
+        return Config(path)
+
+
+class AutosaveTest(unittest.TestCase):
+    """
+    Drives the steps of `Autosave.run` directly instead of its timers.
+    """
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "player.save"
+
+        self.player = Player()
+        self.autosave = Autosave(self.player, self.path)
+        self.autosave._compact(self.autosave._journaled)
+
+    def journal(self) -> None:
+        self.autosave.record()
+        pending, self.autosave._pending = bytes(self.autosave._pending), bytearray()
+        self.autosave._append(pending)
+
+    def play(self, balance) -> None:
+        self.player.balance = balance
+        self.player.inventory.add(Item("Test Ore", "mining/test_ore.png"), 2)
+        self.player.skills_progress["mining"] = (2, balance)
+        self.player.action_queue.append(QueuedAction("mining", 0, 3, True))
+
+    @staticmethod
+    def state(player: Player):
+        return (
+            player.energy,
+            player.balance,
+            dict(player.skills_progress),
+            sorted((item.name, quantity) for item, quantity in player.inventory),
+            list(player.action_queue),
+        )
+
+    def test_replays_the_journal_over_the_save(self) -> None:
+        self.play(10)
+        self.journal()
+        self.play(20)
+        self.journal()
+
+        self.assertEqual(self.state(restore(self.path)), self.state(self.player))
+        self.assertEqual(save.load(self.path).balance, 0)  # only in the journal
+
+    def test_ignores_a_torn_final_record(self) -> None:
+        self.play(10)
+        self.journal()
+        expected = self.state(self.player)
+        self.play(20)
+        self.journal()
+
+        journal = journal_path(self.path)
+        journal.write_bytes(journal.read_bytes()[:-3])
+        self.assertEqual(self.state(restore(self.path)), expected)
+
+    def test_compaction_replaces_the_journal(self) -> None:
+        self.play(10)
+        self.journal()
+        self.autosave._compact(self.autosave._journaled)
+
+        self.assertEqual(save.load(self.path).balance, 10)
+        self.assertEqual(self.state(restore(self.path)), self.state(self.player))
+
+        # A journal left over from before the compaction is not replayed again.
+        stale = journal_path(self.path).read_bytes()
+        self.play(20)
+        self.autosave.close()
+        journal_path(self.path).write_bytes(stale)
+        self.assertEqual(self.state(restore(self.path)), self.state(self.player))
+
+
+class BatchSimulationTest(unittest.TestCase):
+    def setUp(self) -> None:
+        try:
+            from src.engine import batch
+        except ImportError:
+            self.skipTest("NumPy is not installed")
+        self.batch = batch
+
+    def test_matches_simulation(self) -> None:
+        config = Config()
+        item_ids = list(range(len(self.batch.BatchSimulation(config, []).items)))
+
+        self.assertEqual(self.batch.compare_with_simulation(config, item_ids, 500), [])
+
+    def test_starts_at_the_caps(self) -> None:
+        config = config_with(caps={"energy": 60, "hitpoints": 80})
+        item_ids = list(range(len(self.batch.BatchSimulation(config, []).items)))
+
+        simulation = self.batch.BatchSimulation(config, item_ids)
+        self.assertEqual(simulation.energy.tolist(), [60] * len(item_ids))
+        self.assertEqual(simulation.hitpoints.tolist(), [80] * len(item_ids))
+        self.assertEqual(self.batch.compare_with_simulation(config, item_ids, 500), [])
+
+    def test_rejects_caps_beyond_16_bits(self) -> None:
+        for sections in (
+            {"caps": {"energy": 40000}},
+            {"caps": {"hitpoints": 32767}},  # and the refill of a step on top
+            {"caps": {"energy": 30000}, "rates": {"base_energy_refill": 5000}},
+        ):
+            with self.subTest(sections=sections):
+                with self.assertRaisesRegex(ValueError, "16 bit"):
+                    self.batch.BatchSimulation(config_with(**sections), [0])
+
+
+class ConfigTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "config.json"
+        self.data = json.loads(DEFAULT_PATH.read_text(encoding="utf-8"))
+        self.mtime = os.stat(DEFAULT_PATH).st_mtime_ns
+
+    def write(self, **sections) -> None:
+        data = json.loads(json.dumps(self.data))
+        for section, values in sections.items():
+            data[section].update(values)
+        self.path.write_text(json.dumps(data), encoding="utf-8")
+
+        # A new modification time on every write, however fast they follow.
+        self.mtime += 1_000_000_000
+        os.utime(self.path, ns=(self.mtime, self.mtime))
+
+    def test_rejects_invalid_values(self) -> None:
+        for section, values, message in (
+            ("caps", {"energy": "100"}, "caps.energy must be an integer"),
+            ("inventory", {"size": 0}, "inventory.size must be positive"),
+            ("rates", {"unknown": 1}, "rates has unknown keys"),
+            ("caps", {"energy": 5}, "energy must not exceed the energy cap 5"),
+            ("profiler", {"overlay_key": "f33"}, "profiler.overlay_key must be a key name"),
+        ):
+            with self.subTest(section=section, values=values):
+                self.write(**{section: values})
+                with self.assertRaisesRegex(ConfigError, message):
+                    Config(self.path)
+
+    def test_resolves_the_overlay_key_when_loaded(self) -> None:
+        codes = set()
+        for key in ("f5", "f6"):
+            self.write(profiler={"overlay_key": key})
+            codes.add(Config(self.path).overlay_key_code)
+
+        self.assertEqual(len(codes), 2)
+        self.assertTrue(all(isinstance(code, int) for code in codes))
+
+    def test_watcher_reloads_a_changed_file(self) -> None:
+        self.write()
+        watcher = ConfigWatcher(Config(self.path), 100)
+        self.assertIsNone(watcher.poll(100))  # unchanged
+
+        self.write(caps={"energy": 60})
+        self.assertIsNone(watcher.poll(50))  # not checked before the interval
+        config = watcher.poll(50)
+        self.assertEqual(config.caps.energy, 60)
+        self.assertIsNone(watcher.poll(100))
+
+    def test_watcher_keeps_the_config_when_a_reload_fails(self) -> None:
+        self.write()
+        watcher = ConfigWatcher(Config(self.path), 100)
+
+        self.write(caps={"energy": -1})
+        self.assertIsNone(watcher.poll(100))
+        self.assertIsInstance(watcher.error, ConfigError)
+        self.assertIsNone(watcher.poll(100))  # the same file is not loaded again
+
+        self.write(caps={"energy": 70})
+        self.assertEqual(watcher.poll(100).caps.energy, 70)
+        self.assertIsNone(watcher.error)
+
+
+class ItemTest(unittest.TestCase):
+    def test_interned_by_name(self) -> None:
+        item = Item("Test Ore", "mining/test_ore.png")
+        moved = Item("Test Ore", "mining/moved/test_ore.png")
+
+        self.assertIs(item, moved)
+        self.assertEqual(item.resource_path, "mining/moved/test_ore.png")
+
+        inventory = Inventory()
+        inventory.add(item, 2)
+        inventory.add(moved, 3)
+        self.assertEqual(list(inventory), [(item, 5)])
+
+
+class OfflineProgressTest(unittest.TestCase):
+    """
+    Offline progress is resolved in closed form, it must end in the state
+    that advancing the simulation through the same time reaches.
+    """
+
+    def test_matches_advancing(self) -> None:
+        # Refills that do not pay for the actions as they run, so queues wait.
+        configs = [
+            config_with(rates={"energy": energy, "base_energy_refill": refill})
+            for energy, refill in ((1000, 1), (1500, 1), (2500, 2), (700, 1), (1300, 3))
+        ]
+        rng = random.Random(38)
+
+        for case in range(400):
+            config = rng.choice(configs)
+            skills = list(config.skills)
+            energy = rng.randint(0, config.caps.energy)
+            queue = [
+                (
+                    rng.choice(skills),
+                    rng.randrange(2),
+                    rng.choice([None, rng.randint(1, 300)]),
+                )
+                for _ in range(rng.randint(1, 4))
+            ]
+            ms = rng.randint(0, 3_000_000)
+
+            resolved = self.player(energy, queue)
+            resolved_simulation = Simulation(resolved, config)
+            resolved_simulation.resume(ms)
+
+            advanced = self.player(energy, queue)
+            advanced_simulation = Simulation(advanced, config)
+            advanced_simulation.resume(0)
+            advanced_simulation.advance(ms)
+
+            with self.subTest(case=case, rates=config.rates, energy=energy, queue=queue, ms=ms):
+                self.assertEqual(self.state(resolved_simulation), self.state(advanced_simulation))
+
+    def test_restored_running_action_is_charged_once(self) -> None:
+        config = Config()
+        player = self.player(config.caps.energy, [("mining", 0, 3)])
+        simulation = Simulation(player, config)
+        simulation.resume(0)
+        simulation.advance(1000)  # the first action is running, its energy is spent
+
+        restored = Player.from_save_data(loads(dumps(player.save_data())))
+        restored_simulation = Simulation(restored, config)
+        restored_simulation.resume(0)
+
+        self.assertEqual(restored.energy, player.energy)
+        self.assertEqual(restored.action_queue[0].repeat, 3)
+        self.assertIsNotNone(restored_simulation.skill_action("mining"))
+
+    @staticmethod
+    def player(energy, queue) -> Player:
+        player = Player()
+        player.energy = energy
+        player.action_queue.extend(QueuedAction(*action) for action in queue)
+        return player
+
+    @staticmethod
+    def state(simulation: Simulation):
+        player = simulation.player
+        running = [
+            (skill, action.item, action.end - simulation.time)
+            for skill, action in simulation.pending_actions()
+        ]
+        return (
+            player.energy,
+            player.hitpoints,
+            player.experience,
+            sorted((item.name, quantity) for item, quantity in player.inventory),
+            [(action.skill, action.item, action.repeat) for action in player.action_queue],
+            running,
+        )
+
+
+class SaveTest(unittest.TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "player.save"
+
+    @staticmethod
+    def data(balance=5) -> SaveData:
+        return SaveData(
+            energy=40,
+            hitpoints=90,
+            balance=balance,
+            level=3,
+            experience=1234,
+            skills_progress={"mining": (2, 150), "fishing": (1, 0)},
+            items=[(Item("Test Ore", "mining/test_ore.png"), 7)],
+            saved_at=1_700_000_000_000,
+            action_queue=[QueuedAction("mining", 0, None, True), QueuedAction("fishing", 1, 3)],
+        )
+
+    def test_round_trip(self) -> None:
+        save.save(self.data(), self.path)
+
+        self.assertEqual(save.load(self.path), self.data())
+
+    def test_rejects_a_checksum_mismatch(self) -> None:
+        raw = bytearray(dumps(self.data()))
+        magic, version, length, checksum = save._HEADER.unpack_from(raw)
+        save._HEADER.pack_into(raw, 0, magic, version, length, checksum ^ 1)
+
+        with self.assertRaisesRegex(SaveError, "Corrupted"):
+            loads(bytes(raw))
+
+    def test_rejects_truncated_files(self) -> None:
+        raw = dumps(self.data())
+
+        for size in (len(save.MAGIC), save._HEADER.size, len(raw) - 1):
+            with self.subTest(size=size):
+                with self.assertRaisesRegex(SaveError, "Truncated"):
+                    loads(raw[:size])
+
+    def test_interrupted_write_keeps_the_previous_save(self) -> None:
+        save.save(self.data(balance=5), self.path)
+
+        with mock.patch("src.engine.save.os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                save.save(self.data(balance=10), self.path)
+
+        self.assertEqual(save.load(self.path).balance, 5)
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.scheduler = Scheduler()
+
+    def schedule(self, due, name):
+        return self.scheduler.schedule(due, lambda: name)
+
+    def test_runs_timers_in_order_of_due_time(self) -> None:
+        for due, name in ((30, "c"), (10, "a"), (20, "b"), (50, "d")):
+            self.schedule(due, name)
+
+        self.assertEqual(self.scheduler.advance(30), ["a", "b", "c"])
+        self.assertEqual(self.scheduler.now, 30)
+        self.assertEqual(self.scheduler.next_due(), 50)
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_equal_due_times_run_in_the_order_they_were_scheduled(self) -> None:
+        names = [str(i) for i in range(20)]
+        for name in names:
+            self.schedule(10, name)
+
+        self.assertEqual(self.scheduler.advance(10), names)
+
+    def test_timers_scheduled_by_callbacks_run_when_due(self) -> None:
+        def first():
+            self.schedule(self.scheduler.now + 5, "later")
+
+        self.scheduler.schedule(10, first)
+        self.schedule(12, "between")
+
+        self.assertEqual(self.scheduler.advance(20), ["between", "later"])
+
+    def test_cancelled_timers_do_not_run(self) -> None:
+        a = self.schedule(10, "a")
+        self.schedule(20, "b")
+        c = self.schedule(30, "c")
+
+        self.assertTrue(self.scheduler.cancel(a))
+        self.assertFalse(self.scheduler.cancel(a))
+        self.scheduler.cancel(c)
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertEqual(self.scheduler.next_due(), 20)  # drops the cancelled top
+        self.assertEqual(self.scheduler.advance(100), ["b"])
+        self.assertFalse(self.scheduler.cancel(a))
+
+    def test_compacts_the_heap_of_cancelled_timers(self) -> None:
+        timers = [self.schedule(due, due) for due in range(100)]
+        for timer in timers[:-1]:
+            self.scheduler.cancel(timer)
+
+            # Cancelled timers never take more than half of the heap.
+            self.assertLessEqual(self.scheduler._cancelled, len(self.scheduler._heap) // 2)
+
+        self.assertEqual(len(self.scheduler), 1)
+        self.assertLess(len(self.scheduler._heap), len(timers) // 2)
+        self.assertEqual(self.scheduler.pending(), [timers[-1]])
+        self.assertEqual(self.scheduler.advance(100), [99])
+
+
+class SimulationTest(unittest.TestCase):
+    FRAME = 16  # ms of a frame at 60 FPS
+
+    def test_is_deterministic(self) -> None:
+        self.assertEqual(self.play(Simulation, 38), self.play(Simulation, 38))
+
+    def test_matches_the_per_frame_loop(self) -> None:
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self.assertEqual(self.play(Simulation, seed), self.play(FrameLoop, seed))
+
+    def play(self, cls, seed, frames=6000):
+        """
+        Starts random actions between frames and returns the state of the
+        player after every frame.
+        """
+
+        config = Config()
+        rng = random.Random(seed)
+        simulation = cls(Player(), config)
+        actions = list(config.items)
+
+        states = []
+        for _ in range(frames):
+            simulation.advance(self.FRAME)
+            if rng.random() < 0.02:
+                skill = rng.choice(actions)
+                item = rng.randrange(len(config.items[skill]))
+                if skill == "explore":
+                    simulation.start_explore(item)
+                else:
+                    simulation.start_skill_action(skill, item)
+
+            player = simulation.player
+            states.append(
+                (
+                    player.energy,
+                    player.hitpoints,
+                    player.experience,
+                    sorted((item.name, quantity) for item, quantity in player.inventory),
+                )
+            )
+
+        return states
+
+
+class FrameLoop:
+    """
+    The rules as the game loop applied them before `Simulation`: PyGame
+    timers for the refills and the actions, handled once per frame.
+    """
+
+    def __init__(self, player: Player, config: Config) -> None:
+        self.player = player
+        self._config = config
+        self._gathered_items = gathered_items(config)
+        self._time = 0
+        self._refills = {"energy": config.rates.energy, "hitpoints": config.rates.hitpoints}
+        self._actions = {}  # skill or "explore" -> (end, item)
+
+    def advance(self, ms: int) -> None:
+        self._time += ms
+        rates, caps = self._config.rates, self._config.caps
+
+        while self._refills["energy"] <= self._time:
+            self.player.energy = min(self.player.energy + rates.base_energy_refill, caps.energy)
+            self._refills["energy"] += rates.energy
+        while self._refills["hitpoints"] <= self._time:
+            self.player.hitpoints = min(
+                self.player.hitpoints + rates.base_hitpoints_refill, caps.hitpoints
+            )
+            self._refills["hitpoints"] += rates.hitpoints
+
+        for skill, (end, item) in list(self._actions.items()):
+            if end <= self._time:
+                del self._actions[skill]
+                self.player.experience += self._config.items[skill][item].experience
+                if skill != "explore":
+                    self.player.inventory.add(self._gathered_items[skill][item], 1)
+
+    def start_skill_action(self, skill: str, item: int) -> None:
+        record = self._config.items[skill][item]
+        if skill in self._actions or self.player.energy < record.energy:
+            return
+
+        self.player.energy -= record.energy
+        self._actions[skill] = (self._time + record.duration, item)
+
+    def start_explore(self, item: int) -> None:
+        self.start_skill_action("explore", item)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,229 @@
-from django.test import TestCase
+"""
+Headless rendering benchmarks of the game client.
 
-# Create your tests here.
+Every content area is rendered together with the top menu and the sidebar
+for a fixed number of frames, with synthetic inventories of several sizes,
+both redrawing the whole screen and only the dirty objects. The benchmarks
+only run when KATER_BENCHMARK is set, as they take a while.
+
+Frame rates depend on the machine and are only reported. Allocations hardly
+do, the test fails when a case allocates more than the stored baseline
+allows. Allocations are the peak of the memory allocated during a frame as
+seen by tracemalloc, and the memory blocks that the frames keep allocated.
+
+Run from the game directory:
+
+    KATER_BENCHMARK=1 python -m unittest tests.tests
+
+Environment variables:
+
+    KATER_BENCHMARK             set to run the benchmarks
+    KATER_ASSETS                directory with the fonts and resources directories
+    KATER_BENCHMARK_FRAMES      frames per case, 300 by default, fewer than 100
+                                do not cache every energy text before measuring
+    KATER_BENCHMARK_TOLERANCE   allowed relative regression, 0.3 by default
+    KATER_BENCHMARK_RESULTS     file to write the results to, e.g. to review
+                                them and copy them over benchmark_baseline.json
+"""
+
+import json
+import os
+from pathlib import Path
+import sys
+import tempfile
+from time import perf_counter
+import tracemalloc
+from typing import Dict
+import unittest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from src import game
+from src.engine import Autosave, Config, Player, Simulation
+from src.engine.save import SaveData
+from src.engine.item import Item
+from src.ui import AssetCache, NullProfiler, TextCache, init_fonts
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+ASSETS = Path(
+    os.environ.get(
+        "KATER_ASSETS",
+        Path(__file__).resolve().parents[4] / "frontend" / "Kater" / "src" / "assets",
+    )
+)
+BASELINE = Path(__file__).with_name("benchmark_baseline.json")
+ENABLED = bool(os.environ.get("KATER_BENCHMARK"))
+FRAMES = int(os.environ.get("KATER_BENCHMARK_FRAMES", 300))
+TOLERANCE = float(os.environ.get("KATER_BENCHMARK_TOLERANCE", 0.3))
+RESULTS = os.environ.get("KATER_BENCHMARK_RESULTS")
+
+CONTENT_AREAS = ["Inventory", "Skills", "Explore"]
+INVENTORY_SIZES = [0, 6, 12]
+MODES = ["full", "dirty"]
+
+
+def synthetic_player(items: int) -> Player:
+    resources = sorted(
+        path.relative_to(ASSETS / "resources").as_posix()
+        for path in (ASSETS / "resources").glob("*/*.png")
+    )
+    return Player.from_save_data(
+        SaveData(
+            energy=100,
+            hitpoints=100,
+            balance=0,
+            level=1,
+            experience=0,
+            items=[(Item(f"Item {i}", resources[i]), i + 1) for i in range(items)],
+        )
+    )
+
+
+@unittest.skipUnless(ENABLED, "set KATER_BENCHMARK to run the rendering benchmarks")
+class RenderingBenchmark(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        pygame.display.init()
+        pygame.font.init()
+
+        game.CONFIG = Config()
+        game.SCREEN = pygame.display.set_mode(game.CONFIG.display.size)
+        game.FONTS = init_fonts(ASSETS / "fonts")
+        game.ASSETS = AssetCache(
+            game.CONFIG.assets.memory_budget, f"{ASSETS / 'resources'}/"
+        )
+        game.TEXTS = TextCache(game.CONFIG.assets.text_cache_size)
+        game.PROFILER = NullProfiler()
+
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.results: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        if RESULTS:
+            Path(RESULTS).write_text(json.dumps(cls.results, indent=2, sort_keys=True) + "\n")
+
+        print()
+        print(f"{'case':<24} {'fps':>10} {'KiB/frame':>10} {'retained blocks/frame':>22}")
+        for case, result in sorted(cls.results.items()):
+            print(
+                f"{case:<24} {result['fps']:>10.0f} {result['kib_per_frame']:>10.2f}"
+                f" {result['retained_blocks_per_frame']:>22.2f}"
+            )
+        if resource is not None:
+            print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss} KiB")
+
+        cls.directory.cleanup()
+        pygame.quit()
+
+    def test_content_areas(self) -> None:
+        baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+
+        for content_area in CONTENT_AREAS:
+            for items in INVENTORY_SIZES:
+                for mode in MODES:
+                    case = f"{content_area}/{items}/{mode}"
+                    with self.subTest(case=case):
+                        result = self.measure(content_area, items, mode)
+                        self.results[case] = result
+
+                        if case in baseline:
+                            self.assertRegressionFree(case, result, baseline[case])
+
+    def assertRegressionFree(
+        self, case: str, result: Dict[str, float], expected: Dict[str, float]
+    ) -> None:
+        # A small absolute slack absorbs the noise of cases that allocate
+        # almost nothing.
+        self.assertLessEqual(
+            result["kib_per_frame"],
+            expected["kib_per_frame"] * (1 + TOLERANCE) + 1,
+            f"{case} allocates more than the baseline",
+        )
+        self.assertLessEqual(
+            result["retained_blocks_per_frame"],
+            expected["retained_blocks_per_frame"] * (1 + TOLERANCE) + 1,
+            f"{case} keeps more memory allocated than the baseline",
+        )
+
+    def measure(self, content_area: str, items: int, mode: str) -> Dict[str, float]:
+        self.start_game(content_area, items)
+        top_menu, sidebar, content_area_objects = game.init_ui_objects()
+        updated_objects = [
+            obj
+            for obj in content_area_objects[content_area]
+            if not isinstance(obj, (game.Button, game.Image))
+        ]
+
+        def frame() -> None:
+            # Something changes every frame, like the energy while playing.
+            game.GAME_STATE.simulation.advance(100)
+            game.GAME_STATE.player.energy = game.GAME_STATE.player.energy % 100 + 1
+
+            for obj in top_menu:
+                obj.update(game.GAME_STATE)
+            for obj in updated_objects:
+                obj.update(game.GAME_STATE)
+
+            if mode == "full":
+                game.draw_full(top_menu, sidebar, content_area_objects)
+                pygame.display.flip()
+            else:
+                damaged_rects = game.draw_dirty(top_menu, sidebar, content_area_objects)
+                pygame.display.update(damaged_rects)
+
+        # The first frame fills the caches and draws everything.
+        game.draw_full(top_menu, sidebar, content_area_objects)
+
+        start = perf_counter()
+        for _ in range(FRAMES):
+            frame()
+        fps = FRAMES / (perf_counter() - start)
+
+        # Blocks still allocated after the frames, i.e. what the frames keep
+        # alive, like growing caches or leaks.
+        blocks = sys.getallocatedblocks()
+        for _ in range(FRAMES):
+            frame()
+        retained_blocks = sys.getallocatedblocks() - blocks
+
+        # Tracing slows the frames down, so allocations are measured separately,
+        # as the peak of the memory allocated during each frame.
+        tracemalloc.start()
+        allocated = 0
+        for _ in range(FRAMES):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            frame()
+            allocated += tracemalloc.get_traced_memory()[1] - before
+        tracemalloc.stop()
+
+        return {
+            "fps": fps,
+            "kib_per_frame": allocated / FRAMES / 1024,
+            "retained_blocks_per_frame": retained_blocks / FRAMES,
+        }
+
+    def start_game(self, content_area: str, items: int) -> None:
+        player = synthetic_player(items)
+        simulation = Simulation(player, game.CONFIG)
+        simulation.resume(0)
+
+        game.GAME_STATE = game.GameState(
+            player,
+            Autosave(player, Path(self.directory.name) / "player"),
+            simulation,
+        )
+        game.GAME_STATE.clicked_sidebar_button = content_area
+        game.GAME_STATE.full_redraw = False
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,8 @@
 ASGI config for kater project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+WebSocket connections to /ws/player/ go to the player state push, everything
+else to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -13,4 +15,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kater.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.push import player_socket  # noqa: E402, needs the apps loaded
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'] == '/ws/player/':
+            await player_socket(scope, receive, send)
+        else:
+            await receive()
+            await send({'type': 'websocket.close'})
+        return
+
+    await django_application(scope, receive, send)
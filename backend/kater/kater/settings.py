@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 import environ
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -77,6 +78,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'kater.wsgi.application'
+ASGI_APPLICATION = 'kater.asgi.application'
 
 
 # Database
@@ -133,4 +135,58 @@ STATIC_URL = 'static/'
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# JSON Web Tokens of logged in users
+
+JWT_SECRET = env('JWT_SECRET', default=SECRET_KEY)
+JWT_ALGORITHM = 'HS256'
+JWT_LIFETIME = 60 * 60  # seconds
+
+# Verified tokens whose signature is not checked again until they expire.
+JWT_CLAIMS_CACHE_SIZE = 10000
+
+
+# Password hashing of the login and register views, off the event loop
+
+PASSWORD_HASHING_WORKERS = env.int('PASSWORD_HASHING_WORKERS', default=os.cpu_count() or 1)
+
+# Hashes waiting or running at once, more are refused with 503 Service Unavailable.
+PASSWORD_HASHING_QUEUE_SIZE = env.int(
+    'PASSWORD_HASHING_QUEUE_SIZE', default=8 * PASSWORD_HASHING_WORKERS
+)
+
+
+# Game rules shared with the game client
+
+GAME_CONFIG_PATH = BASE_DIR / 'game' / 'src' / 'engine' / 'config.json'
+
+# Most actions the client may sync in one request.
+ACTION_BATCH_SIZE = 1000
+
+# Most accounts an admin may provision in one request, use the
+# provision_players command for more.
+PROVISIONING_REQUEST_SIZE = 10000
+
+# Player state pushed over the WebSocket at most once per this many ms.
+PUSH_COALESCE_MS = 100
+
+# Leaderboards, the top of each is kept in memory and reloaded after
+# LEADERBOARD_REFRESH seconds to see saves of other processes.
+LEADERBOARD_TOP_SIZE = 100
+LEADERBOARD_REFRESH = 10
+LEADERBOARD_PAGE_SIZE = 100
+
+# Write-behind cache of player state, "database" or the local "memory" stand-in.
+PLAYER_STATE_STORE = env('PLAYER_STATE_STORE', default='database')
+PLAYER_STATE_FLUSH_INTERVAL = 1.0  # seconds
+PLAYER_STATE_FLUSH_SIZE = 500  # dirty players that trigger a flush right away
+PLAYER_STATE_CACHE_SIZE = 100000
+
+# Marketplace, trades are written behind every MARKET_FLUSH_INTERVAL seconds
+# or as soon as MARKET_FLUSH_SIZE of them are pending.
+MARKET_FLUSH_INTERVAL = 0.5
+MARKET_FLUSH_SIZE = 5000
+MARKET_DEPTH_LEVELS = 50  # most price levels of a side per depth request
+MARKET_MAX_PRICE = 10**6
+MARKET_MAX_QUANTITY = 10**4
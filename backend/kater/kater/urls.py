@@ -5,5 +5,16 @@ urlpatterns = [
     path('register/', views.RegisterView.as_view(), name="register"),
     path('login/', views.LoginView.as_view(), name="login"),
     path('user/', views.UserView.as_view(), name="user"),
+    path('actions/', views.ActionsView.as_view(), name="actions"),
+    path('leaderboards/<str:board>/', views.LeaderboardView.as_view(), name="leaderboard"),
+    path(
+        'leaderboards/<str:board>/me/',
+        views.LeaderboardRankView.as_view(),
+        name="leaderboard-rank",
+    ),
+    path('players/provision/', views.ProvisionPlayersView.as_view(), name="provision-players"),
+    path('market/orders/', views.OrdersView.as_view(), name="orders"),
+    path('market/orders/<int:pk>/', views.OrderView.as_view(), name="order"),
+    path('market/<str:item>/depth/', views.MarketDepthView.as_view(), name="market-depth"),
     path('logout/', views.LogoutView.as_view(), name="logout")
 ]